@@ -1,65 +1,606 @@
 ############# API SymptoTrack (PLANO) #############
 # Requisitos:
-#   pip install Flask flask-mysqldb flask-cors
+#   pip install -r requirements.txt   (Flask mysqlclient flask-cors)
+#   opcionales: pip install orjson msgpack brotli   (JSON más rápido, formatos compactos, br)
+#   producción: pip install gunicorn && python serve.py   (pre-fork, ver serve.py)
+#   analítica de cohorte (GET /doctors/<id>/analytics): pip install numpy
 #
 # Esquema esperado en MySQL (symptotrack):
 #   - users(id BIGINT UNSIGNED PK, first_name, last_name, phone, email, username, password, created_at)
 #   - doctors(doctor_id INT PK, first_name, last_name, email, username, password)
-#   - symptom_entries(id, user_id, symptom_name, intensity, entry_date, entry_time, notes, created_at)
+#   - symptom_entries(id, user_id, symptom_name, intensity, entry_date, entry_time, notes, created_at,
+#                     change_seq, created_seq)
+#       change_seq: secuencia de cambios por usuario (symptom_change_seq); borrados en symptom_tombstones
 #   - doctor_patients(id BIGINT UNSIGNED PK, doctor_id INT, patient_id BIGINT UNSIGNED, note, fecha, created_at)
+#   - symptom_rollups(user_id, granularity ENUM('day','week','month'), period_start DATE, symptom_name,
+#                     entries_count, intensity_sum, intensity_min, intensity_max)
+#       PK (user_id, granularity, period_start, symptom_name) -- la mantiene create_symptom
+#       DDL y backfill: schema.SYMPTOM_ROLLUPS_DDL / ROLLUPS_BACKFILL_SQL (migración 1)
+#   - doctor_patient_summary(doctor_id, patient_id, patient_fullname, last_shared_date, shares_count)
+#       PK (doctor_id, patient_id), KEY (doctor_id, last_shared_date DESC, patient_fullname)
+#       -- la mantiene /patients/share
+#       DDL y backfill: schema.DOCTOR_PATIENT_SUMMARY_DDL / SUMMARY_BACKFILL_SQL (migración 1)
+#   - symptom_change_seq(user_id PK, seq), symptom_tombstones(user_id, change_seq, entry_id, created_seq)
+#       -- secuencia de cambios y borrados para /users/<id>/symptoms/changes
+#   Tablas nuevas, columnas *_norm e índices: flask --app App db-migrate (ver schema.py)
 #
-# Nota: ESTE BACKEND ES SOLO PARA PRUEBAS (passwords en TEXTO PLANO)
+# Contraseñas: password_hash (scrypt). Las cuentas antiguas con password_plain se
+# migran solas en su siguiente login.
 
-from flask import Flask, request, jsonify
-from flask_mysqldb import MySQL
+from flask import Flask, Blueprint, current_app, request, jsonify, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+import MySQLdb.cursors
 import re
-from datetime import date
+import csv
+import io
+import json
+import base64
+import hashlib
+import hmac
+import time
+import threading
+import multiprocessing
+import atexit
+from collections import OrderedDict
+from datetime import date, timedelta
+from db_pool import ConnectionPool, PoolExhausted
+from ingest import IngestQueue, QueueFull
+from admission import AdmissionController, Rejected
+import analytics
+import passwords
+import schema
+import metrics
+import sql_trace
+import wire
 
 # -----------------------------
 # Inicialización
 # -----------------------------
-app = Flask(__name__)
-CORS(app)
+# Las rutas y hooks viven en el blueprint `api`; create_app() crea y configura la app.
+# Importar este módulo no crea la app ni abre conexiones: el pool, la cola de ingesta,
+# el pool de hash y el control de admisión son del proceso y se crean en el primer uso.
+api = Blueprint("api", __name__, cli_group=None)
 
-# ---- Config MySQL (XAMPP) ----
-app.config['MYSQL_HOST'] = 'localhost'
-app.config['MYSQL_USER'] = 'root'
-app.config['MYSQL_PASSWORD'] = ''        
-app.config['MYSQL_DB'] = 'symptotrack'
-app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
-mysql = MySQL(app)
-
-app.secret_key = "change-me-in-production"
+def create_app(config=None):
+    """
+    App Flask con la configuración por defecto, luego las variables de entorno
+    SYMPTOTRACK_<CLAVE> (p.ej. SYMPTOTRACK_MYSQL_HOST=db, SYMPTOTRACK_ADMISSION_ENABLED=true;
+    valores JSON) y por último `config`.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    wire.install_json_provider(app)   # orjson si está instalado (misma salida)
+
+    # ---- Config MySQL (XAMPP) ----
+    app.config['MYSQL_HOST'] = 'localhost'
+    app.config['MYSQL_USER'] = 'root'
+    app.config['MYSQL_PASSWORD'] = ''        
+    app.config['MYSQL_DB'] = 'symptotrack'
+    app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
+
+    # ---- Pool de conexiones ----
+    app.config['MYSQL_POOL_SIZE'] = 5
+    app.config['MYSQL_POOL_MAX_OVERFLOW'] = 10
+    app.config['MYSQL_POOL_TIMEOUT'] = 10      # s esperando conexión libre
+    app.config['MYSQL_POOL_RECYCLE'] = 3600    # s de vida máxima por conexión
+    app.config['MYSQL_POOL_PRE_PING'] = True
+    app.config['MYSQL_CONNECT_TIMEOUT'] = 5    # s; acota /ready y los reintentos con la base caída
+
+    # ---- Métricas ----
+    app.config['SERVER_TIMING'] = False         # añade el header Server-Timing a cada respuesta
+    app.config['SQL_TRACE'] = True              # estadísticas por huella de SQL (/admin/sql/top)
+    app.config['SQL_SLOW_MS'] = 200             # umbral del log de consultas lentas
+
+    # ---- Ingesta diferida de POST /symptoms (opcional, ver ingest.py) ----
+    app.config['SYMPTOM_INGEST_ASYNC'] = False      # acepta "Prefer: respond-async" en POST /symptoms
+    app.config['SYMPTOM_INGEST_QUEUE_MAX'] = 10000  # registros en cola; llena -> 503
+    app.config['SYMPTOM_INGEST_BATCH'] = 500        # registros por transacción
+    app.config['SYMPTOM_INGEST_FLUSH_MS'] = 50      # espera máxima antes de escribir un lote
+
+    # ---- Cache de IDs existentes (users / doctors) ----
+    app.config['ID_CACHE_TTL'] = 300     # s; los cambios de estado la invalidan al momento
+    app.config['ID_CACHE_MAX'] = 100000  # entradas por tabla
+
+    # ---- Control de admisión (ver admission.py); límites por proceso ----
+    app.config['ADMISSION_ENABLED'] = False       # activar en producción
+    app.config['ADMISSION_TRUST_PROXY'] = False   # usar X-Forwarded-For (solo detrás de un proxy propio)
+    app.config['ADMISSION_THREADS'] = None        # hilos por worker (serve.py): recorta los cupos
+    app.config['ADMISSION_CLASSES'] = {
+        # app de pacientes: cupo acotado y rechazo rápido. El bucket es por IP (o token):
+        # si muchos móviles salen por el mismo NAT, subir rate/burst.
+        # headroom: hilos del worker que los pacientes nunca ocupan (quedan para doctores)
+        "patient":   {"rate": 10, "burst": 30, "concurrency": 24, "queue_timeout": 0.05,
+                      "headroom": 1},
+        # doctores y administración: cupo propio, que las sincronizaciones no consumen
+        "clinician": {"rate": 20, "burst": 60, "concurrency": 16, "queue_timeout": 0.5},
+    }
+    app.config['ADMISSION_ROUTE_LIMITS'] = {
+        "/users/<int:user_id>/symptoms": 12,
+        "/users/<int:user_id>/symptoms/changes": 12,
+        "/symptoms": 12,
+        "/symptoms/batch": 4,
+        "/doctors/<int:doctor_id>/patients/<int:patient_id>/export": 4,
+        "/doctors/<int:doctor_id>/analytics": 4,
+        "/admin/users/import": 1,
+        "/admin/doctors/import": 1,
+    }
+
+    # ---- Contraseñas (scrypt, ver passwords.py) ----
+    app.config['PASSWORD_SCRYPT_N'] = 2 ** 14   # subirlo re-hashea en el siguiente login
+    app.config['PASSWORD_SCRYPT_R'] = 8
+    app.config['PASSWORD_SCRYPT_P'] = 1
+    app.config['PASSWORD_WORKERS'] = None       # hilos de hash (None: núcleos de CPU)
+    app.config['PASSWORD_QUEUE_MAX'] = 64       # en espera; más -> 503
+
+    # ---- Compresión de respuestas (gzip; brotli si está instalado) ----
+    app.config['COMPRESS_MIN_BYTES'] = 1024
+    app.config['COMPRESS_GZIP_LEVEL'] = 6
+    app.config['COMPRESS_BROTLI_QUALITY'] = 5
+
+    app.secret_key = "change-me-in-production"
+
+    app.config.from_prefixed_env("SYMPTOTRACK")
+    if config:
+        app.config.update(config)
+
+    for cache in ID_CACHES.values():
+        cache.maxsize, cache.ttl = app.config['ID_CACHE_MAX'], app.config['ID_CACHE_TTL']
+    app.teardown_appcontext(release_db)
+    app.register_blueprint(api)
+    return app
 
 # -----------------------------
 # Utilidades
 # -----------------------------
 EMAIL_RE = re.compile(r"[^@]+@[^@]+\.[^@]+")
 
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Pool del proceso, creado en el primer uso a partir de la config de la app."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                cfg = current_app.config
+                _pool = ConnectionPool(
+                    {
+                        "host": cfg['MYSQL_HOST'],
+                        "user": cfg['MYSQL_USER'],
+                        "passwd": cfg['MYSQL_PASSWORD'],
+                        "db": cfg['MYSQL_DB'],
+                        "charset": "utf8mb4",
+                        "connect_timeout": cfg['MYSQL_CONNECT_TIMEOUT'],
+                        "cursorclass": getattr(MySQLdb.cursors, cfg['MYSQL_CURSORCLASS']),
+                    },
+                    size=cfg['MYSQL_POOL_SIZE'],
+                    max_overflow=cfg['MYSQL_POOL_MAX_OVERFLOW'],
+                    timeout=cfg['MYSQL_POOL_TIMEOUT'],
+                    recycle=cfg['MYSQL_POOL_RECYCLE'],
+                    pre_ping=cfg['MYSQL_POOL_PRE_PING'],
+                )
+    return _pool
+
+def reset_after_fork():
+    """
+    Para servidores pre-fork (serve.py, post_fork): olvida el pool, la cola de ingesta,
+    el pool de hash y el control de admisión heredados del proceso master; cada worker
+    crea los suyos en el primer uso. Las conexiones MySQL y los hilos no se comparten
+    entre procesos; admin_revocations sí (memoria compartida) y no se toca.
+    """
+    global _pool, _pool_lock, _ingest, _hasher, _admission
+    _pool_lock = threading.Lock()
+    _pool = _ingest = _hasher = _admission = None
+
+def request_stats():
+    """Contadores (SQL, filas, JSON) del request actual."""
+    if "req_stats" not in g:
+        g.req_stats = metrics.RequestStats()
+    return g.req_stats
+
+sql_tracer = sql_trace.SqlTracer()
+
 def get_db():
-    return mysql.connection
+    """Conexión del request actual; se toma del pool en el primer uso."""
+    if "db" not in g:
+        g.db_conn = get_pool().acquire()
+        tracer = None
+        if current_app.config['SQL_TRACE']:
+            tracer = sql_tracer
+            tracer.slow_threshold = current_app.config['SQL_SLOW_MS'] / 1000.0
+        route = request.url_rule.rule if has_request_context() and request.url_rule else None
+        g.db = metrics.InstrumentedConnection(g.db_conn, request_stats(), tracer, route)
+    return g.db
+
+def release_db(exc):
+    g.pop("db", None)
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        get_pool().release(conn)
 
 def required_fields(payload, fields):
     return [f for f in fields if payload.get(f) in (None, "", [])]
 
+# mysqlclient parte un executemany en varias sentencias al pasar Cursor.max_stmt_length
+INSERT_STMT_MAX = 64 * 1024
+
+def insert_rows(cur, sql, rows):
+    """
+    INSERT multi-fila que devuelve el id de cada fila, en el orden de rows.
+    Si executemany parte la sentencia, lastrowid es el primer id del último trozo: por eso
+    se inserta en trozos que caben seguro en una sentencia (tamaño estimado por lo alto)
+    y se toma lastrowid de cada uno. Un INSERT multi-fila sin ids explícitos es un
+    "simple insert": InnoDB le reserva todos sus ids de una vez, sin huecos en cualquier
+    innodb_autoinc_lock_mode, separados por auto_increment_increment (> 1 en Galera y
+    group replication). No hace commit.
+    """
+    if not rows:
+        return []
+    cur.execute("SELECT @@auto_increment_increment AS step")
+    step = int(cur.fetchone()["step"])
+    template = len(sql[sql.upper().index("VALUES") + 6:].encode())
+    budget = INSERT_STMT_MAX - len(sql.encode())
+    ids = []
+    start = 0
+    while start < len(rows):
+        end, size = start, 0
+        while end < len(rows):
+            # peor caso: cada carácter escapado (x2) más comillas y separador
+            row_size = template + sum(2 * len(str(v).encode()) + 3 for v in rows[end])
+            if end > start and size + row_size > budget:
+                break
+            size += row_size
+            end += 1
+        cur.executemany(sql, rows[start:end])
+        ids.extend(range(cur.lastrowid, cur.lastrowid + (end - start) * step, step))
+        start = end
+    return ids
+
+def timed_jsonify(obj):
+    started = time.perf_counter()
+    resp = jsonify(obj)
+    request_stats().json_time += time.perf_counter() - started
+    return resp
+
 def ok(data=None, status=200):
-    return jsonify({"ok": True, "data": data}), status
+    return timed_jsonify({"ok": True, "data": data}), status
 
 def err(msg, status=400):
-    return jsonify({"ok": False, "error": msg}), status
+    return timed_jsonify({"ok": False, "error": msg}), status
+
+def ok_negotiated(data=None, status=200):
+    """
+    Como ok(), pero respeta el formato pedido (?format= o Accept): JSON normal por
+    defecto, o columnar / MessagePack (ver wire.py) para listas grandes.
+    """
+    fmt = wire.negotiate(request.args.get("format"), request.headers.get("Accept"))
+    if fmt == "json":
+        resp, status = ok(data, status)
+    else:
+        started = time.perf_counter()
+        body, mimetype = wire.encode_compact(fmt, {"ok": True, "data": data})
+        request_stats().json_time += time.perf_counter() - started
+        resp = Response(body, mimetype=mimetype)
+    resp.vary.add("Accept")
+    return resp, status
+
+class TTLCache:
+    """Cache en memoria, acotado (LRU) y con expiración por entrada. Thread-safe."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[1] if item else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+def encode_cursor(*parts):
+    """Cursor opaco (base64 url-safe) para paginación keyset."""
+    raw = json.dumps(list(parts), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token):
+    """Devuelve la lista de valores del cursor o None si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        parts = json.loads(raw)
+    except Exception:
+        return None
+    return parts if isinstance(parts, list) else None
+
+def stream_json_rows(cur, batch_size=500):
+    """Genera {"ok": true, "data": [...]} leyendo el cursor por lotes (sin fetchall)."""
+    try:
+        yield '{"ok":true,"data":['
+        first = True
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            started = time.perf_counter()
+            chunk = ",".join(current_app.json.dumps(r) for r in rows)
+            request_stats().json_time += time.perf_counter() - started
+            yield chunk if first else "," + chunk
+            first = False
+        yield "]}"
+    finally:
+        cur.close()
+
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def csv_safe(value):
+    """Texto que una hoja de cálculo interpretaría como fórmula: se antepone ' (inyección CSV)."""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def stream_csv_rows(cur, columns, batch_size=500):
+    """Genera un CSV (cabecera + filas) leyendo el cursor de tuplas por lotes."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    try:
+        writer.writerow(columns)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            started = time.perf_counter()
+            # notes / symptom_name los escribe el paciente
+            writer.writerows([csv_safe(v) for v in r] for r in rows)
+            chunk = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            request_stats().json_time += time.perf_counter() - started
+            if chunk:
+                yield chunk
+            if not rows:
+                break
+    finally:
+        cur.close()
+
+def stream_ndjson_rows(cur, columns, batch_size=500):
+    """Genera un objeto JSON por línea leyendo el cursor de tuplas por lotes."""
+    try:
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            started = time.perf_counter()
+            chunk = "".join(current_app.json.dumps(dict(zip(columns, r))) + "\n" for r in rows)
+            request_stats().json_time += time.perf_counter() - started
+            yield chunk
+    finally:
+        cur.close()
+
+# -----------------------------
+# IDs conocidos (users / doctors)
+# -----------------------------
+# Evita las comprobaciones "SELECT ... WHERE id=%s" en cada escritura/lectura caliente.
+# Solo guarda IDs que existen (con is_active y el nombre); un ID desconocido siempre se
+# consulta. La invalidan los cambios de estado y los registros; si aun así un ID
+# cacheado ya no existe, la FK del INSERT falla (IntegrityError) y se olvida el ID.
+# (tamaño y TTL: ID_CACHE_MAX / ID_CACHE_TTL, los aplica create_app)
+known_users   = TTLCache(maxsize=100000, ttl=300)
+known_doctors = TTLCache(maxsize=100000, ttl=300)
+
+USER_LOOKUP_SQL = "SELECT id, first_name, last_name, is_active FROM users WHERE id IN ({})"
+DOCTOR_LOOKUP_SQL = "SELECT doctor_id, is_active FROM doctors WHERE doctor_id=%s LIMIT 1"
+
+def lookup_users(cur, user_ids):
+    """
+    {id: {id, first_name, last_name, is_active}} de los que existen (una consulta para los
+    no cacheados). Las claves son int, como las devuelve MySQL, venga como venga el ID.
+    """
+    found, missing = {}, []
+    for uid in set(map(int, user_ids)):
+        info = known_users.get(uid)
+        if info is None:
+            missing.append(uid)
+        else:
+            found[uid] = info
+    if missing:
+        missing.sort()
+        cur.execute(USER_LOOKUP_SQL.format(",".join(["%s"] * len(missing))), tuple(missing))
+        for r in cur.fetchall():
+            info = {"id": r["id"], "first_name": r["first_name"], "last_name": r["last_name"],
+                    "is_active": bool(r["is_active"])}
+            known_users.set(r["id"], info)
+            found[r["id"]] = info
+    return found
+
+def lookup_user(cur, user_id):
+    return lookup_users(cur, [user_id]).get(int(user_id))
+
+def lookup_doctor(cur, doctor_id):
+    """{doctor_id, is_active} o None si no existe."""
+    doctor_id = int(doctor_id)
+    info = known_doctors.get(doctor_id)
+    if info is None:
+        cur.execute(DOCTOR_LOOKUP_SQL, (doctor_id,))
+        r = cur.fetchone()
+        if r is None:
+            return None
+        info = {"doctor_id": r["doctor_id"], "is_active": bool(r["is_active"])}
+        known_doctors.set(doctor_id, info)
+    return info
+
+ID_CACHES = {"users": known_users, "doctors": known_doctors}
+
+def forget_ids(table, ids):
+    """Olvida IDs recién creados o modificados (un ID borrado a mano puede reutilizarse)."""
+    cache = ID_CACHES[table]
+    for i in ids:
+        cache.pop(i)
+
+def is_fk_violation(e):
+    # 1452: Cannot add or update a child row: a foreign key constraint fails
+    return isinstance(e, MySQLdb.IntegrityError) and e.args and e.args[0] == 1452
+
+@api.app_errorhandler(PoolExhausted)
+def pool_exhausted(e):
+    resp, status = err("Servicio saturado, reintenta en unos segundos", 503)
+    resp.headers["Retry-After"] = "1"
+    return resp, status
+
+# -----------------------------
+# Métricas por request
+# -----------------------------
+request_metrics = metrics.Registry()
+
+@api.before_app_request
+def start_request_timer():
+    g.req_started = time.perf_counter()
+
+@api.after_app_request
+def finish_request_timer(resp):
+    g.resp_status = resp.status_code
+    if current_app.config['SERVER_TIMING'] and "req_started" in g:
+        resp.headers["Server-Timing"] = metrics.server_timing(
+            time.perf_counter() - g.req_started, request_stats())
+    return resp
+
+@api.after_app_request
+def compress_response(resp):
+    return wire.compress_response(resp, request,
+                                  min_bytes=current_app.config['COMPRESS_MIN_BYTES'],
+                                  gzip_level=current_app.config['COMPRESS_GZIP_LEVEL'],
+                                  brotli_quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+
+@api.teardown_app_request
+def record_request_metrics(exc):
+    # en teardown para incluir también las respuestas en streaming
+    started = g.pop("req_started", None)
+    if started is None:
+        return
+    route = request.url_rule.rule if request.url_rule else "<sin ruta>"
+    status = 500 if exc is not None else g.pop("resp_status", 500)
+    request_metrics.observe(route, request.method, status,
+                            time.perf_counter() - started, request_stats())
+
+# -----------------------------
+# Control de admisión
+# -----------------------------
+ADMISSION_EXEMPT = {"/", "/ready", "/metrics"}
+
+_admission = None
+
+def get_admission():
+    global _admission
+    if _admission is None:
+        with _pool_lock:
+            if _admission is None:
+                _admission = AdmissionController(current_app.config['ADMISSION_CLASSES'],
+                                                 current_app.config['ADMISSION_ROUTE_LIMITS'],
+                                                 current_app.config['ADMISSION_THREADS'])
+    return _admission
+
+def admission_class(rule):
+    """clinician: rutas de doctor (/doctors/<id>/...) y /admin; el resto, patient."""
+    if rule.startswith("/admin") or rule.startswith("/doctors/<"):
+        return "clinician"
+    return "patient"
+
+def admission_client():
+    """
+    Clave del cliente para el token bucket: quién llama, nunca un id de la ruta (lo elige
+    el cliente: rotándolo tendría un burst nuevo por id y podría agotar el cupo de otro).
+    Token de admin si lo hay; si no, la IP (X-Forwarded-For solo detrás de un proxy propio).
+    Los móviles detrás del mismo NAT comparten cupo: se dimensiona con rate/burst por clase.
+    """
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        return "token:" + hashlib.blake2s(auth.encode(), digest_size=8).hexdigest()
+    if current_app.config['ADMISSION_TRUST_PROXY'] and request.headers.get("X-Forwarded-For"):
+        return "ip:" + request.headers["X-Forwarded-For"].split(",")[0].strip()
+    return f"ip:{request.remote_addr}"
+
+@api.before_app_request
+def admit_request():
+    if not current_app.config['ADMISSION_ENABLED'] or request.method == "OPTIONS":
+        return None
+    rule = request.url_rule.rule if request.url_rule else None
+    if rule is None or rule in ADMISSION_EXEMPT:
+        return None
+    try:
+        g.admission_ticket = get_admission().admit(admission_class(rule), admission_client(), rule)
+    except Rejected as e:
+        resp, status = err(e.message, e.status)
+        resp.headers["Retry-After"] = str(e.retry_after)
+        return resp, status
+    return None
+
+@api.teardown_app_request
+def release_admission(exc):
+    # en teardown: con streaming el cupo se libera al terminar de enviar
+    ticket = g.pop("admission_ticket", None)
+    if ticket is not None:
+        get_admission().release(ticket)
+
+@api.get("/metrics")
+def metrics_endpoint():
+    """Métricas del proceso en formato de texto Prometheus."""
+    return Response(request_metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 # -----------------------------
 # Health
 # -----------------------------
-@app.get("/")
+@api.get("/")
 def health():
-    return ok({"service": "SymptoTrack API", "db": app.config['MYSQL_DB']})
+    return ok({"service": "SymptoTrack API", "db": current_app.config['MYSQL_DB']})
+
+@api.get("/ready")
+def readiness():
+    """Sonda de readiness: 200 si este worker llega a MySQL, 503 si no (sacarlo del balanceo)."""
+    try:
+        cur = get_db().cursor()
+        try:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        finally:
+            cur.close()
+    except (MySQLdb.Error, PoolExhausted) as e:
+        resp, status = err(f"Base de datos no disponible: {e}", 503)
+        resp.headers["Retry-After"] = "5"
+        return resp, status
+    return ok({"db": "ok"})
 
 # -----------------------------
-# AUTH: Usuarios (pacientes) - TEXTO PLANO
+# AUTH: Usuarios (pacientes)
 # -----------------------------
-@app.post("/auth/register_user")
+def user_identifier_taken(cur, usuario):
+    """True si ya hay un usuario con ese email o username (columnas *_norm, ver schema.py)."""
+    column = "email_norm" if "@" in usuario else "username_norm"
+    cur.execute(f"SELECT 1 FROM users WHERE {column}=%s LIMIT 1", (usuario.lower(),))
+    return cur.fetchone() is not None
+
+@api.post("/auth/register_user")
 def register_user():
     try:
         data = request.get_json(force=True)
@@ -74,222 +615,165 @@ def register_user():
 
         db = get_db()
         cur = db.cursor()
+        if user_identifier_taken(cur, usuario):
+            return err("Correo o usuario ya registrado", 409)
 
+        password_hash = get_hasher().hash(password)
         if "@" in usuario:
             cur.execute("""
-                INSERT INTO users (first_name, last_name, phone, email, password_plain, is_active)
+                INSERT INTO users (first_name, last_name, phone, email, password_hash, is_active)
                 VALUES (%s,%s,%s,%s,%s,1)
-            """, (first_name, last_name, phone, usuario, password))
+            """, (first_name, last_name, phone, usuario, password_hash))
         else:
             cur.execute("""
-                INSERT INTO users (first_name, last_name, phone, username, password_plain, is_active)
+                INSERT INTO users (first_name, last_name, phone, username, password_hash, is_active)
                 VALUES (%s,%s,%s,%s,%s,1)
-            """, (first_name, last_name, phone, usuario, password))
+            """, (first_name, last_name, phone, usuario, password_hash))
 
         db.commit()
         new_id = cur.lastrowid
+        forget_ids("users", [new_id])
         return ok({"id": new_id, "first_name": first_name, "last_name": last_name}, 201)
+    except passwords.Busy:
+        raise
     except Exception as e:
         import traceback, sys
         print("ERROR /auth/register_user:", e, file=sys.stderr)
         traceback.print_exc()
         return err("Error registrando usuario", 500)
 
+# -----------------------------
+# Contraseñas
+# -----------------------------
+_hasher = None
+
+def get_hasher():
+    """Pool de hash del proceso (hilos acotados), creado en el primer uso."""
+    global _hasher
+    if _hasher is None:
+        with _pool_lock:
+            if _hasher is None:
+                cfg = current_app.config
+                _hasher = passwords.HashPool(workers=cfg['PASSWORD_WORKERS'],
+                                             max_pending=cfg['PASSWORD_QUEUE_MAX'],
+                                             n=cfg['PASSWORD_SCRYPT_N'],
+                                             r=cfg['PASSWORD_SCRYPT_R'],
+                                             p=cfg['PASSWORD_SCRYPT_P'])
+    return _hasher
+
+@api.app_errorhandler(passwords.Busy)
+def hasher_busy(e):
+    resp, status = err("Demasiados inicios de sesión a la vez, reintenta en unos segundos", 503)
+    resp.headers["Retry-After"] = "1"
+    return resp, status
+
+CREDENTIAL_TABLES = {"admin": ("admins", "id"), "doctor": ("doctors", "doctor_id"), "user": ("users", "id")}
+
+def check_credentials(db, cur, role, row, password):
     """
-    body: {first_name, last_name, phone, usuario_correo, password}
-    - usuario_correo puede ser email o username
-    - password se guarda en TEXTO PLANO (solo pruebas)
+    Verifica la contraseña de una fila con password_hash / password_plain.
+    Si coincide con el texto plano (o con un hash de coste viejo) guarda el hash nuevo
+    y borra el texto plano.
     """
-    payload = request.get_json(silent=True) or {}
-    missing = required_fields(payload, ["first_name","last_name","phone","usuario_correo","password"])
-    if missing:
-        return err(f"Faltan campos: {', '.join(missing)}")
-
-    first_name = payload["first_name"].strip()
-    last_name  = payload["last_name"].strip()
-    phone      = payload["phone"].strip()
-    usuario_correo = payload["usuario_correo"].strip()
-    password   = payload["password"]  # TEXTO PLANO
-
-    # Decide si es email o username
-    email = usuario_correo.lower() if EMAIL_RE.match(usuario_correo) else None
-    username = None if email else usuario_correo
-
-    if username and len(username) < 4:
-        return err("El usuario debe tener al menos 4 caracteres")
-    if not re.fullmatch(r"\d{7,20}", phone):
-        return err("El teléfono debe ser numérico (7-20 dígitos)")
-
-    db = get_db()
-    cur = db.cursor()
-    try:
-        if email:
-            cur.execute("SELECT id FROM users WHERE email=%s", (email,))
-            if cur.fetchone():
-                return err("Correo ya registrado")
-        if username:
-            cur.execute("SELECT id FROM users WHERE username=%s", (username,))
-            if cur.fetchone():
-                return err("Usuario ya registrado")
-
-        cur.execute("""
-            INSERT INTO users(first_name, last_name, phone, email, username, password)
-            VALUES (%s,%s,%s,%s,%s,%s)
-        """, (first_name, last_name, phone, email, username, password))
-        db.commit()
-
-        return ok({
-            "id": cur.lastrowid,
-            "first_name": first_name,
-            "last_name": last_name,
-            "phone": phone,
-            "email": email,
-            "username": username
-        }, status=201)
-    except Exception as e:
-        db.rollback()
-        return err(f"Error insertando usuario: {str(e)}", 500)
-    finally:
-        cur.close()
-
-@app.post("/auth/login")
+    hasher = get_hasher()
+    if row["password_hash"]:
+        if not hasher.verify(password, row["password_hash"]):
+            return False
+        if not hasher.needs_rehash(row["password_hash"]):
+            return True
+    elif row["password_plain"] is None or not hmac.compare_digest(
+            row["password_plain"].encode(), password.encode()):
+        hasher.verify(password, None)   # mismo coste que una contraseña incorrecta
+        return False
+
+    table, pk = CREDENTIAL_TABLES[role]
+    cur.execute(f"UPDATE {table} SET password_hash=%s, password_plain=NULL WHERE {pk}=%s",
+                (hasher.hash(password), row["id"]))
+    db.commit()
+    return True
+
+# Una sola consulta para admins, doctores y usuarios. Cada rama es una igualdad sobre
+# una columna normalizada con índice único (ver schema.py) y role_rank conserva la
+# precedencia admin > doctor > user. La contraseña se comprueba después, fuera de SQL.
+IDENTITY_SQL = """
+    SELECT role, id, first_name, last_name, password_hash, password_plain FROM (
+        SELECT 1 AS role_rank, 'admin' AS role, id, 'Admin' AS first_name, '' AS last_name,
+               password_hash, password_plain
+          FROM admins WHERE username_norm=%s AND is_active=1
+        UNION ALL
+        SELECT 2, 'doctor', doctor_id, first_name, last_name, password_hash, password_plain
+          FROM doctors WHERE username_norm=%s AND is_active=1
+        UNION ALL
+        SELECT 2, 'doctor', doctor_id, first_name, last_name, password_hash, password_plain
+          FROM doctors WHERE email_norm=%s AND is_active=1
+        UNION ALL
+        SELECT 3, 'user', id, first_name, last_name, password_hash, password_plain
+          FROM users WHERE username_norm=%s AND is_active=1
+        UNION ALL
+        SELECT 3, 'user', id, first_name, last_name, password_hash, password_plain
+          FROM users WHERE email_norm=%s AND is_active=1
+    ) AS identities
+    ORDER BY role_rank
+"""
+
+def resolve_identity(db, cur, identifier, password):
+    """
+    Devuelve {role, id, first_name, last_name} o None. Una consulta trae las cuentas
+    candidatas (como mucho una por tabla y columna) y se verifican por prioridad.
+    """
+    cur.execute(IDENTITY_SQL, (identifier.lower(),) * 5)
+    seen = set()
+    for row in cur.fetchall():
+        if (row["role"], row["id"]) in seen:
+            continue
+        seen.add((row["role"], row["id"]))
+        if check_credentials(db, cur, row["role"], row, password):
+            return row
+    if not seen:
+        get_hasher().verify(password, None)   # no revelar por tiempo si la cuenta existe
+    return None
+
+@api.post("/auth/login")
 def login():
     try:
         data = request.get_json(force=True)
         identifier = (data.get("identifier") or "").strip()
         password   = (data.get("password") or "").strip()
+        if not identifier or not password:
+            return err("Credenciales inválidas", 401)
 
         db = get_db()
         cur = db.cursor()
-
-        # 1) Admin
-        cur.execute("""
-            SELECT id, username FROM admins
-            WHERE (username=%s) AND password_plain=%s AND is_active=1 LIMIT 1
-        """, (identifier, password))
-        row = cur.fetchone()
+        row = resolve_identity(db, cur, identifier, password)
         if row:
-            return ok({
-                "role": "admin",
+            data = {
+                "role": row["role"],
                 "id": row["id"],
-                "first_name": "Admin",
-                "last_name": "",
-            })
-
-        # 2) Doctor (si quieres permitir login de doctores)
-        cur.execute("""
-            SELECT doctor_id AS id, first_name, last_name FROM doctors
-            WHERE (username=%s OR email=%s) AND password_plain=%s AND is_active=1 LIMIT 1
-        """, (identifier, identifier, password))
-        row = cur.fetchone()
-        if row:
-            return ok({"role": "doctor", **row})
-
-        # 3) User
-        cur.execute("""
-            SELECT id, first_name, last_name FROM users
-            WHERE (username=%s OR email=%s) AND password_plain=%s AND is_active=1 LIMIT 1
-        """, (identifier, identifier, password))
-        row = cur.fetchone()
-        if row:
-            return ok({"role": "user", **row})
+                "first_name": row["first_name"],
+                "last_name": row["last_name"],
+            }
+            if row["role"] == "admin":
+                data["token"] = issue_admin_token(row["id"])
+            return ok(data)
 
         return err("Credenciales inválidas", 401)
 
+    except passwords.Busy:
+        raise
     except Exception as e:
         import traceback, sys
         print("ERROR /auth/login:", e, file=sys.stderr)
         traceback.print_exc()
         return err("Error interno en login", 500)
-    """
-    body: {identifier, password, role?}
-      - identifier: email o username
-      - role (opcional): 'user' o 'doctor'
-    Valida TODO en TEXTO PLANO para users y doctors (modo prueba).
-    """
-    try:
-        payload = request.get_json(silent=True)
-        if not payload:
-            return err("Body JSON vacío o Content-Type incorrecto (usa application/json)")
-
-        identifier = (payload.get("identifier") or "").strip()
-        password = payload.get("password")
-        role = (payload.get("role") or "").lower() if payload.get("role") else None
-
-        if not identifier or not password:
-            return err("Faltan campos: identifier y password son obligatorios")
-
-        db = get_db()
-        cur = None
-        try:
-            cur = db.cursor()
-
-            # ---- forzar role=user (texto plano) ----
-            if role == "user":
-                cur.execute("""
-                    SELECT id, first_name, last_name, phone, email, username, password
-                    FROM users
-                    WHERE (LOWER(email)=LOWER(%s) OR LOWER(username)=LOWER(%s))
-                    LIMIT 1
-                """, (identifier, identifier))
-                row = cur.fetchone()
-                if not row or row.get("password") != password:
-                    return err("Credenciales inválidas (user)", 401)
-                return ok({"role": "user", "id": row["id"], "first_name": row["first_name"], "last_name": row["last_name"]})
-
-            # ---- forzar role=doctor (texto plano) ----
-            if role == "doctor":
-                cur.execute("""
-                    SELECT doctor_id, first_name, last_name, email, username, password
-                    FROM doctors
-                    WHERE (LOWER(email)=LOWER(%s) OR LOWER(username)=LOWER(%s))
-                    LIMIT 1
-                """, (identifier, identifier))
-                row = cur.fetchone()
-                if not row or row.get("password") != password:
-                    return err("Credenciales inválidas (doctor)", 401)
-                return ok({"role": "doctor", "id": row["doctor_id"], "first_name": row["first_name"], "last_name": row["last_name"]})
-
-            # ---- sin role: intenta user y luego doctor (ambos texto plano) ----
-            cur.execute("""
-                SELECT id, first_name, last_name, phone, email, username, password
-                FROM users
-                WHERE (LOWER(email)=LOWER(%s) OR LOWER(username)=LOWER(%s))
-                LIMIT 1
-            """, (identifier, identifier))
-            row = cur.fetchone()
-            if row and row.get("password") == password:
-                return ok({"role": "user", "id": row["id"], "first_name": row["first_name"], "last_name": row["last_name"]})
-
-            cur.execute("""
-                SELECT doctor_id, first_name, last_name, email, username, password
-                FROM doctors
-                WHERE (LOWER(email)=LOWER(%s) OR LOWER(username)=LOWER(%s))
-                LIMIT 1
-            """, (identifier, identifier))
-            row = cur.fetchone()
-            if row and row.get("password") == password:
-                return ok({"role": "doctor", "id": row["doctor_id"], "first_name": row["first_name"], "last_name": row["last_name"]})
-
-            return err("Credenciales inválidas", 401)
-        finally:
-            if cur:
-                cur.close()
-
-    except Exception as e:
-        import traceback, sys
-        print("ERROR /auth/login:", e, file=sys.stderr)
-        traceback.print_exc()
-        return err("Error interno en /auth/login", 500)
 
 # -----------------------------
 # AUTH: Doctores (registro simple, TEXTO PLANO)
 # -----------------------------
-@app.post("/auth/register_doctor")
+@api.post("/auth/register_doctor")
 def register_doctor():
     """
     body: {first_name, last_name, email, username, password}
-    - password plano (ej: '0000') para PRUEBAS
+    - password se guarda como hash (scrypt)
     """
     payload = request.get_json(silent=True) or {}
     missing = required_fields(payload, ["first_name", "last_name", "email", "username", "password"])
@@ -300,23 +784,27 @@ def register_doctor():
     last_name  = payload["last_name"].strip()
     email      = payload["email"].strip().lower()
     username   = payload["username"].strip()
-    password   = payload["password"]  # plano por ahora
+    password   = payload["password"]
 
     db = get_db()
     cur = db.cursor()
     try:
-        cur.execute("SELECT doctor_id FROM doctors WHERE LOWER(email)=LOWER(%s) OR LOWER(username)=LOWER(%s)",
-                    (email, username))
+        cur.execute("SELECT doctor_id FROM doctors WHERE email_norm=%s OR username_norm=%s",
+                    (email, username.lower()))
         if cur.fetchone():
             return err("Email o usuario ya existe en doctores")
 
         cur.execute("""
-            INSERT INTO doctors(first_name, last_name, email, username, password)
+            INSERT INTO doctors(first_name, last_name, email, username, password_hash)
             VALUES (%s,%s,%s,%s,%s)
-        """, (first_name, last_name, email, username, password))
+        """, (first_name, last_name, email, username, get_hasher().hash(password)))
         db.commit()
+        invalidate_doctors_cache()
+        forget_ids("doctors", [cur.lastrowid])
         return ok({"doctor_id": cur.lastrowid, "first_name": first_name, "last_name": last_name}, status=201)
 
+    except passwords.Busy:
+        raise
     except Exception as e:
         db.rollback()
         return err(f"Error insertando doctor: {str(e)}", 500)
@@ -325,19 +813,65 @@ def register_doctor():
 # -----------------------------
 # listar doctores
 # -----------------------------
-@app.get("/doctors")
+DOCTORS_CACHE_TTL = 300   # s; acota lo desactualizado que puede quedar otro proceso
+
+# Respuesta serializada de GET /doctors. version sube en cada invalidación (evita guardar
+# una respuesta leída antes de un cambio); el ETag es un digest del cuerpo, calculado solo al
+# reconstruir, así que coincide entre procesos que sirven el mismo contenido.
+_doctors_cache = {"version": 0, "etag": None, "body": None, "expires": 0.0}
+_doctors_cache_lock = threading.Lock()
+
+def invalidate_doctors_cache():
+    with _doctors_cache_lock:
+        _doctors_cache["version"] += 1
+        _doctors_cache["body"] = None
+
+DOCTORS_LIST_SQL = """
+    SELECT doctor_id, first_name, last_name, email, username
+    FROM doctors
+    ORDER BY first_name, last_name
+"""
+
+def doctors_cache_lookup():
+    """(version, etag, body) de la cache; body es None si no hay o expiró."""
+    with _doctors_cache_lock:
+        body = _doctors_cache["body"]
+        if _doctors_cache["expires"] < time.monotonic():
+            body = None
+        return _doctors_cache["version"], _doctors_cache["etag"], body
+
+def doctors_cache_store(version, rows):
+    """Serializa el listado y lo guarda si nadie invalidó desde version. Devuelve (etag, body)."""
+    body = current_app.json.dumps({"ok": True, "data": rows})
+    etag = "doctors-" + hashlib.blake2s(body.encode(), digest_size=8).hexdigest()
+    with _doctors_cache_lock:
+        # si alguien invalidó mientras consultábamos, no guardamos datos viejos
+        if _doctors_cache["version"] == version:
+            _doctors_cache.update(etag=etag, body=body,
+                                  expires=time.monotonic() + DOCTORS_CACHE_TTL)
+    return etag, body
+
+@api.get("/doctors")
 def list_doctors():
-    """Listado simple de doctores para selección en la app."""
+    """Listado simple de doctores para selección en la app (cacheado, con ETag)."""
     try:
-        db = get_db()
-        cur = db.cursor()
-        cur.execute("""
-            SELECT doctor_id, first_name, last_name, email, username
-            FROM doctors
-            ORDER BY first_name, last_name
-        """)
-        rows = cur.fetchall()
-        return ok(rows)
+        version, etag, body = doctors_cache_lookup()
+        if body is None:
+            db = get_db()
+            cur = db.cursor()
+            try:
+                cur.execute(DOCTORS_LIST_SQL)
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+            started = time.perf_counter()
+            etag, body = doctors_cache_store(version, rows)
+            request_stats().json_time += time.perf_counter() - started
+
+        resp = Response(body, mimetype="application/json")
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp.make_conditional(request)
     except Exception as e:
         import traceback, sys
         print("ERROR GET /doctors:", e, file=sys.stderr)
@@ -347,7 +881,26 @@ def list_doctors():
 # -----------------------------
 # Compartir con doctor (tabla doctor_patients)
 # -----------------------------
-@app.post("/patients/share")
+SUMMARY_UPSERT_SQL = """
+    INSERT INTO doctor_patient_summary
+        (doctor_id, patient_id, patient_fullname, last_shared_date, shares_count)
+    VALUES (%s, %s, %s, %s, 1)
+    ON DUPLICATE KEY UPDATE
+        patient_fullname = VALUES(patient_fullname),
+        last_shared_date = GREATEST(last_shared_date, VALUES(last_shared_date)),
+        shares_count     = shares_count + 1
+"""
+
+def upsert_patient_summary(cur, doctor_id, patient, fecha):
+    """Actualiza doctor_patient_summary para un nuevo registro compartido. No hace commit."""
+    # mismo resultado que CONCAT(first_name, ' ', last_name) en SQL (NULL si falta alguno)
+    if patient["first_name"] is None or patient["last_name"] is None:
+        fullname = None
+    else:
+        fullname = f"{patient['first_name']} {patient['last_name']}"
+    cur.execute(SUMMARY_UPSERT_SQL, (doctor_id, patient["id"], fullname, fecha))
+
+@api.post("/patients/share")
 def share_with_doctor():
     """Comparte un paciente con un doctor."""
     cur = None
@@ -360,6 +913,10 @@ def share_with_doctor():
 
         if not doctor_id or not patient_id:
             return err("doctor_id y patient_id son obligatorios")
+        try:
+            doctor_id, patient_id = int(doctor_id), int(patient_id)
+        except (TypeError, ValueError):
+            return err("doctor_id y patient_id deben ser enteros")
 
         # Normaliza fecha (si no viene, hoy)
         if fecha_str:
@@ -374,13 +931,12 @@ def share_with_doctor():
         db = get_db()
         cur = db.cursor()
 
-        # Verifica existencia
-        cur.execute("SELECT doctor_id FROM doctors WHERE doctor_id=%s LIMIT 1", (doctor_id,))
-        if cur.fetchone() is None:
+        # Verifica existencia (cache de IDs; la FK del INSERT es la última palabra)
+        if lookup_doctor(cur, doctor_id) is None:
             return err("doctor_id no existe")
 
-        cur.execute("SELECT id FROM users WHERE id=%s LIMIT 1", (patient_id,))
-        if cur.fetchone() is None:
+        patient = lookup_user(cur, patient_id)
+        if patient is None:
             return err("patient_id no existe")
 
         # Inserta
@@ -388,12 +944,20 @@ def share_with_doctor():
             INSERT INTO doctor_patients (doctor_id, patient_id, note, fecha)
             VALUES (%s, %s, %s, %s)
         """, (doctor_id, patient_id, note, fecha))
+        new_id = cur.lastrowid
+
+        # Resumen doctor-paciente en la misma transacción
+        upsert_patient_summary(cur, doctor_id, patient, fecha)
         db.commit()
 
-        new_id = cur.lastrowid
         return ok({"id": new_id, "doctor_id": doctor_id, "patient_id": patient_id, "fecha": str(fecha)}, status=201)
 
     except Exception as e:
+        if is_fk_violation(e):
+            db.rollback()
+            known_doctors.pop(doctor_id)
+            known_users.pop(patient_id)
+            return err("doctor_id o patient_id no existe")
         import traceback, sys
         print("ERROR /patients/share:", e, file=sys.stderr)
         traceback.print_exc()
@@ -402,7 +966,27 @@ def share_with_doctor():
         if cur:
             cur.close()
 
-@app.get("/doctors/<int:doctor_id>/patients")
+# Resumen (lectura por rango del índice de doctor_patient_summary)
+DOCTOR_PATIENTS_SQL = """
+    SELECT patient_id, patient_fullname, last_shared_date, shares_count
+    FROM doctor_patient_summary
+    WHERE doctor_id = %s
+    ORDER BY last_shared_date DESC, patient_fullname ASC
+"""
+
+PATIENT_SQL = """
+    SELECT id, first_name, last_name, email, phone, username
+    FROM users WHERE id=%s LIMIT 1
+"""
+
+PATIENT_NOTES_SQL = """
+    SELECT id, fecha, note, created_at
+    FROM doctor_patients
+    WHERE doctor_id=%s AND patient_id=%s
+    ORDER BY fecha DESC, id DESC
+"""
+
+@api.get("/doctors/<int:doctor_id>/patients")
 def list_patients_for_doctor(doctor_id):
     """Lista pacientes que han compartido con el doctor."""
     cur = None
@@ -411,25 +995,12 @@ def list_patients_for_doctor(doctor_id):
         cur = db.cursor()
 
         # Confirmar doctor
-        cur.execute("SELECT doctor_id FROM doctors WHERE doctor_id=%s LIMIT 1", (doctor_id,))
-        if cur.fetchone() is None:
+        if lookup_doctor(cur, doctor_id) is None:
             return err("doctor_id no existe", 404)
 
-        # Resumen
-        cur.execute("""
-            SELECT
-              dp.patient_id,
-              CONCAT(u.first_name, ' ', u.last_name) AS patient_fullname,
-              MAX(dp.fecha) AS last_shared_date,
-              COUNT(*) AS shares_count
-            FROM doctor_patients dp
-            JOIN users u ON u.id = dp.patient_id
-            WHERE dp.doctor_id = %s
-            GROUP BY dp.patient_id, patient_fullname
-            ORDER BY last_shared_date DESC, patient_fullname ASC
-        """, (doctor_id,))
+        cur.execute(DOCTOR_PATIENTS_SQL, (doctor_id,))
         rows = cur.fetchall()
-        return ok(rows)
+        return ok_negotiated(rows)
     except Exception as e:
         import traceback, sys
         print("ERROR GET /doctors/<id>/patients:", e, file=sys.stderr)
@@ -439,7 +1010,7 @@ def list_patients_for_doctor(doctor_id):
         if cur:
             cur.close()
 
-@app.get("/doctors/<int:doctor_id>/patients/<int:patient_id>")
+@api.get("/doctors/<int:doctor_id>/patients/<int:patient_id>")
 def patient_detail_for_doctor(doctor_id, patient_id):
     """Detalle de un paciente y sus notas/fechas compartidas."""
     cur = None
@@ -448,29 +1019,20 @@ def patient_detail_for_doctor(doctor_id, patient_id):
         cur = db.cursor()
 
         # Confirmar doctor
-        cur.execute("SELECT doctor_id FROM doctors WHERE doctor_id=%s LIMIT 1", (doctor_id,))
-        if cur.fetchone() is None:
+        if lookup_doctor(cur, doctor_id) is None:
             return err("doctor_id no existe", 404)
 
         # Datos del paciente
-        cur.execute("""
-            SELECT id, first_name, last_name, email, phone, username
-            FROM users WHERE id=%s LIMIT 1
-        """, (patient_id,))
+        cur.execute(PATIENT_SQL, (patient_id,))
         patient = cur.fetchone()
         if patient is None:
             return err("patient_id no existe", 404)
 
         # Notas compartidas a ese doctor
-        cur.execute("""
-            SELECT id, fecha, note, created_at
-            FROM doctor_patients
-            WHERE doctor_id=%s AND patient_id=%s
-            ORDER BY fecha DESC, id DESC
-        """, (doctor_id, patient_id))
+        cur.execute(PATIENT_NOTES_SQL, (doctor_id, patient_id))
         notes = cur.fetchall()
 
-        return ok({"patient": patient, "notes": notes})
+        return ok_negotiated({"patient": patient, "notes": notes})
     except Exception as e:
         import traceback, sys
         print("ERROR GET /doctors/<id>/patients/<pid>:", e, file=sys.stderr)
@@ -480,167 +1042,1223 @@ def patient_detail_for_doctor(doctor_id, patient_id):
         if cur:
             cur.close()
 
+SHARE_EXISTS_SQL = "SELECT 1 FROM doctor_patients WHERE doctor_id=%s AND patient_id=%s LIMIT 1"
+
+# Fechas ya formateadas en SQL: mismo texto (ISO) en CSV y NDJSON. Orden del índice
+# (user_id, entry_date, id): sin filesort, MySQL envía las filas según las lee.
+EXPORT_COLUMNS = ("id", "entry_date", "entry_time", "symptom_name", "intensity", "notes", "created_at")
+EXPORT_SQL = """
+    SELECT id, DATE_FORMAT(entry_date, '%%Y-%%m-%%d'), DATE_FORMAT(entry_time, '%%H:%%i:%%s'),
+           symptom_name, intensity, notes, DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s')
+    FROM symptom_entries
+    WHERE user_id=%s
+"""
+
+@api.get("/doctors/<int:doctor_id>/patients/<int:patient_id>/export")
+def export_patient_symptoms(doctor_id, patient_id):
+    """
+    Historial completo de síntomas del paciente en streaming (memoria constante).
+    query params:
+      - format: csv (por defecto) | ndjson   (o header Accept: text/csv / application/x-ndjson)
+      - from / to (YYYY-MM-DD) opcionales
+    Solo si el paciente ha compartido alguna vez con el doctor.
+    """
+    fmt = request.args.get("format")
+    if fmt is None:
+        best = request.accept_mimetypes.best_match(["text/csv", "application/x-ndjson"])
+        fmt = "ndjson" if best == "application/x-ndjson" else "csv"
+    if fmt not in ("csv", "ndjson"):
+        return err("format debe ser csv o ndjson")
+
+    sql, args = EXPORT_SQL, [patient_id]
+    for param, cond in (("from", " AND entry_date >= %s"), ("to", " AND entry_date <= %s")):
+        value = request.args.get(param)
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                return err(f"{param} debe tener formato YYYY-MM-DD")
+            sql += cond
+            args.append(value)
+    sql += " ORDER BY entry_date, id"
+
+    db = get_db()
+    cur = db.cursor()
+    try:
+        cur.execute(SHARE_EXISTS_SQL, (doctor_id, patient_id))
+        if cur.fetchone() is None:
+            return err("El paciente no ha compartido sus datos con este doctor", 404)
+    finally:
+        cur.close()
+
+    cur = db.cursor(MySQLdb.cursors.SSCursor)
+    try:
+        cur.execute(sql, tuple(args))
+    except Exception as e:
+        cur.close()
+        return err(f"Error exportando registros: {str(e)}", 500)
+
+    if fmt == "csv":
+        body, mimetype = stream_csv_rows(cur, EXPORT_COLUMNS), "text/csv"
+    else:
+        body, mimetype = stream_ndjson_rows(cur, EXPORT_COLUMNS), "application/x-ndjson"
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = (
+        f'attachment; filename="paciente_{patient_id}_sintomas.{fmt}"')
+    return resp
+
+DASHBOARD_PAGE_MAX    = 100
+DASHBOARD_NOTES_MAX   = 20
+DASHBOARD_ENTRIES_MAX = 50
+
+@api.get("/doctors/<int:doctor_id>/dashboard")
+def doctor_dashboard(doctor_id):
+    """
+    Una página de pacientes del doctor con su ficha, últimas notas compartidas y últimos
+    registros de síntomas. Siempre 5 consultas, sea cual sea el tamaño de página.
+    query params:
+      - limit   (por defecto 20, máx DASHBOARD_PAGE_MAX)
+      - cursor  next_cursor de la página anterior
+      - notes   notas por paciente (por defecto 3)
+      - entries registros de síntomas por paciente (por defecto 10)
+      - days    ventana de días para los registros (por defecto 90)
+    """
+    limit   = request.args.get("limit", 20, type=int)
+    n_notes = request.args.get("notes", 3, type=int)
+    n_entries = request.args.get("entries", 10, type=int)
+    days    = request.args.get("days", 90, type=int)
+    token   = request.args.get("cursor")
+    if not (1 <= limit <= DASHBOARD_PAGE_MAX):
+        return err(f"limit debe estar entre 1 y {DASHBOARD_PAGE_MAX}")
+    if not (0 <= n_notes <= DASHBOARD_NOTES_MAX) or not (0 <= n_entries <= DASHBOARD_ENTRIES_MAX):
+        return err(f"notes (máx {DASHBOARD_NOTES_MAX}) y entries (máx {DASHBOARD_ENTRIES_MAX}) fuera de rango")
+    if days < 1:
+        return err("days debe ser mayor que 0")
+
+    cur = None
+    try:
+        db = get_db()
+        cur = db.cursor()
+
+        # 1) Confirmar doctor
+        if lookup_doctor(cur, doctor_id) is None:
+            return err("doctor_id no existe", 404)
+
+        # 2) Página de pacientes (keyset sobre last_shared_date, patient_id)
+        sql = """
+            SELECT patient_id, patient_fullname, last_shared_date, shares_count
+            FROM doctor_patient_summary
+            WHERE doctor_id = %s
+        """
+        args = [doctor_id]
+        if token:
+            parts = decode_cursor(token)
+            if not parts or len(parts) != 2:
+                return err("cursor inválido")
+            sql += " AND (last_shared_date < %s OR (last_shared_date = %s AND patient_id < %s))"
+            args.extend([parts[0], parts[0], parts[1]])
+        sql += " ORDER BY last_shared_date DESC, patient_id DESC LIMIT %s"
+        args.append(limit + 1)
+        cur.execute(sql, tuple(args))
+        page = list(cur.fetchall())
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(page[-1]["last_shared_date"], page[-1]["patient_id"])
+        if not page:
+            return ok_negotiated({"patients": [], "next_cursor": None})
+
+        ids = [r["patient_id"] for r in page]
+        placeholders = ",".join(["%s"] * len(ids))
+
+        # 3) Fichas de pacientes
+        cur.execute(f"""
+            SELECT id, first_name, last_name, email, phone, username
+            FROM users WHERE id IN ({placeholders})
+        """, tuple(ids))
+        patients = {r["id"]: r for r in cur.fetchall()}
+
+        # 4) Últimas N notas por paciente
+        notes = {pid: [] for pid in ids}
+        if n_notes:
+            cur.execute(f"""
+                SELECT patient_id, id, fecha, note, created_at FROM (
+                    SELECT patient_id, id, fecha, note, created_at,
+                           ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY fecha DESC, id DESC) AS rn
+                    FROM doctor_patients
+                    WHERE doctor_id = %s AND patient_id IN ({placeholders})
+                ) t
+                WHERE rn <= %s
+                ORDER BY patient_id, fecha DESC, id DESC
+            """, (doctor_id, *ids, n_notes))
+            for r in cur.fetchall():
+                notes[r.pop("patient_id")].append(r)
+
+        # 5) Últimos N registros de síntomas por paciente (dentro de la ventana de días)
+        entries = {pid: [] for pid in ids}
+        if n_entries:
+            cur.execute(f"""
+                SELECT user_id, id, symptom_name, intensity, entry_date, entry_time, notes, created_at FROM (
+                    SELECT user_id, id, symptom_name, intensity, entry_date,
+                           DATE_FORMAT(entry_time, '%%H:%%i:%%s') AS entry_time, notes, created_at,
+                           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY entry_date DESC, id DESC) AS rn
+                    FROM symptom_entries
+                    WHERE user_id IN ({placeholders}) AND entry_date >= CURDATE() - INTERVAL %s DAY
+                ) t
+                WHERE rn <= %s
+                ORDER BY user_id, entry_date DESC, id DESC
+            """, (*ids, days, n_entries))
+            for r in cur.fetchall():
+                entries[r.pop("user_id")].append(r)
+
+        data = [{
+            "patient": patients.get(r["patient_id"]),
+            "last_shared_date": r["last_shared_date"],
+            "shares_count": r["shares_count"],
+            "notes": notes[r["patient_id"]],
+            "latest_entries": entries[r["patient_id"]],
+        } for r in page]
+        return ok_negotiated({"patients": data, "next_cursor": next_cursor})
+    except Exception as e:
+        import traceback, sys
+        print("ERROR GET /doctors/<id>/dashboard:", e, file=sys.stderr)
+        traceback.print_exc()
+        return err("Error interno en dashboard del doctor", 500)
+    finally:
+        if cur:
+            cur.close()
+
+# -----------------------------
+# Analítica de cohorte del doctor (ver analytics.py)
+# -----------------------------
+ANALYTICS_DAYS_MAX  = 730
+ANALYTICS_TOP_MAX   = 50
+ANALYTICS_MAX_ROWS  = 500000
+ANALYTICS_CACHE_TTL = 600   # segundos; la huella de la cohorte la invalida antes
+
+# (doctor_id, desde, top, min_points, min_slope) -> (huella, resultado)
+analytics_cache = TTLCache(maxsize=1024, ttl=ANALYTICS_CACHE_TTL)
+
+# Huella de la cohorte: cambia con cada share (pacientes, shares_count) y con cada alta,
+# edición o borrado de registros (symptom_change_seq.seq solo crece), también si los
+# hace otro worker o la cola de ingesta. Una lectura por paciente sobre claves primarias.
+COHORT_FINGERPRINT_SQL = """
+    SELECT COUNT(*) AS patients, COALESCE(SUM(d.shares_count), 0) AS shares,
+           COALESCE(SUM(s.seq), 0) AS seq
+    FROM doctor_patient_summary d
+    LEFT JOIN symptom_change_seq s ON s.user_id = d.patient_id
+    WHERE d.doctor_id = %s
+"""
+
+# Todos los registros de la cohorte en la ventana, en una consulta (índice user_id, entry_date)
+COHORT_ENTRIES_SQL = """
+    SELECT e.user_id, TO_DAYS(e.entry_date), e.symptom_name, e.intensity
+    FROM doctor_patient_summary d
+    JOIN symptom_entries e ON e.user_id = d.patient_id AND e.entry_date >= %s
+    WHERE d.doctor_id = %s
+    LIMIT %s
+"""
+
+COHORT_NAMES_SQL = "SELECT patient_id, patient_fullname FROM doctor_patient_summary WHERE doctor_id=%s"
+
+@api.get("/doctors/<int:doctor_id>/analytics")
+def doctor_analytics(doctor_id):
+    """
+    Analítica de todos los pacientes que compartieron con el doctor: distribución por
+    síntoma, co-ocurrencia de síntomas el mismo día y pacientes con intensidad al alza.
+    query params:
+      - days       ventana de días (por defecto 90, máx ANALYTICS_DAYS_MAX)
+      - top        síntomas en la matriz de co-ocurrencia (por defecto 15, máx ANALYTICS_TOP_MAX)
+      - min_points registros mínimos para calcular una tendencia (por defecto 5)
+      - min_slope  puntos de intensidad por semana para considerar "al alza" (por defecto 0.1)
+    Cacheada por doctor; un share o un registro nuevo de la cohorte la recalcula.
+    """
+    if analytics.np is None:
+        return err("La analítica requiere numpy (pip install numpy)", 501)
+    days       = request.args.get("days", 90, type=int)
+    top        = request.args.get("top", 15, type=int)
+    min_points = request.args.get("min_points", 5, type=int)
+    min_slope  = request.args.get("min_slope", 0.1, type=float)
+    if not (1 <= days <= ANALYTICS_DAYS_MAX):
+        return err(f"days debe estar entre 1 y {ANALYTICS_DAYS_MAX}")
+    if not (1 <= top <= ANALYTICS_TOP_MAX):
+        return err(f"top debe estar entre 1 y {ANALYTICS_TOP_MAX}")
+    if min_points < 2:
+        return err("min_points debe ser al menos 2")
+    date_from = date.today() - timedelta(days=days - 1)
+
+    cur = None
+    try:
+        db = get_db()
+        cur = db.cursor()
+        if lookup_doctor(cur, doctor_id) is None:
+            return err("doctor_id no existe", 404)
+
+        cur.execute(COHORT_FINGERPRINT_SQL, (doctor_id,))
+        r = cur.fetchone()
+        fingerprint = (int(r["patients"]), int(r["shares"]), int(r["seq"]))
+        key = (doctor_id, date_from, top, min_points, min_slope)
+        cached = analytics_cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return ok_negotiated(cached[1])
+
+        cur.execute(COHORT_NAMES_SQL, (doctor_id,))
+        names = {row["patient_id"]: row["patient_fullname"] for row in cur.fetchall()}
+        cur.close()
+
+        # tuplas, sin un dict por fila: se pasan a columnas NumPy de una vez
+        cur = db.cursor(MySQLdb.cursors.Cursor)
+        cur.execute(COHORT_ENTRIES_SQL, (date_from, doctor_id, ANALYTICS_MAX_ROWS + 1))
+        rows = cur.fetchall()
+        if len(rows) > ANALYTICS_MAX_ROWS:
+            return err(f"Más de {ANALYTICS_MAX_ROWS} registros en la ventana; reduce days", 422)
+
+        data = analytics.cohort(*analytics.columns(rows), top=top, min_points=min_points,
+                                min_slope=min_slope)
+        for t in data["trending_up"]:
+            t["patient_fullname"] = names.get(t["patient_id"])
+        data.update(doctor_id=doctor_id, date_from=date_from.isoformat(), days=days)
+        analytics_cache.set(key, (fingerprint, data))
+        return ok_negotiated(data)
+    except Exception as e:
+        import traceback, sys
+        print("ERROR GET /doctors/<id>/analytics:", e, file=sys.stderr)
+        traceback.print_exc()
+        return err("Error interno en analítica del doctor", 500)
+    finally:
+        if cur:
+            cur.close()
+
 # -----------------------------
 # Síntomas (Registros diarios)
 # -----------------------------
-@app.post("/symptoms")
+SYMPTOM_BATCH_MAX = 500
+
+SYMPTOM_INSERT_SQL = """
+    INSERT INTO symptom_entries(user_id, symptom_name, intensity, entry_date, entry_time, notes,
+                                change_seq, created_seq)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+"""
+
+# Reserva n números de la secuencia de cambios del usuario. El lock de la fila del
+# contador dura hasta el commit, así que los cambios de un usuario se confirman en
+# orden de secuencia (un lector nunca ve el N+1 sin el N).
+CHANGE_SEQ_RESERVE_SQL = """
+    INSERT INTO symptom_change_seq (user_id, seq) VALUES (%s, LAST_INSERT_ID(%s))
+    ON DUPLICATE KEY UPDATE seq = LAST_INSERT_ID(seq + VALUES(seq))
+"""
+
+def reserve_change_seqs(cur, user_id, n=1):
+    """Reserva n números consecutivos para user_id y devuelve el primero. No hace commit."""
+    cur.execute(CHANGE_SEQ_RESERVE_SQL, (user_id, n))
+    cur.execute("SELECT LAST_INSERT_ID() AS seq")
+    return int(cur.fetchone()["seq"]) - n + 1
+
+SYMPTOM_NAME_MAX = 100   # VARCHAR(100): también es parte de la PK de symptom_rollups
+TIME_RE = re.compile(r"([01]\d|2[0-3]):[0-5]\d(:[0-5]\d)?")
+
+def parse_symptom_entry(payload):
+    """
+    Valida un registro de síntoma. Devuelve (fila, None) o (None, mensaje).
+    Valida todo lo que haría fallar el INSERT o el upsert de rollups: en el batch un
+    solo registro inválido tumbaría la sentencia multi-fila de todos los demás.
+    """
+    missing = required_fields(payload, ["user_id", "symptom_name", "intensity", "entry_date"])
+    if missing:
+        return None, f"Faltan campos: {', '.join(missing)}"
+
+    try:
+        user_id   = int(payload["user_id"])
+        intensity = int(payload["intensity"])
+    except (TypeError, ValueError):
+        return None, "user_id e intensity deben ser enteros"
+    if not (0 <= intensity <= 10):
+        return None, "intensity debe estar entre 0 y 10"
+
+    symptom_name = str(payload["symptom_name"]).strip()
+    if not symptom_name:
+        return None, "symptom_name no puede estar vacío"
+    if len(symptom_name) > SYMPTOM_NAME_MAX:
+        return None, f"symptom_name admite como mucho {SYMPTOM_NAME_MAX} caracteres"
+    entry_date   = str(payload["entry_date"]).strip()
+    try:
+        date.fromisoformat(entry_date)
+    except ValueError:
+        return None, "entry_date debe tener formato YYYY-MM-DD"
+    entry_time   = payload.get("entry_time") or None
+    if entry_time is not None and not (isinstance(entry_time, str) and TIME_RE.fullmatch(entry_time)):
+        return None, "entry_time debe tener formato HH:MM o HH:MM:SS"
+    notes        = payload.get("notes")
+    if notes is not None and not isinstance(notes, str):
+        return None, "notes debe ser texto"
+    return (user_id, symptom_name, intensity, entry_date, entry_time, notes), None
+
+ROLLUP_UPSERT_SQL = """
+    INSERT INTO symptom_rollups
+        (user_id, granularity, period_start, symptom_name,
+         entries_count, intensity_sum, intensity_min, intensity_max)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE
+        entries_count = entries_count + VALUES(entries_count),
+        intensity_sum = intensity_sum + VALUES(intensity_sum),
+        intensity_min = LEAST(intensity_min, VALUES(intensity_min)),
+        intensity_max = GREATEST(intensity_max, VALUES(intensity_max))
+"""
+
+def period_starts(entry_date):
+    """Inicio del día, semana (lunes) y mes de una fecha 'YYYY-MM-DD'."""
+    d = date.fromisoformat(entry_date) if isinstance(entry_date, str) else entry_date
+    return {"day": d, "week": d - timedelta(days=d.weekday()), "month": d.replace(day=1)}
+
+def update_symptom_rollups(cur, rows):
+    """Acumula las filas en symptom_rollups (un upsert por bucket). No hace commit."""
+    buckets = {}
+    for user_id, symptom_name, intensity, entry_date, *_ in rows:
+        for granularity, start in period_starts(entry_date).items():
+            key = (user_id, granularity, start, symptom_name)
+            b = buckets.get(key)
+            if b is None:
+                buckets[key] = [1, intensity, intensity, intensity]
+            else:
+                b[0] += 1
+                b[1] += intensity
+                b[2] = min(b[2], intensity)
+                b[3] = max(b[3], intensity)
+    # orden fijo de claves para no provocar deadlocks entre transacciones concurrentes
+    cur.executemany(ROLLUP_UPSERT_SQL, [(*k, *v) for k, v in sorted(buckets.items())])
+
+ROLLUP_RECOMPUTE_SQL = """
+    SELECT COUNT(*) AS n, SUM(intensity) AS total, MIN(intensity) AS lo, MAX(intensity) AS hi
+    FROM symptom_entries
+    WHERE user_id=%s AND symptom_name=%s AND entry_date BETWEEN %s AND %s
+"""
+
+ROLLUP_REPLACE_SQL = """
+    INSERT INTO symptom_rollups
+        (user_id, granularity, period_start, symptom_name,
+         entries_count, intensity_sum, intensity_min, intensity_max)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE
+        entries_count = VALUES(entries_count),
+        intensity_sum = VALUES(intensity_sum),
+        intensity_min = VALUES(intensity_min),
+        intensity_max = VALUES(intensity_max)
+"""
+
+def period_end(granularity, start):
+    if granularity == "day":
+        return start
+    if granularity == "week":
+        return start + timedelta(days=6)
+    return (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+def recompute_symptom_rollups(cur, entries):
+    """
+    Recalcula desde symptom_entries los buckets de [(user_id, symptom_name, entry_date)]
+    (tras editar o borrar: min/max no se pueden restar). No hace commit.
+    """
+    keys = set()
+    for user_id, symptom_name, entry_date in entries:
+        for granularity, start in period_starts(entry_date).items():
+            keys.add((user_id, granularity, start, symptom_name))
+    for user_id, granularity, start, symptom_name in sorted(keys):
+        cur.execute(ROLLUP_RECOMPUTE_SQL,
+                    (user_id, symptom_name, start, period_end(granularity, start)))
+        r = cur.fetchone()
+        if r["n"]:
+            cur.execute(ROLLUP_REPLACE_SQL, (user_id, granularity, start, symptom_name,
+                                             r["n"], r["total"], r["lo"], r["hi"]))
+        else:
+            cur.execute("""
+                DELETE FROM symptom_rollups
+                WHERE user_id=%s AND granularity=%s AND period_start=%s AND symptom_name=%s
+            """, (user_id, granularity, start, symptom_name))
+
+def insert_symptom_rows(cur, rows):
+    """
+    INSERT multi-fila (insert_rows) y actualiza symptom_rollups en la misma transacción.
+    Cada fila recibe su número de la secuencia de cambios de su usuario. No hace commit.
+    Devuelve los ids insertados, alineados con rows.
+    """
+    counts = {}
+    for row in rows:
+        counts[row[0]] = counts.get(row[0], 0) + 1
+    next_seq = {uid: reserve_change_seqs(cur, uid, n) for uid, n in sorted(counts.items())}
+    seq_rows = []
+    for row in rows:
+        seq = next_seq[row[0]]
+        next_seq[row[0]] = seq + 1
+        seq_rows.append((*row, seq, seq))
+    ids = insert_rows(cur, SYMPTOM_INSERT_SQL, seq_rows)
+    update_symptom_rollups(cur, rows)
+    return ids
+
+def insert_known_symptom_rows(db, cur, rows):
+    """
+    Inserta, con commit, las filas cuyo user_id existe (una consulta para validarlos).
+    Devuelve (usuarios conocidos, ids de las filas insertadas en orden). Si la FK falla
+    (1452) porque un user_id cacheado ya no existe, olvida los del lote, los vuelve a
+    consultar y reintenta una vez solo con los válidos: un id obsoleto no tumba el lote.
+    """
+    for attempt in range(2):
+        known = lookup_users(cur, [row[0] for row in rows])
+        valid = [row for row in rows if row[0] in known]
+        if not valid:
+            return known, []
+        try:
+            ids = insert_symptom_rows(cur, valid)
+            db.commit()
+            return known, ids
+        except MySQLdb.IntegrityError as e:
+            if attempt or not is_fk_violation(e):
+                raise
+            db.rollback()
+            forget_ids("users", {row[0] for row in rows})
+
+def write_symptom_batch(rows):
+    """
+    Escritor de la cola de ingesta: valida los user_id con una consulta e inserta el lote
+    en una sola transacción. Devuelve [(id, None) | (None, error)] alineado con rows.
+    """
+    conn = get_pool().acquire()
+    tracer = sql_tracer if current_app.config['SQL_TRACE'] else None
+    db = metrics.InstrumentedConnection(conn, metrics.RequestStats(), tracer, "<ingesta>")
+    cur = db.cursor()
+    try:
+        known, ids = insert_known_symptom_rows(db, cur, rows)
+        ids = iter(ids)
+        return [(next(ids), None) if row[0] in known else (None, "user_id no existe")
+                for row in rows]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
+        get_pool().release(conn)
+
+_ingest = None
+
+def get_ingest_queue():
+    """Cola de ingesta del proceso, creada en el primer uso; se vacía al salir."""
+    global _ingest
+    if _ingest is None:
+        with _pool_lock:
+            if _ingest is None:
+                cfg = current_app.config
+                app = current_app._get_current_object()
+
+                def writer(rows):
+                    # el hilo escritor no tiene contexto de app propio
+                    with app.app_context():
+                        return write_symptom_batch(rows)
+
+                _ingest = IngestQueue(
+                    writer,
+                    maxsize=cfg['SYMPTOM_INGEST_QUEUE_MAX'],
+                    batch_size=cfg['SYMPTOM_INGEST_BATCH'],
+                    flush_interval=cfg['SYMPTOM_INGEST_FLUSH_MS'] / 1000.0,
+                )
+                atexit.register(_ingest.close)
+    return _ingest
+
+@api.post("/symptoms")
 def create_symptom():
     """
     body: {user_id, symptom_name, intensity, entry_date, entry_time?, notes?}
     - intensity: 0..10
     - entry_date: 'YYYY-MM-DD'
     - entry_time: 'HH:MM:SS' (opcional)
+    Con SYMPTOM_INGEST_ASYNC y el header "Prefer: respond-async" el registro se encola:
+    responde 202 con {provisional_id} (estado en GET /symptoms/pending/<provisional_id>)
+    o 503 con Retry-After si la cola está llena.
     """
     payload = request.get_json(silent=True) or {}
-    missing = required_fields(payload, ["user_id", "symptom_name", "intensity", "entry_date"])
-    if missing:
-        return err(f"Faltan campos: {', '.join(missing)}")
+    row, error = parse_symptom_entry(payload)
+    if error:
+        return err(error)
 
-    user_id      = payload["user_id"]
-    symptom_name = payload["symptom_name"].strip()
-    intensity    = int(payload["intensity"])
-    entry_date   = payload["entry_date"].strip()
-    entry_time   = payload.get("entry_time")
-    notes        = payload.get("notes")
-
-    if not (0 <= intensity <= 10):
-        return err("intensity debe estar entre 0 y 10")
+    if current_app.config['SYMPTOM_INGEST_ASYNC'] and "respond-async" in request.headers.get("Prefer", ""):
+        try:
+            provisional_id = get_ingest_queue().submit(row)
+        except QueueFull:
+            resp, status = err("Cola de registros llena, reintenta en unos segundos", 503)
+            resp.headers["Retry-After"] = "1"
+            return resp, status
+        resp, status = ok({"provisional_id": provisional_id, "status": "queued"}, status=202)
+        resp.headers["Location"] = f"/symptoms/pending/{provisional_id}"
+        resp.headers["Preference-Applied"] = "respond-async"
+        return resp, status
 
     db = get_db()
     cur = db.cursor()
     try:
         # verificar usuario existe
-        cur.execute("SELECT id FROM users WHERE id=%s", (user_id,))
-        if not cur.fetchone():
+        if lookup_user(cur, row[0]) is None:
             return err("user_id no existe")
 
-        cur.execute("""
-            INSERT INTO symptom_entries(user_id, symptom_name, intensity, entry_date, entry_time, notes)
-            VALUES (%s,%s,%s,%s,%s,%s)
-        """, (user_id, symptom_name, intensity, entry_date, entry_time, notes))
+        new_id, = insert_symptom_rows(cur, [row])
         db.commit()
-        return ok({"id": cur.lastrowid}, status=201)
+        return ok({"id": new_id}, status=201)
     except Exception as e:
         db.rollback()
+        if is_fk_violation(e):
+            known_users.pop(row[0])
+            return err("user_id no existe")
         return err(f"Error creando registro: {str(e)}", 500)
     finally:
         cur.close()
 
-@app.get("/users/<int:user_id>/symptoms")
+@api.get("/symptoms/pending/<provisional_id>")
+def pending_symptom(provisional_id):
+    """Estado de un registro encolado: queued | written (con id) | failed (con error)."""
+    result = get_ingest_queue().status(provisional_id) if _ingest is not None else None
+    if result is None:
+        return err("provisional_id desconocido (o de otro proceso / ya olvidado)", 404)
+    return ok(result)
+
+@api.post("/symptoms/batch")
+def create_symptoms_batch():
+    """
+    body: {entries: [{user_id, symptom_name, intensity, entry_date, entry_time?, notes?, client_id?}, ...]}
+    (también acepta directamente la lista)
+    - valida todos los user_id con UNA consulta
+    - inserta las filas válidas con un INSERT multi-fila y un solo commit
+    - devuelve un resultado por elemento, en el mismo orden, con el id insertado
+      (client_id se devuelve tal cual)
+    """
+    payload = request.get_json(silent=True)
+    entries = payload.get("entries") if isinstance(payload, dict) else payload
+    if not isinstance(entries, list) or not entries:
+        return err("entries debe ser una lista no vacía")
+    if len(entries) > SYMPTOM_BATCH_MAX:
+        return err(f"Máximo {SYMPTOM_BATCH_MAX} registros por lote", 413)
+
+    results = []
+    valid = []  # (índice, fila)
+    for i, item in enumerate(entries):
+        item = item if isinstance(item, dict) else {}
+        result = {"index": i, "ok": False}
+        if item.get("client_id") is not None:
+            result["client_id"] = item["client_id"]
+        results.append(result)
+
+        row, error = parse_symptom_entry(item)
+        if error:
+            result["error"] = error
+        else:
+            valid.append((i, row))
+
+    inserted = 0
+    db = get_db()
+    cur = db.cursor()
+    try:
+        if valid:
+            known, ids = insert_known_symptom_rows(db, cur, [row for _, row in valid])
+            ids = iter(ids)
+            for i, row in valid:
+                if row[0] in known:
+                    results[i].update(ok=True, id=next(ids))
+                    inserted += 1
+                else:
+                    results[i]["error"] = "user_id no existe"
+
+        return ok({
+            "inserted": inserted,
+            "failed": len(entries) - inserted,
+            "results": results,
+        })
+    except Exception as e:
+        db.rollback()
+        import traceback, sys
+        print("ERROR POST /symptoms/batch:", e, file=sys.stderr)
+        traceback.print_exc()
+        return err(f"Error creando registros: {str(e)}", 500)
+    finally:
+        cur.close()
+
+SYMPTOM_PAGE_MAX = 500
+
+def symptoms_query(user_id, params):
+    """
+    Arma la consulta de list_symptoms desde los query params (sirve para Flask y asgi.py).
+    Devuelve ({sql, args, limit, paged, stream}, None) o (None, mensaje de error).
+    """
+    date_from = params.get("from")
+    date_to   = params.get("to")
+    token     = params.get("cursor")
+    stream    = params.get("stream") in ("1", "true")
+    limit     = params.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = None
+    if limit is not None and not (1 <= limit <= SYMPTOM_PAGE_MAX):
+        return None, f"limit debe estar entre 1 y {SYMPTOM_PAGE_MAX}"
+    paged = not stream and (limit is not None or token is not None)
+    if paged and limit is None:
+        limit = SYMPTOM_PAGE_MAX
+
+    sql = """
+        SELECT id, user_id, symptom_name, intensity, entry_date,
+               DATE_FORMAT(entry_time, '%%H:%%i:%%s') AS entry_time, notes, created_at
+        FROM symptom_entries
+        WHERE user_id=%s
+    """
+    args = [user_id]
+    if date_from:
+        sql += " AND entry_date >= %s"
+        args.append(date_from)
+    if date_to:
+        sql += " AND entry_date <= %s"
+        args.append(date_to)
+    if token:
+        # Keyset sobre (entry_date, id), coherente con el ORDER BY
+        parts = decode_cursor(token)
+        if not parts or len(parts) != 2:
+            return None, "cursor inválido"
+        sql += " AND (entry_date < %s OR (entry_date = %s AND id < %s))"
+        args.extend([parts[0], parts[0], parts[1]])
+    sql += " ORDER BY entry_date DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT %s"
+        args.append(limit + 1 if paged else limit)
+    return {"sql": sql, "args": tuple(args), "limit": limit, "paged": paged, "stream": stream}, None
+
+def symptoms_page(rows, limit):
+    """{items, next_cursor} a partir de limit+1 filas."""
+    rows = list(rows)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["entry_date"], last["id"])
+    return {"items": rows, "next_cursor": next_cursor}
+
+@api.get("/users/<int:user_id>/symptoms")
 def list_symptoms(user_id: int):
     """
     query params:
       - from (YYYY-MM-DD) opcional
       - to   (YYYY-MM-DD) opcional
+      - limit  opcional (máx SYMPTOM_PAGE_MAX): activa paginación keyset
+      - cursor opcional: next_cursor devuelto por la página anterior
+      - stream=1 opcional: escribe las filas según se leen (cursor de servidor)
+      - format=columnar|msgpack opcional (o header Accept): ver ok_negotiated
+    Sin limit/cursor/stream responde la lista completa como siempre.
+    Con limit/cursor responde {items, next_cursor}.
+    Se comprime con gzip/brotli si el cliente manda Accept-Encoding (salvo stream=1).
+    """
+    plan, error = symptoms_query(user_id, request.args)
+    if error:
+        return err(error)
+    sql, args, limit = plan["sql"], plan["args"], plan["limit"]
+    paged, stream = plan["paged"], plan["stream"]
+
+    db = get_db()
+    if stream:
+        cur = db.cursor(MySQLdb.cursors.SSDictCursor)
+        try:
+            cur.execute(sql, args)
+        except Exception as e:
+            cur.close()
+            return err(f"Error listando registros: {str(e)}", 500)
+        return Response(stream_with_context(stream_json_rows(cur)), mimetype="application/json")
+
+    cur = db.cursor()
+    try:
+        cur.execute(sql, args)
+        rows = list(cur.fetchall())
+        if not paged:
+            return ok_negotiated(rows)
+        return ok_negotiated(symptoms_page(rows, limit))
+    except Exception as e:
+        return err(f"Error listando registros: {str(e)}", 500)
+    finally:
+        cur.close()
+
+@api.get("/users/<int:user_id>/symptoms/trends")
+def symptom_trends(user_id: int):
+    """
+    Tendencias por síntoma servidas desde symptom_rollups (no lee symptom_entries).
+    query params:
+      - granularity: day | week | month (por defecto day)
+      - from / to (YYYY-MM-DD) opcionales, filtran por inicio de periodo
+      - symptom opcional
     """
+    granularity = request.args.get("granularity", "day")
+    if granularity not in ("day", "week", "month"):
+        return err("granularity debe ser day, week o month")
     date_from = request.args.get("from")
     date_to   = request.args.get("to")
+    symptom   = request.args.get("symptom")
+
+    sql = """
+        SELECT symptom_name, DATE_FORMAT(period_start, '%%Y-%%m-%%d') AS period_start,
+               entries_count, intensity_sum, intensity_min, intensity_max
+        FROM symptom_rollups
+        WHERE user_id=%s AND granularity=%s
+    """
+    args = [user_id, granularity]
+    if date_from:
+        sql += " AND period_start >= %s"
+        args.append(date_from)
+    if date_to:
+        sql += " AND period_start <= %s"
+        args.append(date_to)
+    if symptom:
+        sql += " AND symptom_name=%s"
+        args.append(symptom)
+    sql += " ORDER BY period_start DESC, symptom_name"
 
     db = get_db()
     cur = db.cursor()
     try:
-        sql = """
-            SELECT id, user_id, symptom_name, intensity, entry_date,
-                   DATE_FORMAT(entry_time, '%%H:%%i:%%s') AS entry_time, notes, created_at
-            FROM symptom_entries
-            WHERE user_id=%s
-        """
-        args = [user_id]
-        if date_from:
-            sql += " AND entry_date >= %s"
-            args.append(date_from)
-        if date_to:
-            sql += " AND entry_date <= %s"
-            args.append(date_to)
-        sql += " ORDER BY entry_date DESC, id DESC"
-
         cur.execute(sql, tuple(args))
-        rows = cur.fetchall()
-        return ok(rows)
+        data = [{
+            "symptom_name": r["symptom_name"],
+            "period_start": r["period_start"],
+            "count": int(r["entries_count"]),
+            "mean": round(float(r["intensity_sum"]) / r["entries_count"], 2),
+            "min": r["intensity_min"],
+            "max": r["intensity_max"],
+        } for r in cur.fetchall()]
+        return ok_negotiated({"granularity": granularity, "trends": data})
     except Exception as e:
-        return err(f"Error listando registros: {str(e)}", 500)
+        return err(f"Error calculando tendencias: {str(e)}", 500)
     finally:
         cur.close()
 
+# -----------------------------
+# Edición / borrado y sync incremental
+# -----------------------------
+SYMPTOM_EDITABLE = ("symptom_name", "intensity", "entry_date", "entry_time", "notes")
+
+SYMPTOM_FOR_UPDATE_SQL = """
+    SELECT id, user_id, symptom_name, intensity, entry_date,
+           DATE_FORMAT(entry_time, '%%H:%%i:%%s') AS entry_time, notes, created_seq
+    FROM symptom_entries
+    WHERE id=%s AND user_id=%s
+    FOR UPDATE
+"""
+
+@api.patch("/users/<int:user_id>/symptoms/<int:entry_id>")
+def update_symptom(user_id, entry_id):
+    """body: cualquiera de {symptom_name, intensity, entry_date, entry_time, notes}"""
+    payload = request.get_json(silent=True) or {}
+    changes = {k: payload[k] for k in SYMPTOM_EDITABLE if k in payload}
+    if not changes:
+        return err(f"Nada que actualizar (campos: {', '.join(SYMPTOM_EDITABLE)})")
+
+    db = get_db()
+    cur = db.cursor()
+    try:
+        seq = reserve_change_seqs(cur, user_id)
+        cur.execute(SYMPTOM_FOR_UPDATE_SQL, (entry_id, user_id))
+        current = cur.fetchone()
+        if current is None:
+            db.rollback()
+            return err("Registro no existe", 404)
+
+        merged = {**current, "entry_date": current["entry_date"].isoformat(), **changes}
+        row, error = parse_symptom_entry(merged)
+        if error:
+            db.rollback()
+            return err(error)
+        _, symptom_name, intensity, entry_date, entry_time, notes = row
+
+        cur.execute("""
+            UPDATE symptom_entries
+            SET symptom_name=%s, intensity=%s, entry_date=%s, entry_time=%s, notes=%s, change_seq=%s
+            WHERE id=%s
+        """, (symptom_name, intensity, entry_date, entry_time, notes, seq, entry_id))
+        recompute_symptom_rollups(cur, [(user_id, current["symptom_name"], current["entry_date"]),
+                                        (user_id, symptom_name, entry_date)])
+        db.commit()
+        return ok({"id": entry_id, "change_seq": seq})
+    except Exception as e:
+        db.rollback()
+        return err(f"Error actualizando registro: {str(e)}", 500)
+    finally:
+        cur.close()
+
+@api.delete("/users/<int:user_id>/symptoms/<int:entry_id>")
+def delete_symptom(user_id, entry_id):
+    """Borra el registro y deja una marca (tombstone) para /symptoms/changes."""
+    db = get_db()
+    cur = db.cursor()
+    try:
+        seq = reserve_change_seqs(cur, user_id)
+        cur.execute(SYMPTOM_FOR_UPDATE_SQL, (entry_id, user_id))
+        current = cur.fetchone()
+        if current is None:
+            db.rollback()
+            return err("Registro no existe", 404)
+
+        cur.execute("DELETE FROM symptom_entries WHERE id=%s", (entry_id,))
+        cur.execute("""
+            INSERT INTO symptom_tombstones (user_id, change_seq, entry_id, created_seq)
+            VALUES (%s,%s,%s,%s)
+        """, (user_id, seq, entry_id, current["created_seq"]))
+        recompute_symptom_rollups(cur, [(user_id, current["symptom_name"], current["entry_date"])])
+        db.commit()
+        return ok({"id": entry_id, "deleted": True, "change_seq": seq})
+    except Exception as e:
+        db.rollback()
+        return err(f"Error borrando registro: {str(e)}", 500)
+    finally:
+        cur.close()
+
+SYMPTOM_CHANGES_MAX = 500
+
+SYMPTOM_CHANGES_SQL = """
+    SELECT id, user_id, symptom_name, intensity, entry_date,
+           DATE_FORMAT(entry_time, '%%H:%%i:%%s') AS entry_time, notes, created_at,
+           change_seq, created_seq
+    FROM symptom_entries
+    WHERE user_id=%s AND change_seq > %s
+    ORDER BY change_seq
+    LIMIT %s
+"""
+
+SYMPTOM_TOMBSTONES_SQL = """
+    SELECT entry_id, change_seq, created_seq
+    FROM symptom_tombstones
+    WHERE user_id=%s AND change_seq > %s
+    ORDER BY change_seq
+    LIMIT %s
+"""
+
+@api.get("/users/<int:user_id>/symptoms/changes")
+def symptom_changes(user_id: int):
+    """
+    Sync incremental: cambios posteriores a un token.
+    query params:
+      - since opcional: next_token de la respuesta anterior (sin él: todo el historial)
+      - limit opcional (máx SYMPTOM_CHANGES_MAX)
+    Devuelve {inserted, updated, deleted (ids), next_token, has_more}. Si has_more es
+    true hay que volver a llamar con el nuevo token. Coste proporcional a los cambios:
+    ambas lecturas van por índice (user_id, change_seq).
+    """
+    since = 0
+    token = request.args.get("since")
+    if token:
+        parts = decode_cursor(token)
+        if not parts or len(parts) != 1 or not isinstance(parts[0], int) or parts[0] < 0:
+            return err("since inválido")
+        since = parts[0]
+    try:
+        limit = int(request.args.get("limit", SYMPTOM_CHANGES_MAX))
+    except ValueError:
+        limit = 0
+    if not (1 <= limit <= SYMPTOM_CHANGES_MAX):
+        return err(f"limit debe estar entre 1 y {SYMPTOM_CHANGES_MAX}")
+
+    db = get_db()
+    cur = db.cursor()
+    try:
+        # las dos lecturas van en la misma transacción (misma instantánea)
+        cur.execute(SYMPTOM_CHANGES_SQL, (user_id, since, limit + 1))
+        events = [(r["change_seq"], r) for r in cur.fetchall()]
+        if since:
+            cur.execute(SYMPTOM_TOMBSTONES_SQL, (user_id, since, limit + 1))
+            events += [(r["change_seq"], r) for r in cur.fetchall()]
+        events.sort(key=lambda e: e[0])
+        has_more = len(events) > limit
+        events = events[:limit]
+
+        inserted, updated, deleted = [], [], []
+        for _, r in events:
+            created_seq = r.pop("created_seq")
+            if "entry_id" in r:
+                # creado y borrado después de since: el cliente nunca lo vio
+                if created_seq <= since:
+                    deleted.append(r["entry_id"])
+                continue
+            r.pop("change_seq")
+            (inserted if created_seq > since else updated).append(r)
+
+        last_seq = events[-1][0] if events else since
+        return ok_negotiated({
+            "inserted": inserted,
+            "updated": updated,
+            "deleted": deleted,
+            "next_token": encode_cursor(last_seq),
+            "has_more": has_more,
+        })
+    except Exception as e:
+        return err(f"Error leyendo cambios: {str(e)}", 500)
+    finally:
+        cur.close()
+
+# -----------------------------
+# Sesiones de admin (token firmado con app.secret_key)
+# -----------------------------
+ADMIN_TOKEN_MAX_AGE = 8 * 3600   # segundos
+ADMIN_SESSION_TTL   = 60         # segundos que un admin verificado se da por activo
+
+# admin_id (token) o ("headers", hmac de las credenciales) -> {id, username};
+# se vacía al cambiar el estado de cualquier admin
+admin_sessions = TTLCache(maxsize=1024, ttl=ADMIN_SESSION_TTL)
+
+# Contador de revocaciones en memoria compartida: se crea al importar (en el master de
+# serve.py, que precarga la app) y los workers lo heredan en el fork. Desactivar un admin
+# lo incrementa y cada worker vacía su admin_sessions en su siguiente request de admin,
+# sin consultar la base. Entre máquinas (o masters distintos) no se comparte: ahí el
+# límite sigue siendo ADMIN_SESSION_TTL.
+admin_revocations = multiprocessing.Value("Q", 0)
+_seen_revocations = 0
+
+def revoke_admin_sessions():
+    with admin_revocations.get_lock():
+        admin_revocations.value += 1
+
+def cached_admin(key):
+    """Entrada de admin_sessions, vaciándola antes si otro worker revocó sesiones."""
+    global _seen_revocations
+    current = admin_revocations.value
+    if current != _seen_revocations:
+        admin_sessions.clear()
+        _seen_revocations = current
+    return admin_sessions.get(key)
+
+def admin_token_serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt="admin-session")
+
+def issue_admin_token(admin_id):
+    return admin_token_serializer().dumps({"aid": admin_id})
+
+def admin_from_token(db, token):
+    """Valida el token y el estado del admin (cache TTL, DB solo en fallo de cache)."""
+    try:
+        data = admin_token_serializer().loads(token, max_age=ADMIN_TOKEN_MAX_AGE)
+    except SignatureExpired:
+        return None, ("Sesión de admin expirada", 401)
+    except BadSignature:
+        return None, ("Token de admin inválido", 401)
+
+    admin_id = data.get("aid")
+    row = cached_admin(admin_id)
+    if row is None:
+        cur = db.cursor()
+        try:
+            cur.execute("SELECT id, username FROM admins WHERE id=%s AND is_active=1 LIMIT 1", (admin_id,))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+        if not row:
+            return None, ("Admin inválido o inactivo", 403)
+        admin_sessions.set(admin_id, row)
+    return row, None
+
 def require_admin(db):
-    """Valida admin por headers X-Admin-User y X-Admin-Pass (texto plano)."""
+    """
+    Valida admin por header Authorization: Bearer <token> (emitido en /auth/login).
+    Mantiene compatibilidad con headers X-Admin-User y X-Admin-Pass (obsoletos: cada
+    request sin cache cuesta un scrypt en el pool de login). Una verificación correcta
+    se recuerda en admin_sessions, con la clave HMAC de las credenciales, igual que un token.
+    """
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        return admin_from_token(db, auth[7:].strip())
+
     u = request.headers.get("X-Admin-User")
     p = request.headers.get("X-Admin-Pass")
     if not u or not p:
         return None, ("Faltan credenciales de admin en headers", 401)
 
+    secret = current_app.secret_key
+    secret = secret.encode() if isinstance(secret, str) else secret
+    key = ("headers", hmac.new(secret, f"{u.lower()}\0{p}".encode(), hashlib.sha256).hexdigest())
+    admin = cached_admin(key)
+    if admin is not None:
+        return admin, None
+
     cur = db.cursor()
-    cur.execute("""
-        SELECT id, username FROM admins
-        WHERE username=%s AND password_plain=%s AND is_active=1
-        LIMIT 1
-    """, (u, p))
-    row = cur.fetchone()
+    try:
+        cur.execute("""
+            SELECT id, username, password_hash, password_plain FROM admins
+            WHERE username_norm=%s AND is_active=1
+            LIMIT 1
+        """, (u.lower(),))
+        row = cur.fetchone()
+        if row is None:
+            get_hasher().verify(p, None)
+        elif not check_credentials(db, cur, "admin", row, p):
+            row = None
+    finally:
+        cur.close()
     if not row:
         return None, ("Admin inválido o inactivo", 403)
-    return row, None
+    admin = {"id": row["id"], "username": row["username"]}
+    admin_sessions.set(key, admin)
+    return admin, None
 
-@app.route("/admin/users", methods=["GET"])
-def admin_list_users():
-    if not require_admin():
-        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+@api.patch("/admin/admins/<int:admin_id>/status")
+def admin_set_admin_status(admin_id):
+    db = get_db()
+    admin, error = require_admin(db)
+    if error: return err(error[0], error[1])
+    try:
+        data = request.get_json(force=True)
+        is_active = 1 if data.get("is_active") else 0
+        cur = db.cursor()
+        cur.execute("UPDATE admins SET is_active=%s WHERE id=%s", (is_active, admin_id))
+        db.commit()
+        revoke_admin_sessions()
+        return ok({"admin_id": admin_id, "is_active": bool(is_active)})
+    except Exception as e:
+        import traceback, sys
+        print("ERROR PATCH /admin/admins/.../status:", e, file=sys.stderr)
+        traceback.print_exc()
+        return err("Error actualizando estado de admin", 500)
+
+ADMIN_PAGE_MAX = 200
+ADMIN_PAGE_DEFAULT = 50
+
+# Columnas de búsqueda por tabla. Prefijo: cada columna tiene índice propio (MySQL une
+# los rangos con index_merge). Texto completo: índice FULLTEXT (migración 4).
+ADMIN_LIST_SPECS = {
+    "users": {
+        "id": "id",
+        "columns": "id, first_name, last_name, email, username, phone, is_active",
+        "prefix_norm": ("username_norm", "email_norm"),
+        "prefix": ("first_name", "last_name", "phone"),
+        "fulltext": "first_name, last_name, email, username, phone",
+    },
+    "doctors": {
+        "id": "doctor_id",
+        "columns": "doctor_id, first_name, last_name, email, username, is_active",
+        "prefix_norm": ("username_norm", "email_norm"),
+        "prefix": ("first_name", "last_name"),
+        "fulltext": "first_name, last_name, email, username",
+    },
+}
+
+# Conteos aproximados por (tabla, filtros): EXPLAIN o information_schema, no COUNT(*)
+admin_count_cache = TTLCache(maxsize=256, ttl=60)
+
+def like_prefix(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def fulltext_terms(text):
+    """'ana gar' -> '+ana* +gar*' (modo booleano, cada palabra como prefijo)."""
+    words = re.findall(r"\w+", text)
+    return " ".join(f"+{w}*" for w in words)
+
+def approx_count(cur, table, where, args):
+    key = (table, where, args)
+    total = admin_count_cache.get(key)
+    if total is None:
+        if not where:
+            cur.execute("""
+                SELECT TABLE_ROWS AS n FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s
+            """, (table,))
+            row = cur.fetchone()
+            total = int(row["n"] or 0) if row else 0
+        else:
+            cur.execute(f"EXPLAIN SELECT 1 FROM {table} WHERE {where}", args)
+            row = cur.fetchone()
+            total = int((row.get("rows") or 0) * float(row.get("filtered") or 100) / 100) if row else 0
+        admin_count_cache.set(key, total)
+    return total
 
+def admin_list(table):
+    """
+    query params:
+      - active: 1 | 0 opcional
+      - q opcional: búsqueda por prefijo en nombre, apellido, email, username (y teléfono)
+      - mode: prefix (por defecto) | fulltext  (palabras en cualquier orden, índice FULLTEXT)
+      - limit (máx ADMIN_PAGE_MAX) / cursor: paginación keyset por id descendente
+    Sin q/limit/cursor responde la tabla completa como antes.
+    Paginado responde {items, next_cursor, total_estimate} (total aproximado, barato).
+    """
+    spec = ADMIN_LIST_SPECS[table]
+    id_col = spec["id"]
     active = request.args.get("active")  # "1", "0" o None
-    params = []
-    sql = """SELECT id, first_name, last_name, email, username, phone, is_active
-             FROM users"""
-    if active in ("0", "1"):
-        sql += " WHERE is_active=%s"
-        params.append(int(active))
-
-    sql += " ORDER BY id DESC"
+    q      = (request.args.get("q") or "").strip()
+    mode   = request.args.get("mode", "prefix")
+    token  = request.args.get("cursor")
+    limit  = request.args.get("limit")
+    if mode not in ("prefix", "fulltext"):
+        return err("mode debe ser prefix o fulltext")
+    paged = bool(q or token or limit)
+    if paged:
+        try:
+            limit = int(limit or ADMIN_PAGE_DEFAULT)
+        except ValueError:
+            limit = 0
+        if not (1 <= limit <= ADMIN_PAGE_MAX):
+            return err(f"limit debe estar entre 1 y {ADMIN_PAGE_MAX}")
 
+    conds, args = [], []
+    if active in ("0", "1"):
+        conds.append("is_active=%s")
+        args.append(int(active))
+    if q and mode == "fulltext":
+        terms = fulltext_terms(q)
+        if not terms:
+            return err("q no tiene palabras para buscar")
+        conds.append(f"MATCH({spec['fulltext']}) AGAINST (%s IN BOOLEAN MODE)")
+        args.append(terms)
+    elif q:
+        ors = [f"{c} LIKE %s" for c in spec["prefix_norm"] + spec["prefix"]]
+        conds.append("(" + " OR ".join(ors) + ")")
+        args += [like_prefix(q.lower())] * len(spec["prefix_norm"]) + [like_prefix(q)] * len(spec["prefix"])
+    filters = " AND ".join(conds)
+    filter_args = tuple(args)
+
+    if token:
+        parts = decode_cursor(token)
+        if not parts or len(parts) != 1 or not isinstance(parts[0], int):
+            return err("cursor inválido")
+        conds.append(f"{id_col} < %s")
+        args.append(parts[0])
+
+    sql = f"SELECT {spec['columns']} FROM {table}"
+    if conds:
+        sql += " WHERE " + " AND ".join(conds)
+    sql += f" ORDER BY {id_col} DESC"
+    if paged:
+        sql += " LIMIT %s"
+        args.append(limit + 1)
+
+    cur = get_db().cursor()
     try:
-        conn = get_db()  # tu función para obtener conexión
-        cur = conn.cursor(dictionary=True)
-        cur.execute(sql, tuple(params))
-        rows = cur.fetchall()
-        return jsonify({"ok": True, "data": rows})
+        cur.execute(sql, tuple(args))
+        rows = list(cur.fetchall())
+        if not paged:
+            return ok(rows)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][id_col])
+        return ok({
+            "items": rows,
+            "next_cursor": next_cursor,
+            "total_estimate": approx_count(cur, table, filters, filter_args),
+        })
     except Exception as e:
-        return jsonify({"ok": False, "error": f"DB error: {e}"}), 500
+        return err(f"DB error: {e}", 500)
     finally:
-        try:
-            cur.close()
-            conn.close()
-        except:
-            pass
-
+        cur.close()
 
-@app.route("/admin/doctors", methods=["GET"])
-def admin_list_doctors():
-    if not require_admin():
-        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+@api.route("/admin/users", methods=["GET"])
+def admin_list_users():
+    admin, error = require_admin(get_db())
+    if error: return err(error[0], error[1])
+    return admin_list("users")
 
-    active = request.args.get("active")
-    params = []
-    sql = """SELECT doctor_id, first_name, last_name, email, username, is_active
-             FROM doctors"""
-    if active in ("0", "1"):
-        sql += " WHERE is_active=%s"
-        params.append(int(active))
-    sql += " ORDER BY doctor_id DESC"
 
-    try:
-        conn = get_db()
-        cur = conn.cursor(dictionary=True)
-        cur.execute(sql, tuple(params))
-        rows = cur.fetchall()
-        return jsonify({"ok": True, "data": rows})
-    except Exception as e:
-        return jsonify({"ok": False, "error": f"DB error: {e}"}), 500
-    finally:
-        try:
-            cur.close()
-            conn.close()
-        except:
-            pass
+@api.route("/admin/doctors", methods=["GET"])
+def admin_list_doctors():
+    admin, error = require_admin(get_db())
+    if error: return err(error[0], error[1])
+    return admin_list("doctors")
 
-@app.post("/admin/users")
+@api.post("/admin/users")
 def admin_create_user():
     db = get_db()
     admin, error = require_admin(db)
@@ -657,26 +2275,33 @@ def admin_create_user():
             return err("Faltan campos obligatorios (first_name, usuario_correo, password)", 400)
 
         cur = db.cursor()
+        if user_identifier_taken(cur, usuario):
+            return err("Email o username ya existe", 409)
+
         # Detecta si es email o username
+        password_hash = get_hasher().hash(password)
         if "@" in usuario:
             cur.execute("""
-                INSERT INTO users (first_name, last_name, phone, email, password_plain, is_active)
+                INSERT INTO users (first_name, last_name, phone, email, password_hash, is_active)
                 VALUES (%s,%s,%s,%s,%s,1)
-            """, (first_name, last_name, phone, usuario, password))
+            """, (first_name, last_name, phone, usuario, password_hash))
         else:
             cur.execute("""
-                INSERT INTO users (first_name, last_name, phone, username, password_plain, is_active)
+                INSERT INTO users (first_name, last_name, phone, username, password_hash, is_active)
                 VALUES (%s,%s,%s,%s,%s,1)
-            """, (first_name, last_name, phone, usuario, password))
+            """, (first_name, last_name, phone, usuario, password_hash))
         db.commit()
+        forget_ids("users", [cur.lastrowid])
         return ok({"id": cur.lastrowid}, 201)
+    except passwords.Busy:
+        raise
     except Exception as e:
         import traceback, sys
         print("ERROR POST /admin/users:", e, file=sys.stderr)
         traceback.print_exc()
         return err("Error creando usuario", 500)
 
-@app.post("/admin/doctors")
+@api.post("/admin/doctors")
 def admin_create_doctor():
     db = get_db()
     admin, error = require_admin(db)
@@ -696,85 +2321,212 @@ def admin_create_doctor():
         cur = db.cursor()
 
         # valida duplicados
-        cur.execute("SELECT 1 FROM doctors WHERE username=%s LIMIT 1", (username,))
+        cur.execute("SELECT 1 FROM doctors WHERE username_norm=%s LIMIT 1", (username.lower(),))
         if cur.fetchone():
             return err("Username ya existe", 409)
         if email:
-            cur.execute("SELECT 1 FROM doctors WHERE email=%s LIMIT 1", (email,))
+            cur.execute("SELECT 1 FROM doctors WHERE email_norm=%s LIMIT 1", (email.lower(),))
             if cur.fetchone():
                 return err("Email ya existe", 409)
 
         cur.execute("""
-            INSERT INTO doctors (first_name, last_name, email, username, password_plain, is_active)
+            INSERT INTO doctors (first_name, last_name, email, username, password_hash, is_active)
             VALUES (%s,%s,%s,%s,%s,1)
-        """, (first_name, last_name, email, username, password))
+        """, (first_name, last_name, email, username, get_hasher().hash(password)))
         db.commit()
+        invalidate_doctors_cache()
+        forget_ids("doctors", [cur.lastrowid])
 
         return ok({"id": cur.lastrowid}, 201)
 
+    except passwords.Busy:
+        raise
     except Exception as e:
         import traceback, sys
         print("ERROR POST /admin/doctors:", e, file=sys.stderr)
         traceback.print_exc()
         return err(f"Error creando doctor: {e}", 500)
 
-    db = get_db()
-    admin, error = require_admin(db)
-    if error: return err(error[0], error[1])
+# -----------------------------
+# Admin: importación masiva (CSV o JSON)
+# -----------------------------
+IMPORT_MAX_ROWS = 20000
+IMPORT_CHUNK    = 1000
+
+def import_field(item, key):
+    """Texto limpio de una celda (JSON puede traer números: "phone": 5551234)."""
+    value = item.get(key)
+    return "" if value is None else str(value).strip()
+
+def import_user_row(item):
+    """((valores, username_norm, email_norm), None) o (None, mensaje) para /admin/users/import."""
+    first_name = import_field(item, "first_name")
+    last_name  = import_field(item, "last_name")
+    phone      = import_field(item, "phone")
+    email      = import_field(item, "email") or None
+    username   = import_field(item, "username") or None
+    password   = import_field(item, "password")
+    usuario    = import_field(item, "usuario_correo")  # como admin_create_user
+    if usuario and not (email or username):
+        if "@" in usuario:
+            email = usuario
+        else:
+            username = usuario
+    if not first_name or not password or not (email or username):
+        return None, "Faltan campos obligatorios (first_name, email o username, password)"
+    return ((first_name, last_name, phone, email, username, password),
+            username.lower() if username else None, email.lower() if email else None), None
+
+def import_doctor_row(item):
+    """((valores, username_norm, email_norm), None) o (None, mensaje) para /admin/doctors/import."""
+    first_name = import_field(item, "first_name")
+    last_name  = import_field(item, "last_name")
+    email      = import_field(item, "email") or None
+    username   = import_field(item, "username")
+    password   = import_field(item, "password")
+    if not first_name or not username or not password:
+        return None, "Faltan campos (first_name, username, password)"
+    return ((first_name, last_name, email, username, password),
+            username.lower(), email.lower() if email else None), None
+
+IMPORT_KINDS = {
+    "users": (import_user_row, """
+        INSERT INTO users (first_name, last_name, phone, email, username, password_hash, is_active)
+        VALUES (%s,%s,%s,%s,%s,%s,1)
+    """),
+    "doctors": (import_doctor_row, """
+        INSERT INTO doctors (first_name, last_name, email, username, password_hash, is_active)
+        VALUES (%s,%s,%s,%s,%s,1)
+    """),
+}
+
+def read_import_items():
+    """Lista de dicts desde un CSV (con cabecera) o un JSON (lista o {rows: [...]})."""
+    if request.mimetype in ("text/csv", "application/csv") or request.args.get("format") == "csv":
+        text = request.get_data(as_text=True)
+        return [dict(r) for r in csv.DictReader(io.StringIO(text))]
+    payload = request.get_json(silent=True)
+    items = payload.get("rows") if isinstance(payload, dict) else payload
+    return items if isinstance(items, list) else None
+
+def import_accounts(db, table, items):
+    """
+    Valida, descarta duplicados (en el archivo y en la tabla, una consulta por bloque)
+    e inserta por bloques de IMPORT_CHUNK con un INSERT multi-fila y un commit por bloque.
+    Las contraseñas (último valor de cada fila) se hashean en paralelo por bloque.
+    Devuelve (resultados por fila, insertados).
+    """
+    parse_row, insert_sql = IMPORT_KINDS[table]
+    results = []
+    pending = []   # (resultado, valores, username_norm, email_norm)
+    seen = set()
+    for i, item in enumerate(items, start=1):
+        result = {"row": i, "ok": False}
+        results.append(result)
+        parsed, error = parse_row(item) if isinstance(item, dict) else (None, "Fila inválida")
+        if error:
+            result["error"] = error
+            continue
+        values, username_norm, email_norm = parsed
+        keys = {("u", username_norm), ("e", email_norm)} - {("u", None), ("e", None)}
+        if keys & seen:
+            result["error"] = "Duplicado dentro del archivo"
+            continue
+        seen |= keys
+        pending.append((result, values, username_norm, email_norm))
+
+    inserted = 0
+    cur = db.cursor()
     try:
-        data = request.get_json(force=True)
-        first_name = (data.get("first_name") or "").strip()
-        last_name  = (data.get("last_name") or "").strip()
-        email      = (data.get("email") or "").strip()
-        username   = (data.get("username") or "").strip()
-        password   = (data.get("password") or "").strip()
-
-        if not first_name or not username or not password:
-            return err("Faltan campos (first_name, username, password)", 400)
-
-        cur = db.cursor()
-        cur.execute("""
-            INSERT INTO doctors (first_name, last_name, email, username, password_plain, is_active)
-            VALUES (%s,%s,%s,%s,%s,1)
-        """, (first_name, last_name, email, username, password))
-        db.commit()
-        return ok({"id": cur.lastrowid}, 201)
+        for start in range(0, len(pending), IMPORT_CHUNK):
+            chunk = pending[start:start + IMPORT_CHUNK]
+            usernames = [p[2] for p in chunk if p[2]]
+            emails    = [p[3] for p in chunk if p[3]]
+            conds, args = [], []
+            if usernames:
+                conds.append(f"username_norm IN ({','.join(['%s'] * len(usernames))})")
+                args += usernames
+            if emails:
+                conds.append(f"email_norm IN ({','.join(['%s'] * len(emails))})")
+                args += emails
+            cur.execute(f"SELECT username_norm, email_norm FROM {table} WHERE {' OR '.join(conds)}",
+                        tuple(args))
+            taken_u, taken_e = set(), set()
+            for r in cur.fetchall():
+                taken_u.add(r["username_norm"])
+                taken_e.add(r["email_norm"])
+
+            rows = []
+            for result, values, username_norm, email_norm in chunk:
+                if username_norm and username_norm in taken_u:
+                    result["error"] = "Username ya existe"
+                elif email_norm and email_norm in taken_e:
+                    result["error"] = "Email ya existe"
+                else:
+                    rows.append((result, values))
+            if not rows:
+                continue
+            hashes = get_hasher().hash_many([v[-1] for _, v in rows])
+            rows = [(result, values[:-1] + (h,)) for (result, values), h in zip(rows, hashes)]
 
-    except Exception as e:
-        import traceback, sys
-        print("ERROR POST /admin/doctors:", e, file=sys.stderr)
-        traceback.print_exc()
-        # DEVUELVE EL MENSAJE REAL:
-        return err(f"Error creando doctor: {e}", 500)
+            try:
+                # con los hashes un bloque pasa de 64 KB: insert_rows trocea y da cada id
+                ids = insert_rows(cur, insert_sql, [v for _, v in rows])
+                db.commit()
+                for (result, _), new_id in zip(rows, ids):
+                    result.update(ok=True, id=new_id)
+            except MySQLdb.IntegrityError:
+                # alguien insertó el mismo usuario entre la consulta y el INSERT:
+                # se repite el bloque fila a fila para dar el resultado de cada una
+                db.rollback()
+                for result, values in rows:
+                    try:
+                        cur.execute(insert_sql, values)
+                        db.commit()
+                        result.update(ok=True, id=cur.lastrowid)
+                    except MySQLdb.IntegrityError:
+                        db.rollback()
+                        result["error"] = "Username o email ya existe"
+            new_ids = [result["id"] for result, _ in rows if result["ok"]]
+            forget_ids(table, new_ids)
+            inserted += len(new_ids)
+    finally:
+        cur.close()
+    return results, inserted
 
+def admin_import(table):
     db = get_db()
     admin, error = require_admin(db)
     if error: return err(error[0], error[1])
-    try:
-        data = request.get_json(force=True)
-        first_name = (data.get("first_name") or "").strip()
-        last_name  = (data.get("last_name") or "").strip()
-        email      = (data.get("email") or "").strip()
-        username   = (data.get("username") or "").strip()
-        password   = (data.get("password") or "").strip()
-
-        if not first_name or not username or not password:
-            return err("Faltan campos obligatorios (first_name, username, password)", 400)
 
-        cur = db.cursor()
-        cur.execute("""
-            INSERT INTO doctors (first_name, last_name, email, username, password_plain, is_active)
-            VALUES (%s,%s,%s,%s,%s,1)
-        """, (first_name, last_name, email, username, password))
-        db.commit()
-        return ok({"id": cur.lastrowid}, 201)
+    items = read_import_items()
+    if not items:
+        return err("Envía un CSV con cabecera o una lista JSON no vacía")
+    if len(items) > IMPORT_MAX_ROWS:
+        return err(f"Máximo {IMPORT_MAX_ROWS} filas por importación", 413)
+    try:
+        results, inserted = import_accounts(db, table, items)
+        if table == "doctors" and inserted:
+            invalidate_doctors_cache()
+        return ok({"inserted": inserted, "failed": len(items) - inserted, "results": results})
     except Exception as e:
+        db.rollback()
         import traceback, sys
-        print("ERROR POST /admin/doctors:", e, file=sys.stderr)
+        print(f"ERROR POST /admin/{table}/import:", e, file=sys.stderr)
         traceback.print_exc()
-        return err("Error creando doctor", 500)
+        return err(f"Error importando {table}: {e}", 500)
+
+@api.post("/admin/users/import")
+def admin_import_users():
+    """CSV/JSON con first_name, last_name?, phone?, email y/o username (o usuario_correo), password."""
+    return admin_import("users")
 
-@app.patch("/admin/users/<int:user_id>/status")
+@api.post("/admin/doctors/import")
+def admin_import_doctors():
+    """CSV/JSON con first_name, last_name?, email?, username, password."""
+    return admin_import("doctors")
+
+@api.patch("/admin/users/<int:user_id>/status")
 def admin_set_user_status(user_id):
     db = get_db()
     admin, error = require_admin(db)
@@ -785,6 +2537,7 @@ def admin_set_user_status(user_id):
         cur = db.cursor()
         cur.execute("UPDATE users SET is_active=%s WHERE id=%s", (is_active, user_id))
         db.commit()
+        known_users.pop(user_id)
         return ok({"user_id": user_id, "is_active": bool(is_active)})
     except Exception as e:
         import traceback, sys
@@ -792,7 +2545,7 @@ def admin_set_user_status(user_id):
         traceback.print_exc()
         return err("Error actualizando estado de usuario", 500)
 
-@app.patch("/admin/doctors/<int:doctor_id>/status")
+@api.patch("/admin/doctors/<int:doctor_id>/status")
 def admin_set_doctor_status(doctor_id):
     db = get_db()
     admin, error = require_admin(db)
@@ -803,6 +2556,8 @@ def admin_set_doctor_status(doctor_id):
         cur = db.cursor()
         cur.execute("UPDATE doctors SET is_active=%s WHERE doctor_id=%s", (is_active, doctor_id))
         db.commit()
+        known_doctors.pop(doctor_id)
+        invalidate_doctors_cache()
         return ok({"doctor_id": doctor_id, "is_active": bool(is_active)})
     except Exception as e:
         import traceback, sys
@@ -810,10 +2565,77 @@ def admin_set_doctor_status(doctor_id):
         traceback.print_exc()
         return err("Error actualizando estado de doctor", 500)
 
+@api.get("/admin/ingest")
+def admin_ingest_stats():
+    """Estadísticas de la cola de ingesta de este proceso."""
+    admin, error = require_admin(get_db())
+    if error: return err(error[0], error[1])
+    return ok(get_ingest_queue().stats() if _ingest is not None else None)
+
+@api.get("/admin/admission")
+def admin_admission_stats():
+    """Cupos y rechazos del control de admisión de este proceso."""
+    admin, error = require_admin(get_db())
+    if error: return err(error[0], error[1])
+    if not current_app.config['ADMISSION_ENABLED']:
+        return ok(None)
+    return ok(get_admission().stats())
+
+@api.get("/admin/db/pool")
+def admin_pool_stats():
+    """Estadísticas del pool de conexiones de este proceso."""
+    admin, error = require_admin(get_db())
+    if error: return err(error[0], error[1])
+    return ok(get_pool().stats())
+
+@api.get("/admin/sql/top")
+def admin_sql_top():
+    """
+    Huellas de SQL más costosas de este proceso.
+    query params: n (20), order (total_time | max_time | calls | rows), reset=1 (vacía tras leer)
+    """
+    admin, error = require_admin(get_db())
+    if error: return err(error[0], error[1])
+    n = request.args.get("n", 20, type=int)
+    order = request.args.get("order", "total_time")
+    if order not in ("total_time", "max_time", "calls", "rows"):
+        return err("order debe ser total_time, max_time, calls o rows")
+    data = sql_tracer.top(n, order)
+    if request.args.get("reset") == "1":
+        sql_tracer.reset()
+    return ok(data)
+
+
+# -----------------------------
+# CLI de esquema (flask --app App db-migrate / db-check)
+# -----------------------------
+@api.cli.command("db-migrate")
+def db_migrate_command():
+    """Aplica las migraciones pendientes de schema.py."""
+    conn = get_pool().acquire()
+    try:
+        version = schema.migrate(conn)
+        print(f"Esquema en versión {version}")
+    finally:
+        get_pool().release(conn)
+
+@api.cli.command("db-check")
+def db_check_command():
+    """EXPLAIN de las consultas calientes; falla si alguna no usa índice."""
+    conn = get_pool().acquire()
+    try:
+        results = schema.check_indexes(conn)
+    finally:
+        get_pool().release(conn)
+    for name, good, detail in results:
+        print(f"[{'OK' if good else 'FALLA'}] {name}: {detail}")
+    if not all(good for _, good, _ in results):
+        raise SystemExit(1)
+
 
 # -----------------------------
 # Punto de entrada
 # -----------------------------
 if __name__ == "__main__":
-    # Flask dev server (para pruebas locales)
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    # Flask dev server (para pruebas locales); en producción: python serve.py
+    create_app().run(host="0.0.0.0", port=8000, debug=True)
@@ -0,0 +1,162 @@
+############# Control de admisión (SymptoTrack) #############
+# Antes de atender un request se comprueba, por este orden:
+#   1. token bucket del cliente en su clase (rate req/s, burst)         -> 429 + Retry-After
+#   2. concurrencia de la ruta (p.ej. /users/<id>/symptoms como mucho N) -> 503 + Retry-After
+#   3. concurrencia de la clase (patient / clinician)                    -> 503 + Retry-After
+# Cada clase tiene su propio cupo de concurrencia: una avalancha de sincronizaciones de
+# pacientes agota el de "patient" pero no toca el de "clinician" (doctores y admins).
+# Si no hay hueco se espera como mucho queue_timeout (corto para pacientes): mejor un
+# rechazo rápido que una cola que crece hasta que todo va lento.
+#
+# Los límites son por proceso (worker). Con threads (hilos que atienden requests en el
+# worker, p.ej. los de gunicorn gthread) los cupos se recortan a esos hilos y cada clase
+# deja libres `headroom` hilos: con 4 hilos y headroom 1, los pacientes ocupan como
+# mucho 3 y siempre queda uno para doctores y admins. Sin threads (servidor de
+# desarrollo, un hilo por request) se usan los cupos tal cual.
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBuckets:
+    """Un token bucket por clave (cliente), acotado en número de claves (LRU)."""
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # clave -> [tokens, último instante]
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Consume un token. Devuelve 0 si hay, o los segundos hasta que haya uno."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate if self.rate > 0 else 60.0
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ConcurrencyLimit:
+    """Semáforo con espera acotada y contadores."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=0.0):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.in_use >= self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify()
+
+
+class Rejected(Exception):
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.message = message
+
+
+class AdmissionController:
+    def __init__(self, classes, route_limits=None, threads=None):
+        """
+        classes: {nombre: {"rate", "burst", "concurrency", "queue_timeout", "headroom"?}}
+        route_limits: {regla de ruta: concurrencia máxima}
+        threads: hilos del worker que atienden requests (None: sin recortar)
+        """
+        self.threads = threads
+        self.classes = {}
+        for name, cfg in classes.items():
+            concurrency = cfg["concurrency"]
+            if threads:
+                concurrency = max(1, min(concurrency, threads - cfg.get("headroom", 0)))
+            self.classes[name] = {
+                "buckets": TokenBuckets(cfg["rate"], cfg["burst"]),
+                "limit": ConcurrencyLimit(concurrency),
+                "queue_timeout": cfg.get("queue_timeout", 0.0),
+            }
+        self.routes = {rule: ConcurrencyLimit(min(n, threads) if threads else n)
+                       for rule, n in (route_limits or {}).items()}
+        self._lock = threading.Lock()
+        self._counts = {}   # (clase, resultado) -> n
+
+    def admit(self, klass, client, route):
+        """
+        Reserva cupo para un request. Devuelve un ticket para release() o lanza Rejected.
+        """
+        c = self.classes[klass]
+        wait = c["buckets"].take(client)
+        if wait:
+            self._count(klass, "rate_limited")
+            raise Rejected(429, max(1, math.ceil(wait)), "Demasiadas peticiones, reintenta más tarde")
+
+        route_limit = self.routes.get(route)
+        if route_limit is not None and not route_limit.acquire(c["queue_timeout"]):
+            self._count(klass, "route_full")
+            raise Rejected(503, 1, "Servicio saturado, reintenta en unos segundos")
+        if not c["limit"].acquire(c["queue_timeout"]):
+            if route_limit is not None:
+                route_limit.release()
+            self._count(klass, "class_full")
+            raise Rejected(503, 1, "Servicio saturado, reintenta en unos segundos")
+        self._count(klass, "admitted")
+        return (c["limit"], route_limit)
+
+    def release(self, ticket):
+        class_limit, route_limit = ticket
+        class_limit.release()
+        if route_limit is not None:
+            route_limit.release()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            "threads": self.threads,
+            "classes": {name: {
+                "in_use": c["limit"].in_use,
+                "peak": c["limit"].peak,
+                "concurrency": c["limit"].limit,
+                "rate": c["buckets"].rate,
+                "burst": c["buckets"].burst,
+                "clients": len(c["buckets"]),
+                **{k[1]: n for k, n in counts.items() if k[0] == name},
+            } for name, c in self.classes.items()},
+            "routes": {rule: {"in_use": l.in_use, "peak": l.peak, "concurrency": l.limit}
+                       for rule, l in self.routes.items()},
+        }
+
+    def _count(self, klass, outcome):
+        with self._lock:
+            key = (klass, outcome)
+            self._counts[key] = self._counts.get(key, 0) + 1
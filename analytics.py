@@ -0,0 +1,162 @@
+############# Analítica de cohorte (SymptoTrack) #############
+# Cálculos de GET /doctors/<id>/analytics sobre los registros de todos los pacientes que
+# compartieron con el doctor, recibidos como columnas (arrays NumPy) en lugar de filas:
+#   - distribución por síntoma: registros, pacientes, media, desviación, p50/p90 e
+#     histograma de intensidades 0..10
+#   - co-ocurrencia de los síntomas más frecuentes: días-paciente en los que se
+#     registraron ambos (matriz K x K) y su índice de Jaccard
+#   - pacientes con intensidad al alza: pendiente de mínimos cuadrados por paciente
+#     (y el síntoma que más sube), en puntos de intensidad por semana
+# Todo se agrupa con bincount / unique sobre enteros: no hay bucles por fila en Python.
+#
+# numpy es opcional para el resto de la API: sin él esta analítica no está disponible.
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+INTENSITY_LEVELS = 11      # intensidades 0..10
+COOCCURRENCE_CHUNK = 65536  # días-paciente por producto de matrices
+
+
+def columns(rows):
+    """(user_id, día, síntoma, intensidad) desde las tuplas del cursor, como arrays."""
+    if not rows:
+        return (np.empty(0, np.int64), np.empty(0, np.int64),
+                np.empty(0, object), np.empty(0, np.float64))
+    user_ids, days, names, intensities = zip(*rows)
+    return (np.fromiter(user_ids, np.int64, len(rows)),
+            np.fromiter(days, np.int64, len(rows)),
+            np.array(names, dtype=object),
+            np.clip(np.fromiter(intensities, np.float64, len(rows)), 0, INTENSITY_LEVELS - 1))
+
+
+def _group_slopes(groups, x, y, n_groups):
+    """(n, pendiente) de y sobre x por grupo; pendiente NaN si x no varía en el grupo."""
+    n   = np.bincount(groups, minlength=n_groups).astype(np.float64)
+    sx  = np.bincount(groups, weights=x, minlength=n_groups)
+    sy  = np.bincount(groups, weights=y, minlength=n_groups)
+    sxy = np.bincount(groups, weights=x * y, minlength=n_groups)
+    sxx = np.bincount(groups, weights=x * x, minlength=n_groups)
+    den = n * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(den > 0, (n * sxy - sx * sy) / den, np.nan)
+    return n, slope
+
+
+def _percentile_from_hist(hist, counts, q):
+    # primera intensidad cuyo acumulado alcanza q * registros
+    cum = np.cumsum(hist, axis=1)
+    return (cum < (counts * q)[:, None]).sum(axis=1)
+
+
+def cohort(user_ids, days, names, intensities, top=15, min_points=5, min_slope=0.1,
+           trending_max=20):
+    """
+    Analítica de los registros (columnas alineadas). Un paciente está "al alza" con al
+    menos min_points registros y una pendiente > min_slope puntos por semana.
+    Devuelve un dict con tipos de Python (listo para JSON); los pacientes van por id.
+    """
+    if len(user_ids) == 0:
+        return {"entries": 0, "patients": 0, "symptoms": [],
+                "cooccurrence": {"symptoms": [], "days_together": [], "jaccard": [], "top_pairs": []},
+                "trending_up": []}
+
+    patient_ids, pidx = np.unique(user_ids, return_inverse=True)
+    symptom_names, sidx = np.unique(names, return_inverse=True)
+    n_pat, n_sym = len(patient_ids), len(symptom_names)
+    x = (days - days.min()).astype(np.float64)
+
+    # ---- Distribución por síntoma ----
+    counts = np.bincount(sidx, minlength=n_sym)
+    sums   = np.bincount(sidx, weights=intensities, minlength=n_sym)
+    sqsums = np.bincount(sidx, weights=intensities * intensities, minlength=n_sym)
+    mean = sums / counts
+    std = np.sqrt(np.maximum(sqsums / counts - mean * mean, 0.0))
+    hist = np.bincount(sidx * INTENSITY_LEVELS + intensities.astype(np.int64),
+                       minlength=n_sym * INTENSITY_LEVELS).reshape(n_sym, INTENSITY_LEVELS)
+    p50 = _percentile_from_hist(hist, counts, 0.5)
+    p90 = _percentile_from_hist(hist, counts, 0.9)
+    patients_per_symptom = np.bincount(np.unique(sidx * n_pat + pidx) // n_pat, minlength=n_sym)
+
+    order = np.argsort(-counts, kind="stable")
+    symptoms = [{
+        "symptom_name": symptom_names[i],
+        "entries": int(counts[i]),
+        "patients": int(patients_per_symptom[i]),
+        "mean": round(float(mean[i]), 2),
+        "std": round(float(std[i]), 2),
+        "p50": int(p50[i]),
+        "p90": int(p90[i]),
+        "histogram": hist[i].tolist(),
+    } for i in order]
+
+    # ---- Co-ocurrencia (mismo paciente, mismo día) entre los `top` más frecuentes ----
+    top_idx = order[:top]
+    k = len(top_idx)
+    rank = np.full(n_sym, -1, dtype=np.int64)
+    rank[top_idx] = np.arange(k)
+    in_top = rank[sidx] >= 0
+    patient_day = pidx[in_top] * (int(x.max()) + 1) + x[in_top].astype(np.int64)
+    pd_keys, pd_idx = np.unique(patient_day, return_inverse=True)
+    present = np.zeros((len(pd_keys), k), dtype=bool)
+    present[pd_idx, rank[sidx[in_top]]] = True
+    together = np.zeros((k, k), dtype=np.float64)
+    for start in range(0, len(pd_keys), COOCCURRENCE_CHUNK):
+        block = present[start:start + COOCCURRENCE_CHUNK].astype(np.float32)
+        together += block.T @ block
+    together = together.astype(np.int64)
+    diag = np.diag(together)
+    union = diag[:, None] + diag[None, :] - together
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaccard = np.where(union > 0, together / union, 0.0)
+    iu, ju = np.triu_indices(k, 1)
+    pair_order = np.argsort(-together[iu, ju], kind="stable")[:20]
+    top_pairs = [{
+        "a": symptom_names[top_idx[iu[p]]],
+        "b": symptom_names[top_idx[ju[p]]],
+        "days_together": int(together[iu[p], ju[p]]),
+        "jaccard": round(float(jaccard[iu[p], ju[p]]), 3),
+    } for p in pair_order if together[iu[p], ju[p]] > 0]
+
+    # ---- Pacientes con intensidad al alza ----
+    n, slope = _group_slopes(pidx, x, intensities, n_pat)
+    patient_mean = np.bincount(pidx, weights=intensities, minlength=n_pat) / n
+    rising = np.flatnonzero((n >= min_points) & (slope * 7 > min_slope))
+    rising = rising[np.argsort(-slope[rising], kind="stable")][:trending_max]
+
+    # síntoma que más sube por paciente (grupos paciente-síntoma con suficientes puntos)
+    ps_keys, ps_idx = np.unique(pidx * n_sym + sidx, return_inverse=True)
+    ps_n, ps_slope = _group_slopes(ps_idx, x, intensities, len(ps_keys))
+    valid = np.flatnonzero((ps_n >= min_points) & np.isfinite(ps_slope))
+    valid = valid[np.lexsort((-ps_slope[valid], ps_keys[valid] // n_sym))]
+    first = np.unique(ps_keys[valid] // n_sym, return_index=True)
+    top_symptom = dict(zip(first[0].tolist(), valid[first[1]].tolist()))
+
+    trending = []
+    for p in rising:
+        best = top_symptom.get(int(p))
+        trending.append({
+            "patient_id": int(patient_ids[p]),
+            "entries": int(n[p]),
+            "mean": round(float(patient_mean[p]), 2),
+            "slope_per_week": round(float(slope[p]) * 7, 3),
+            "rising_symptom": None if best is None or ps_slope[best] <= 0 else {
+                "symptom_name": symptom_names[ps_keys[best] % n_sym],
+                "slope_per_week": round(float(ps_slope[best]) * 7, 3),
+            },
+        })
+
+    return {
+        "entries": int(len(user_ids)),
+        "patients": int(n_pat),
+        "symptoms": symptoms,
+        "cooccurrence": {
+            "symptoms": [symptom_names[i] for i in top_idx],
+            "days_together": together.tolist(),
+            "jaccard": np.round(jaccard, 3).tolist(),
+            "top_pairs": top_pairs,
+        },
+        "trending_up": trending,
+    }
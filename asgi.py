@@ -0,0 +1,222 @@
+############# API SymptoTrack - modo ASGI (async) #############
+# Requisitos adicionales:
+#   pip install starlette uvicorn aiomysql a2wsgi
+#
+# Ejecutar:
+#   uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+#
+# Las rutas de lectura más usadas se sirven aquí con aiomysql (sin bloquear un hilo por
+# cada round trip a MySQL):
+#   GET /doctors
+#   GET /users/<id>/symptoms
+#   GET /doctors/<id>/patients
+#   GET /doctors/<id>/patients/<pid>
+# Todo lo demás (y otros métodos sobre esas rutas) pasa a la app Flask de App.py
+# montada como WSGI, así que ambos modos exponen las mismas rutas y el mismo sobre
+# {"ok": ..., "data"/"error": ...}. Comparten además la cache de /doctors: las
+# invalidaciones que hace Flask (register_doctor, admin_*) se ven aquí.
+
+import contextlib
+
+import aiomysql
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import App
+import wire
+
+flask_app = App.create_app()
+cfg = flask_app.config
+
+# Conexiones async por proceso (independientes del pool síncrono de App.py)
+cfg.setdefault('MYSQL_ASYNC_POOL_MIN', 1)
+cfg.setdefault('MYSQL_ASYNC_POOL_MAX', 50)
+
+_pool = None
+
+
+# -----------------------------
+# Utilidades
+# -----------------------------
+def dumps(obj):
+    # mismo proveedor JSON que Flask: fechas, Decimal, etc. salen igual que con jsonify
+    return flask_app.json.dumps(obj)
+
+# mismo comportamiento que flask_cors por defecto (cualquier origen); los preflight
+# OPTIONS caen en la app Flask
+CORS_HEADERS = {"Access-Control-Allow-Origin": "*"}
+
+def ok_negotiated(request, data=None, status=200):
+    """Igual que App.ok_negotiated: formato según ?format=/Accept y gzip/brotli."""
+    fmt = wire.negotiate(request.query_params.get("format"), request.headers.get("accept"))
+    if fmt == "json":
+        body, media_type = dumps({"ok": True, "data": data}).encode(), "application/json"
+    else:
+        body, media_type = wire.encode_compact(fmt, {"ok": True, "data": data})
+        if isinstance(body, str):
+            body = body.encode()
+    headers = {"Vary": "Accept, Accept-Encoding", **CORS_HEADERS}
+    encoding = wire.choose_encoding(request.headers.get("accept-encoding"))
+    if encoding and len(body) >= cfg['COMPRESS_MIN_BYTES']:
+        body = wire.compress(body, encoding, cfg['COMPRESS_GZIP_LEVEL'],
+                             cfg['COMPRESS_BROTLI_QUALITY'])
+        headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status, media_type=media_type, headers=headers)
+
+def err(msg, status=400):
+    return Response(dumps({"ok": False, "error": msg}), status_code=status,
+                    media_type="application/json", headers=CORS_HEADERS)
+
+async def doctor_exists(cur, doctor_id):
+    # misma cache de IDs que App.lookup_doctor (las invalidaciones de Flask se ven aquí)
+    if App.known_doctors.get(doctor_id) is not None:
+        return True
+    await cur.execute(App.DOCTOR_LOOKUP_SQL, (doctor_id,))
+    r = await cur.fetchone()
+    if r is None:
+        return False
+    App.known_doctors.set(doctor_id, {"doctor_id": r["doctor_id"], "is_active": bool(r["is_active"])})
+    return True
+
+async def fetchall(sql, args=()):
+    async with _pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, args)
+            return await cur.fetchall()
+
+
+# -----------------------------
+# Rutas async
+# -----------------------------
+async def list_doctors(request):
+    try:
+        version, etag, body = App.doctors_cache_lookup()
+        if body is None:
+            rows = await fetchall(App.DOCTORS_LIST_SQL)
+            with flask_app.app_context():   # serializa con el proveedor JSON de la app
+                etag, body = App.doctors_cache_store(version, rows)
+        quoted = f'"{etag}"'
+        headers = {"ETag": quoted, "Cache-Control": "no-cache", **CORS_HEADERS}
+        inm = request.headers.get("if-none-match", "")
+        if inm.strip() == "*" or quoted in [t.strip().removeprefix("W/") for t in inm.split(",")]:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+    except Exception as e:
+        import traceback, sys
+        print("ERROR GET /doctors (asgi):", e, file=sys.stderr)
+        traceback.print_exc()
+        return err("Error interno listando doctores", 500)
+
+
+async def list_symptoms(request):
+    user_id = request.path_params["user_id"]
+    plan, error = App.symptoms_query(user_id, request.query_params)
+    if error:
+        return err(error)
+
+    if plan["stream"]:
+        return StreamingResponse(_stream_symptoms(plan), media_type="application/json",
+                                 headers=CORS_HEADERS)
+    try:
+        rows = await fetchall(plan["sql"], plan["args"])
+        if not plan["paged"]:
+            return ok_negotiated(request, list(rows))
+        return ok_negotiated(request, App.symptoms_page(rows, plan["limit"]))
+    except Exception as e:
+        return err(f"Error listando registros: {str(e)}", 500)
+
+async def _stream_symptoms(plan, batch_size=500):
+    # cursor de servidor: la conexión queda tomada hasta terminar de enviar
+    async with _pool.acquire() as conn:
+        async with conn.cursor(aiomysql.SSDictCursor) as cur:
+            await cur.execute(plan["sql"], plan["args"])
+            yield '{"ok":true,"data":['
+            first = True
+            while True:
+                rows = await cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                chunk = ",".join(dumps(r) for r in rows)
+                yield chunk if first else "," + chunk
+                first = False
+            yield "]}"
+
+
+async def list_patients_for_doctor(request):
+    doctor_id = request.path_params["doctor_id"]
+    try:
+        async with _pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                if not await doctor_exists(cur, doctor_id):
+                    return err("doctor_id no existe", 404)
+                await cur.execute(App.DOCTOR_PATIENTS_SQL, (doctor_id,))
+                rows = await cur.fetchall()
+        return ok_negotiated(request, list(rows))
+    except Exception as e:
+        import traceback, sys
+        print("ERROR GET /doctors/<id>/patients (asgi):", e, file=sys.stderr)
+        traceback.print_exc()
+        return err("Error interno en /doctors/{id}/patients", 500)
+
+
+async def patient_detail_for_doctor(request):
+    doctor_id = request.path_params["doctor_id"]
+    patient_id = request.path_params["patient_id"]
+    try:
+        async with _pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                if not await doctor_exists(cur, doctor_id):
+                    return err("doctor_id no existe", 404)
+                await cur.execute(App.PATIENT_SQL, (patient_id,))
+                patient = await cur.fetchone()
+                if patient is None:
+                    return err("patient_id no existe", 404)
+                await cur.execute(App.PATIENT_NOTES_SQL, (doctor_id, patient_id))
+                notes = await cur.fetchall()
+        return ok_negotiated(request, {"patient": patient, "notes": list(notes)})
+    except Exception as e:
+        import traceback, sys
+        print("ERROR GET /doctors/<id>/patients/<pid> (asgi):", e, file=sys.stderr)
+        traceback.print_exc()
+        return err("Error interno en detalle de paciente", 500)
+
+
+# -----------------------------
+# Ciclo de vida
+# -----------------------------
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _pool
+    _pool = await aiomysql.create_pool(
+        host=cfg['MYSQL_HOST'],
+        user=cfg['MYSQL_USER'],
+        password=cfg['MYSQL_PASSWORD'],
+        db=cfg['MYSQL_DB'],
+        charset="utf8mb4",
+        autocommit=True,
+        cursorclass=aiomysql.DictCursor,
+        minsize=cfg['MYSQL_ASYNC_POOL_MIN'],
+        maxsize=cfg['MYSQL_ASYNC_POOL_MAX'],
+        pool_recycle=cfg['MYSQL_POOL_RECYCLE'],
+    )
+    try:
+        yield
+    finally:
+        _pool.close()
+        await _pool.wait_closed()
+
+
+app = Starlette(
+    routes=[
+        Route("/doctors", list_doctors, methods=["GET"]),
+        Route("/users/{user_id:int}/symptoms", list_symptoms, methods=["GET"]),
+        Route("/doctors/{doctor_id:int}/patients", list_patients_for_doctor, methods=["GET"]),
+        Route("/doctors/{doctor_id:int}/patients/{patient_id:int}", patient_detail_for_doctor,
+              methods=["GET"]),
+        # resto de rutas: app Flask (en el threadpool de a2wsgi)
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,11 @@
+############# Benchmarks SymptoTrack #############
+# Siembra datos sintéticos y mide la API de extremo a extremo.
+#
+#   python -m bench seed --patients 100000 --doctors 2000 --entries 50000000
+#   python -m bench run --url http://localhost:8000 --concurrency 64 --duration 60 --out bench_results.json
+#   python -m bench compare bench_base.json bench_results.json --threshold 0.10
+#
+# La API a medir se arranca como en producción (`python serve.py`), no con el servidor
+# de desarrollo de App.py.
+# Usa una base de datos dedicada (--db), ya migrada con `flask --app App db-migrate`:
+# el seed inserta millones de filas y no hay limpieza selectiva.
@@ -0,0 +1,166 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from bench import hashing, load, seed
+
+
+def _db_args(p):
+    p.add_argument("--host", default="localhost")
+    p.add_argument("--port", type=int, default=3306)
+    p.add_argument("--user", default="root")
+    p.add_argument("--password", default="")
+    p.add_argument("--db", default="symptotrack_bench")
+
+
+def cmd_seed(args):
+    conn = seed.connect(args)
+    try:
+        started = time.monotonic()
+        seed.seed(conn, patients=args.patients, doctors=args.doctors, entries=args.entries,
+                  shares_per_patient=args.shares_per_patient, days=args.days,
+                  batch_size=args.batch_size, rng_seed=args.seed)
+        print(f"Seed completo en {time.monotonic() - started:.1f}s")
+    finally:
+        conn.close()
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def cmd_run(args):
+    conn = seed.connect(args)
+    try:
+        ctx = load.load_context(conn)
+        ctx["admin_token"] = load.admin_login(args.url)
+        queries = None
+        if not args.skip_calibration:
+            print("-> calibrando sentencias SQL por ruta")
+            queries = load.calibrate(args.url, ctx, conn, samples=args.calibration_samples)
+    finally:
+        conn.close()
+
+    print(f"-> carga: {args.concurrency} clientes, {args.duration}s (+{args.warmup}s calentamiento)")
+    latencies, errors = load.run_load(args.url, ctx, args.concurrency, args.duration, warmup=args.warmup)
+    result = load.summarize(latencies, errors, args.duration, queries)
+    result["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": _git_rev(),
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "python": platform.python_version(),
+        "host": platform.node(),
+    }
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(result, fh, indent=2, ensure_ascii=False)
+
+    print(f"{'ruta':45} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5} {'sql/req':>8}")
+    for name, r in list(result["routes"].items()) + [("TOTAL", result["total"])]:
+        print(f"{name:45} {r['throughput_rps'] or 0:8.1f} {r['p50_ms'] or 0:8.1f} "
+              f"{r['p95_ms'] or 0:8.1f} {r['p99_ms'] or 0:8.1f} {r['errors']:5d} "
+              f"{r.get('queries_per_request') or 0:8.2f}")
+    print(f"Resultados en {args.out}")
+
+
+def cmd_compare(args):
+    with open(args.base, encoding="utf-8") as fh:
+        base = json.load(fh)
+    with open(args.new, encoding="utf-8") as fh:
+        new = json.load(fh)
+
+    regressions = []
+    print(f"{'ruta':45} {'p95 base':>9} {'p95 new':>9} {'rps base':>9} {'rps new':>9}")
+    for name, b in list(base["routes"].items()) + [("TOTAL", base["total"])]:
+        n = new["total"] if name == "TOTAL" else new["routes"].get(name)
+        if not n or not b["p95_ms"] or not n["p95_ms"]:
+            continue
+        flag = ""
+        if n["p95_ms"] > b["p95_ms"] * (1 + args.threshold):
+            flag += " p95!"
+        if b["throughput_rps"] and n["throughput_rps"] < b["throughput_rps"] * (1 - args.threshold):
+            flag += " rps!"
+        if flag:
+            regressions.append(name)
+        print(f"{name:45} {b['p95_ms']:9.1f} {n['p95_ms']:9.1f} "
+              f"{b['throughput_rps']:9.1f} {n['throughput_rps']:9.1f}{flag}")
+    if regressions:
+        print(f"Regresiones (> {args.threshold:.0%}): {', '.join(regressions)}")
+        sys.exit(1)
+    print("Sin regresiones")
+
+
+def cmd_hash(args):
+    results = []
+    print(f"{'N':>8} {'KiB':>7} {'logins/s':>9} {'p50':>8} {'p95':>8} {'busy':>6}")
+    for log2_n in args.costs:
+        r = hashing.run_cost(log2_n, args.workers, args.concurrency, args.duration)
+        results.append(r)
+        print(f"{'2^' + str(log2_n):>8} {r['memory_kib']:7d} {r['throughput_rps'] or 0:9.1f} "
+              f"{r['p50_ms'] or 0:8.1f} {r['p95_ms'] or 0:8.1f} {r['busy']:6d}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"costs": results, "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "git_rev": _git_rev(),
+                "python": platform.python_version(),
+                "host": platform.node(),
+            }}, fh, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.out}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmarks de la API SymptoTrack")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("seed", help="siembra datos sintéticos")
+    _db_args(p)
+    p.add_argument("--patients", type=int, default=100_000)
+    p.add_argument("--doctors", type=int, default=2_000)
+    p.add_argument("--entries", type=int, default=5_000_000, help="registros de síntomas en total")
+    p.add_argument("--shares-per-patient", type=int, default=2)
+    p.add_argument("--days", type=int, default=730, help="antigüedad máxima de los registros")
+    p.add_argument("--batch-size", type=int, default=5_000)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_seed)
+
+    p = sub.add_parser("run", help="ejecuta la carga y guarda resultados JSON")
+    _db_args(p)
+    p.add_argument("--url", default="http://localhost:8000")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--duration", type=float, default=30.0)
+    p.add_argument("--warmup", type=float, default=5.0)
+    p.add_argument("--calibration-samples", type=int, default=20)
+    p.add_argument("--skip-calibration", action="store_true")
+    p.add_argument("--out", default="bench_results.json")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("hash", help="verificaciones de contraseña por segundo según el coste scrypt")
+    p.add_argument("--costs", type=lambda v: [int(c) for c in v.split(",")], default=[12, 13, 14, 15],
+                   help="log2(N) separados por comas")
+    p.add_argument("--workers", type=int, default=None, help="hilos del pool (por defecto nº de CPUs)")
+    p.add_argument("--concurrency", type=int, default=16, help="logins simultáneos")
+    p.add_argument("--duration", type=float, default=5.0)
+    p.add_argument("--out", default=None)
+    p.set_defaults(func=cmd_hash)
+
+    p = sub.add_parser("compare", help="compara dos resultados y falla si hay regresiones")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=0.10)
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
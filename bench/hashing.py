@@ -0,0 +1,51 @@
+############# Benchmark de verificación de contraseñas #############
+# Mide, en proceso y sin HTTP ni base de datos, cuántas verificaciones por segundo
+# (≈ logins/s de un worker) y con qué latencia aguanta HashPool para cada coste scrypt.
+# Útil para elegir PASSWORD_SCRYPT_N / PASSWORD_WORKERS: el coste más alto cuya p95
+# siga siendo aceptable con la concurrencia de login esperada.
+
+import threading
+import time
+
+import passwords
+from bench.load import _stats
+
+
+def run_cost(log2_n, workers, concurrency, duration, r=passwords.DEFAULT_R, p=passwords.DEFAULT_P,
+             max_pending=64):
+    """Resultado (_stats + busy) de `concurrency` clientes verificando durante `duration` s."""
+    pool = passwords.HashPool(workers=workers, max_pending=max_pending, n=2 ** log2_n, r=r, p=p)
+    encoded = pool.hash("bench-password")
+    latencies = []
+    busy = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        local, rejected = [], 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                pool.verify("bench-password", encoded)
+            except passwords.Busy:
+                rejected += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            busy[0] += rejected
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    pool.shutdown()
+
+    latencies.sort()
+    result = _stats(latencies, 0, elapsed)
+    result.update(log2_n=log2_n, workers=pool.workers, concurrency=concurrency, busy=busy[0],
+                  memory_kib=128 * 2 ** log2_n * r // 1024)
+    return result
@@ -0,0 +1,244 @@
+############# Generador de carga #############
+# Cada hilo mantiene su propia conexión HTTP keep-alive y elige escenarios al azar
+# según su peso. Antes de la carga, una fase de calibración en serie mide cuántas
+# sentencias SQL cuesta cada ruta (delta de SHOW GLOBAL STATUS 'Questions'), por eso
+# conviene que no haya otro tráfico contra la base durante el benchmark.
+
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+from bench.seed import BENCH_ADMIN, BENCH_PASSWORD, SYMPTOMS
+
+
+# -----------------------------
+# Contexto (ids reales de la base sembrada)
+# -----------------------------
+def load_context(conn, sample=5000):
+    cur = conn.cursor()
+    try:
+        cur.execute(r"SELECT id, username FROM users WHERE username_norm LIKE 'bench\_user\_%%' LIMIT %s",
+                    (sample,))
+        users = list(cur.fetchall())
+        cur.execute(r"SELECT doctor_id, username FROM doctors WHERE username_norm LIKE 'bench\_doc\_%%' LIMIT %s",
+                    (sample,))
+        doctors = list(cur.fetchall())
+        cur.execute("SELECT doctor_id, patient_id FROM doctor_patient_summary LIMIT %s", (sample,))
+        shares = list(cur.fetchall())
+    finally:
+        cur.close()
+    if not users or not doctors or not shares:
+        raise SystemExit("La base no tiene datos de benchmark: ejecuta antes `python -m bench seed`")
+    return {"users": users, "doctors": doctors, "shares": shares, "admin_token": None}
+
+
+# -----------------------------
+# Escenarios: (nombre, peso, función rng,ctx -> (método, ruta, body, headers))
+# -----------------------------
+def _admin(ctx):
+    return {"Authorization": f"Bearer {ctx['admin_token']}"}
+
+def _entry(rng, uid):
+    d = date.today() - timedelta(days=rng.randrange(30))
+    return {"user_id": uid, "symptom_name": rng.choice(SYMPTOMS), "intensity": rng.randint(0, 10),
+            "entry_date": d.isoformat()}
+
+SCENARIOS = [
+    ("POST /auth/login (user)", 8, lambda r, c: (
+        "POST", "/auth/login", {"identifier": r.choice(c["users"])[1], "password": BENCH_PASSWORD}, {})),
+    ("POST /auth/login (doctor)", 2, lambda r, c: (
+        "POST", "/auth/login", {"identifier": r.choice(c["doctors"])[1], "password": BENCH_PASSWORD}, {})),
+    ("POST /symptoms", 15, lambda r, c: (
+        "POST", "/symptoms", _entry(r, r.choice(c["users"])[0]), {})),
+    ("POST /symptoms/batch", 2, lambda r, c: (
+        "POST", "/symptoms/batch",
+        {"entries": [_entry(r, u) for u in [r.choice(c["users"])[0]] for _ in range(50)]}, {})),
+    ("GET /users/<id>/symptoms?limit=50", 20, lambda r, c: (
+        "GET", f"/users/{r.choice(c['users'])[0]}/symptoms?limit=50", None, {})),
+    ("GET /users/<id>/symptoms/trends", 5, lambda r, c: (
+        "GET", f"/users/{r.choice(c['users'])[0]}/symptoms/trends?granularity=week", None, {})),
+    ("GET /doctors", 10, lambda r, c: ("GET", "/doctors", None, {})),
+    ("POST /patients/share", 3, lambda r, c: (
+        "POST", "/patients/share",
+        {"doctor_id": r.choice(c["doctors"])[0], "patient_id": r.choice(c["users"])[0]}, {})),
+    ("GET /doctors/<id>/patients", 8, lambda r, c: (
+        "GET", f"/doctors/{r.choice(c['shares'])[0]}/patients", None, {})),
+    ("GET /doctors/<id>/patients/<pid>", 8, lambda r, c: (
+        "GET", "/doctors/{}/patients/{}".format(*r.choice(c["shares"])), None, {})),
+    ("GET /doctors/<id>/dashboard", 3, lambda r, c: (
+        "GET", f"/doctors/{r.choice(c['shares'])[0]}/dashboard", None, {})),
+    ("GET /admin/users?limit=50", 1, lambda r, c: ("GET", "/admin/users?active=1&limit=50", None, _admin(c))),
+    ("GET /admin/doctors?limit=50", 1, lambda r, c: ("GET", "/admin/doctors?active=1&limit=50", None, _admin(c))),
+    ("PATCH /admin/users/<id>/status", 1, lambda r, c: (
+        "PATCH", f"/admin/users/{r.choice(c['users'])[0]}/status", {"is_active": 1}, _admin(c))),
+]
+
+
+# -----------------------------
+# Cliente HTTP
+# -----------------------------
+class Client:
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Devuelve (status, cuerpo, segundos). Reconecta si el servidor cerró la conexión."""
+        payload = json.dumps(body).encode() if body is not None else None
+        hdrs = {"Content-Type": "application/json"} if payload is not None else {}
+        hdrs.update(headers or {})
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            started = time.perf_counter()
+            try:
+                self.conn.request(method, path, body=payload, headers=hdrs)
+                resp = self.conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt == 2:
+                    raise
+                continue
+            elapsed = time.perf_counter() - started
+            if resp.getheader("Connection", "").lower() == "close" or resp.version == 10:
+                self.close()
+            return resp.status, data, elapsed
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def admin_login(base_url):
+    status, data, _ = Client(base_url).request(
+        "POST", "/auth/login", {"identifier": BENCH_ADMIN, "password": BENCH_PASSWORD})
+    if status != 200:
+        raise SystemExit(f"Login de {BENCH_ADMIN} falló ({status}): {data[:200]!r}")
+    return json.loads(data)["data"]["token"]
+
+
+# -----------------------------
+# Calibración: sentencias SQL por request
+# -----------------------------
+def _questions(conn):
+    cur = conn.cursor()
+    try:
+        cur.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        return int(cur.fetchone()[1])
+    finally:
+        cur.close()
+
+def calibrate(base_url, ctx, conn, samples=20, rng_seed=1):
+    rng = random.Random(rng_seed)
+    client = Client(base_url)
+    result = {}
+    for name, _, build in SCENARIOS:
+        before = _questions(conn)
+        for _ in range(samples):
+            method, path, body, headers = build(rng, ctx)
+            client.request(method, path, body, headers)
+        after = _questions(conn)
+        # el propio SHOW STATUS cuenta como una sentencia
+        result[name] = round((after - before - 1) / samples, 2)
+    client.close()
+    return result
+
+
+# -----------------------------
+# Carga concurrente
+# -----------------------------
+def run_load(base_url, ctx, concurrency, duration, warmup=5.0, rng_seed=7):
+    names = [s[0] for s in SCENARIOS]
+    weights = [s[1] for s in SCENARIOS]
+    builders = {s[0]: s[2] for s in SCENARIOS}
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    start_at = time.monotonic() + warmup
+    stop_at = start_at + duration
+
+    def worker(n):
+        rng = random.Random(rng_seed + n)
+        client = Client(base_url)
+        local_lat = defaultdict(list)
+        local_err = defaultdict(int)
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            name = rng.choices(names, weights)[0]
+            method, path, body, headers = builders[name](rng, ctx)
+            try:
+                status, _, elapsed = client.request(method, path, body, headers)
+            except Exception:
+                status, elapsed = 0, 0.0
+            if now < start_at:
+                continue  # calentamiento: no se mide
+            if 200 <= status < 400:
+                local_lat[name].append(elapsed)
+            else:
+                local_err[name] += 1
+        client.close()
+        with lock:
+            for k, v in local_lat.items():
+                latencies[k].extend(v)
+            for k, v in local_err.items():
+                errors[k] += v
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    k = max(0, math.ceil(p / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+def summarize(latencies, errors, duration, queries=None):
+    routes = {}
+    all_lat = []
+    for name, _, _ in SCENARIOS:
+        values = sorted(latencies.get(name, []))
+        all_lat.extend(values)
+        routes[name] = _stats(values, errors.get(name, 0), duration)
+        if queries is not None:
+            routes[name]["queries_per_request"] = queries.get(name)
+    all_lat.sort()
+    total = _stats(all_lat, sum(errors.values()), duration)
+    if queries is not None:
+        # media ponderada por el número de requests de cada ruta
+        n = sum(r["count"] for r in routes.values())
+        total["queries_per_request"] = round(sum(
+            r["count"] * (r["queries_per_request"] or 0) for r in routes.values()) / n, 2) if n else None
+    return {"routes": routes, "total": total}
+
+def _stats(values, n_errors, duration):
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "count": len(values),
+        "errors": n_errors,
+        "throughput_rps": round(len(values) / duration, 2) if duration else None,
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else None,
+    }
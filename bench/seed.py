@@ -0,0 +1,138 @@
+############# Seed de datos sintéticos #############
+# Inserta users, doctors, admins, symptom_entries y doctor_patients con INSERT multi-fila
+# (executemany) y commit por lote; al final recalcula symptom_rollups,
+# doctor_patient_summary y change_seq con los mismos backfills que schema.py.
+
+import random
+import time
+from datetime import date, timedelta
+
+import MySQLdb
+import MySQLdb.cursors
+
+import passwords
+import schema
+
+BENCH_PASSWORD = "bench"
+BENCH_ADMIN = "bench_admin"
+
+SYMPTOMS = [
+    "dolor de cabeza", "fatiga", "náuseas", "mareo", "fiebre", "tos",
+    "dolor abdominal", "insomnio", "ansiedad", "dolor articular", "congestión", "falta de aire",
+]
+FIRST_NAMES = ["Ana", "Luis", "María", "Carlos", "Lucía", "Jorge", "Sofía", "Pedro", "Elena", "Diego"]
+LAST_NAMES = ["García", "López", "Martínez", "Pérez", "Gómez", "Sánchez", "Díaz", "Torres", "Ruiz", "Vargas"]
+
+
+def connect(args):
+    return MySQLdb.connect(host=args.host, user=args.user, passwd=args.password, db=args.db,
+                           port=args.port, charset="utf8mb4",
+                           cursorclass=MySQLdb.cursors.Cursor)
+
+
+def _insert_batches(conn, sql, rows, batch_size, label):
+    """Consume un iterable de filas e inserta por lotes; un commit por lote."""
+    cur = conn.cursor()
+    total = 0
+    batch = []
+    started = time.monotonic()
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cur.executemany(sql, batch)
+                conn.commit()
+                total += len(batch)
+                batch = []
+                if total % (batch_size * 100) == 0:
+                    rate = total / max(time.monotonic() - started, 1e-9)
+                    print(f"   {label}: {total:,} filas ({rate:,.0f}/s)")
+        if batch:
+            cur.executemany(sql, batch)
+            conn.commit()
+            total += len(batch)
+    finally:
+        cur.close()
+    print(f"   {label}: {total:,} filas en {time.monotonic() - started:.1f}s")
+    return total
+
+
+def _ids(conn, sql):
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+        return [r[0] for r in cur.fetchall()]
+    finally:
+        cur.close()
+
+
+def seed(conn, patients, doctors, entries, shares_per_patient=2, days=730,
+         batch_size=5000, rng_seed=42):
+    rng = random.Random(rng_seed)
+    today = date.today()
+    # un solo hash (mismo coste que la API) para todas las cuentas sintéticas:
+    # hashear cada fila por separado haría el seed órdenes de magnitud más lento
+    password_hash = passwords.hash_password(BENCH_PASSWORD)
+
+    print("-> admins / doctors / users")
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT IGNORE INTO admins (username, password_hash, is_active)
+        VALUES (%s, %s, 1)
+    """, (BENCH_ADMIN, password_hash))
+    conn.commit()
+    cur.close()
+
+    _insert_batches(conn, """
+        INSERT INTO doctors (first_name, last_name, email, username, password_hash, is_active)
+        VALUES (%s,%s,%s,%s,%s,1)
+    """, ((rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"bench_doc_{i}@bench.local",
+           f"bench_doc_{i}", password_hash) for i in range(doctors)), batch_size, "doctors")
+
+    _insert_batches(conn, """
+        INSERT INTO users (first_name, last_name, phone, username, password_hash, is_active)
+        VALUES (%s,%s,%s,%s,%s,1)
+    """, ((rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"{5550000000 + i}",
+           f"bench_user_{i}", password_hash) for i in range(patients)), batch_size, "users")
+
+    doctor_ids = _ids(conn, r"SELECT doctor_id FROM doctors WHERE username_norm LIKE 'bench\_doc\_%'")
+    user_ids = _ids(conn, r"SELECT id FROM users WHERE username_norm LIKE 'bench\_user\_%'")
+
+    print("-> symptom_entries")
+    per_patient = max(entries // max(len(user_ids), 1), 1)
+
+    def entry_rows():
+        for uid in user_ids:
+            for _ in range(per_patient):
+                d = today - timedelta(days=rng.randrange(days))
+                yield (uid, rng.choice(SYMPTOMS), rng.randint(0, 10), d,
+                       f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:00", None)
+
+    _insert_batches(conn, """
+        INSERT INTO symptom_entries (user_id, symptom_name, intensity, entry_date, entry_time, notes)
+        VALUES (%s,%s,%s,%s,%s,%s)
+    """, entry_rows(), batch_size, "symptom_entries")
+
+    print("-> doctor_patients")
+
+    def share_rows():
+        for uid in user_ids:
+            for did in rng.sample(doctor_ids, min(shares_per_patient, len(doctor_ids))):
+                yield (did, uid, "bench", today - timedelta(days=rng.randrange(days)))
+
+    _insert_batches(conn, """
+        INSERT INTO doctor_patients (doctor_id, patient_id, note, fecha)
+        VALUES (%s,%s,%s,%s)
+    """, share_rows(), batch_size, "doctor_patients")
+
+    print("-> rollups, resumen doctor-paciente y secuencia de cambios")
+    cur = conn.cursor()
+    try:
+        for sql in (schema.ROLLUPS_BACKFILL_SQL, schema.SUMMARY_BACKFILL_SQL,
+                    *schema.CHANGE_SEQ_BACKFILL_SQL):
+            started = time.monotonic()
+            cur.execute(sql)
+            conn.commit()
+            print(f"   backfill en {time.monotonic() - started:.1f}s")
+    finally:
+        cur.close()
@@ -0,0 +1,169 @@
+############# Pool de conexiones MySQL (SymptoTrack) #############
+# Reemplaza a flask_mysqldb (una conexión nueva por request).
+#   - size:         conexiones que se mantienen abiertas en reposo
+#   - max_overflow: conexiones extra permitidas en picos (se cierran al devolverse)
+#   - timeout:      segundos máximos esperando una conexión libre
+#   - recycle:      edad máxima (s) de una conexión antes de reabrirla
+#   - pre_ping:     hace ping() antes de entregar una conexión reutilizada
+
+import queue
+import threading
+import time
+
+import MySQLdb
+
+
+class PoolExhausted(Exception):
+    """No hay conexiones libres y se agotó el tiempo de espera."""
+
+
+class ConnectionPool:
+    def __init__(self, connect_kwargs, size=5, max_overflow=10, timeout=30,
+                 recycle=3600, pre_ping=True):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = queue.LifoQueue()   # LIFO: reutiliza la conexión más "caliente"
+        self._born = {}                  # id(conn) -> instante de creación
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "checkins": 0,
+            "connects": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "exhausted": 0,
+        }
+
+    # -----------------------------
+    # API pública
+    # -----------------------------
+    def acquire(self):
+        """Entrega una conexión sana del pool (o abre una nueva dentro del límite)."""
+        start = time.monotonic()
+        waited = False
+        while True:
+            conn = self._take_idle()
+            if conn is None:
+                conn = self._open_if_allowed()
+            if conn is None:
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    with self._lock:
+                        self._stats["exhausted"] += 1
+                    raise PoolExhausted(
+                        f"Pool MySQL agotado ({self.size}+{self.max_overflow} conexiones)")
+                try:
+                    # espera por tramos cortos: también puede liberarse un hueco por _discard
+                    conn = self._idle.get(timeout=min(remaining, 0.1))
+                except queue.Empty:
+                    continue
+            if self._is_healthy(conn):
+                break
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += elapsed
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], elapsed)
+        return conn
+
+    def release(self, conn):
+        """Devuelve la conexión: descarta la transacción abierta y la guarda o la cierra."""
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            self._stats["checkins"] += 1
+            overflow = self._idle.qsize() >= self.size
+        if overflow:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            idle = self._idle.qsize()
+            data.update({
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "opened": self._opened,
+                "idle": idle,
+                "in_use": self._opened - idle,
+            })
+        return data
+
+    def close_all(self):
+        """Cierra las conexiones en reposo (p.ej. tras un fork o al apagar)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    # -----------------------------
+    # Internos
+    # -----------------------------
+    def _take_idle(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _open_if_allowed(self):
+        with self._lock:
+            if self._opened >= self.size + self.max_overflow:
+                return None
+            self._opened += 1
+        try:
+            conn = MySQLdb.connect(**self.connect_kwargs)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+        with self._lock:
+            self._born[id(conn)] = time.monotonic()
+            self._stats["connects"] += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        born = self._born.get(id(conn), 0)
+        if self.recycle and time.monotonic() - born > self.recycle:
+            with self._lock:
+                self._stats["recycled"] += 1
+            self._discard(conn)
+            return False
+        if self.pre_ping:
+            try:
+                conn.ping()
+            except Exception:
+                with self._lock:
+                    self._stats["ping_failures"] += 1
+                self._discard(conn)
+                return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._born.pop(id(conn), None)
+            self._opened -= 1
@@ -0,0 +1,203 @@
+############# Cola de ingesta con escritura diferida (SymptoTrack) #############
+# Modo opcional de POST /symptoms: el registro validado entra en una cola acotada en
+# memoria y se responde al momento con un id provisional. Un hilo escritor vacía la
+# cola por lotes (group commit) cuando junta batch_size registros o pasa flush_interval.
+#   - maxsize:        registros en cola como máximo; llena -> QueueFull (el API responde 503)
+#   - batch_size:     registros por transacción
+#   - flush_interval: segundos máximos que espera un registro antes de escribirse
+#   - retries:        reintentos de un lote si falla la escritura (con espera creciente)
+#
+# La cola es del proceso: si el proceso muere sin apagarse bien se pierde lo pendiente
+# (hasta maxsize registros). close() (registrado con atexit) deja de aceptar y escribe
+# todo lo que queda antes de salir.
+
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("symptotrack.ingest")
+
+
+class QueueFull(Exception):
+    """La cola de ingesta está llena (o cerrada): hay que reintentar más tarde."""
+
+
+class IngestQueue:
+    def __init__(self, writer, maxsize=10000, batch_size=500, flush_interval=0.05,
+                 retries=5, results_max=100000):
+        """
+        writer(rows) escribe un lote en una transacción y devuelve una lista, alineada con
+        rows, de (id, None) o (None, mensaje de error).
+        """
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.results_max = results_max
+
+        self._queue = queue.Queue(maxsize)
+        self._results = OrderedDict()   # id provisional -> {"status", "id"?, "error"?}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._seq = itertools.count(1)
+        self._prefix = f"p{os.getpid():x}-{int(time.time()):x}-"
+        self._stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "batch_rows_max": 0,
+            "write_time_total": 0.0,
+            "retries": 0,
+        }
+
+    # -----------------------------
+    # API pública
+    # -----------------------------
+    def submit(self, row):
+        """Encola una fila validada y devuelve su id provisional (o lanza QueueFull)."""
+        if self._closed:
+            raise QueueFull("La cola de ingesta está cerrada")
+        self._ensure_writer()
+        provisional_id = self._prefix + str(next(self._seq))
+        # antes de encolar: el escritor puede dejar "written" antes de que put_nowait vuelva
+        with self._lock:
+            self._remember(provisional_id, {"status": "queued"})
+        try:
+            self._queue.put_nowait((provisional_id, row))
+        except queue.Full:
+            with self._lock:
+                self._results.pop(provisional_id, None)
+                self._stats["rejected"] += 1
+            raise QueueFull(f"Cola de ingesta llena ({self._queue.maxsize} registros)")
+        with self._lock:
+            self._stats["accepted"] += 1
+        return provisional_id
+
+    def status(self, provisional_id):
+        """{"status": queued|written|failed, ...} o None si no se conoce (o ya se olvidó)."""
+        with self._lock:
+            result = self._results.get(provisional_id)
+            return dict(result) if result else None
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data.update({
+            "queued": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "closed": self._closed,
+        })
+        return data
+
+    def close(self, timeout=30):
+        """Deja de aceptar registros y espera a que se escriba lo pendiente."""
+        self._closed = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)   # despierta al escritor; sale al vaciar la cola
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.error("Ingesta: quedan %d registros sin escribir al cerrar",
+                             self._queue.qsize())
+
+    # -----------------------------
+    # Internos
+    # -----------------------------
+    def _ensure_writer(self):
+        # el hilo se crea en el primer uso: tras un fork (gunicorn) cada worker tiene el suyo
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="symptom-ingest",
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _remember(self, provisional_id, result):
+        self._results[provisional_id] = result
+        self._results.move_to_end(provisional_id)
+        while len(self._results) > self.results_max:
+            self._results.popitem(last=False)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            # junta hasta batch_size o hasta que vence el plazo del primero
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                break
+        self._drain()
+
+    def _drain(self):
+        """Al cerrar: escribe por lotes lo que quede en la cola, sin esperar."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    batch.append(item)
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        rows = [row for _, row in batch]
+        delay = 0.1
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                outcomes = self.writer(rows)
+                break
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception("Ingesta: lote de %d registros descartado", len(rows))
+                    outcomes = [(None, "Error escribiendo el registro")] * len(rows)
+                    break
+                logger.warning("Ingesta: fallo escribiendo lote de %d, reintento %d",
+                               len(rows), attempt + 1, exc_info=True)
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["batch_rows_max"] = max(self._stats["batch_rows_max"], len(rows))
+            self._stats["write_time_total"] += elapsed
+            for (provisional_id, _), (new_id, error) in zip(batch, outcomes):
+                if error is None:
+                    self._stats["written"] += 1
+                    self._remember(provisional_id, {"status": "written", "id": new_id})
+                else:
+                    self._stats["failed"] += 1
+                    self._remember(provisional_id, {"status": "failed", "error": error})
@@ -0,0 +1,210 @@
+############# Métricas por request (SymptoTrack) #############
+# - RequestStats: contadores de un request (sentencias SQL, tiempo en DB, filas, JSON)
+# - InstrumentedConnection / InstrumentedCursor: envuelven la conexión de get_db()
+# - Registry: agregados por ruta del proceso y salida en formato de texto Prometheus
+#
+# Cada proceso (worker) tiene su propio Registry: Prometheus debe raspar cada worker
+# o sumar las series por instancia.
+
+import threading
+import time
+
+# Buckets (segundos) de latencia de request, estilo Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets de sentencias SQL por request
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time", "rows", "json_time")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.json_time = 0.0
+
+
+# -----------------------------
+# Envoltorios de conexión / cursor
+# -----------------------------
+class InstrumentedCursor:
+    """
+    Cursor que anota sentencias, tiempo y filas en un RequestStats y, si hay tracer
+    (sql_trace.SqlTracer), le pasa cada sentencia con su duración y la ruta.
+    """
+
+    def __init__(self, cursor, stats, tracer=None, route=None):
+        self._cursor = cursor
+        self._stats = stats
+        self._tracer = tracer
+        self._route = route
+
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args, False)
+
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args, True)
+
+    def _timed(self, method, query, args, many):
+        started = time.perf_counter()
+        try:
+            return method(query, args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stats.statements += 1
+            self._stats.db_time += elapsed
+            if self._tracer is not None:
+                self._tracer.record(query, args, elapsed, self._cursor.rowcount,
+                                    route=self._route, many=many)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._stats.db_time += time.perf_counter() - started
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._stats.db_time += time.perf_counter() - started
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._stats.db_time += time.perf_counter() - started
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Conexión cuyos cursores son InstrumentedCursor; el resto se delega."""
+
+    def __init__(self, conn, stats, tracer=None, route=None):
+        self._conn = conn
+        self._stats = stats
+        self._tracer = tracer
+        self._route = route
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._stats,
+                                  self._tracer, self._route)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# -----------------------------
+# Agregados por ruta
+# -----------------------------
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class _RouteStats:
+    def __init__(self):
+        self.requests = {}   # (method, status) -> n
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.statements = _Histogram(STATEMENT_BUCKETS)
+        self.db_time = 0.0
+        self.rows = 0
+        self.json_time = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, duration, stats):
+        with self._lock:
+            r = self._routes.get(route)
+            if r is None:
+                r = self._routes[route] = _RouteStats()
+            key = (method, status)
+            r.requests[key] = r.requests.get(key, 0) + 1
+            r.latency.observe(duration)
+            r.statements.observe(stats.statements)
+            r.db_time += stats.db_time
+            r.rows += stats.rows
+            r.json_time += stats.json_time
+
+    def render_prometheus(self, prefix="symptotrack"):
+        """Texto de exposición Prometheus (versión 0.0.4)."""
+        out = []
+
+        def header(name, kind, help_text):
+            out.append(f"# HELP {prefix}_{name} {help_text}")
+            out.append(f"# TYPE {prefix}_{name} {kind}")
+
+        with self._lock:
+            routes = sorted(self._routes.items())
+
+            header("http_requests_total", "counter", "Requests por ruta, método y status.")
+            for route, r in routes:
+                for (method, status), n in sorted(r.requests.items()):
+                    out.append(f'{prefix}_http_requests_total{{route="{_esc(route)}",method="{method}",'
+                               f'status="{status}"}} {n}')
+
+            header("http_request_duration_seconds", "histogram", "Latencia de request.")
+            for route, r in routes:
+                _render_histogram(out, f"{prefix}_http_request_duration_seconds", route, r.latency)
+
+            header("db_statements_per_request", "histogram", "Sentencias SQL por request.")
+            for route, r in routes:
+                _render_histogram(out, f"{prefix}_db_statements_per_request", route, r.statements)
+
+            for name, attr, help_text in (
+                ("db_time_seconds_total", "db_time", "Tiempo total en execute/fetch de MySQL."),
+                ("db_rows_fetched_total", "rows", "Filas leídas de MySQL."),
+                ("json_serialize_seconds_total", "json_time", "Tiempo serializando JSON."),
+            ):
+                header(name, "counter", help_text)
+                for route, r in routes:
+                    out.append(f'{prefix}_{name}{{route="{_esc(route)}"}} {_num(getattr(r, attr))}')
+        return "\n".join(out) + "\n"
+
+
+def _render_histogram(out, name, route, h):
+    label = f'route="{_esc(route)}"'
+    for bound, n in zip(h.buckets, h.counts):
+        out.append(f'{name}_bucket{{{label},le="{_num(bound)}"}} {n}')
+    out.append(f'{name}_bucket{{{label},le="+Inf"}} {h.count}')
+    out.append(f"{name}_sum{{{label}}} {_num(h.total)}")
+    out.append(f"{name}_count{{{label}}} {h.count}")
+
+def _esc(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def server_timing(total, stats):
+    """Valor del header Server-Timing (duraciones en ms)."""
+    return (f"app;dur={total * 1000:.1f}, "
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.statements} queries, {stats.rows} rows", '
+            f"json;dur={stats.json_time * 1000:.1f}")
@@ -0,0 +1,115 @@
+############# Hash de contraseñas (SymptoTrack) #############
+# scrypt (memory-hard, hashlib de la biblioteca estándar) con coste ajustable:
+#   n: factor de coste CPU/memoria (potencia de 2); memoria ~ 128 * n * r bytes
+#   r: tamaño de bloque
+#   p: paralelismo
+# Formato guardado: scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+# Al subir el coste, needs_rehash() detecta los hashes viejos y el login los regenera.
+#
+# HashPool ejecuta hash/verificación en un pool de hilos acotado (hashlib.scrypt libera
+# el GIL): como mucho `workers` cálculos a la vez, así que un pico de logins no se
+# come la CPU del resto de rutas, y con más de `max_pending` en espera se rechaza
+# (Busy) en lugar de acumular logins que acabarían por timeout.
+# Los hash masivos (importaciones) van a un pool aparte con la mitad de hilos: no se
+# ponen en cola delante de los logins ni ocupan todo el cupo.
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_N = 2 ** 14
+DEFAULT_R = 8
+DEFAULT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + (1 << 20), dklen=KEY_BYTES)
+
+
+def hash_password(password, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+    salt = os.urandom(SALT_BYTES)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def parse_hash(encoded):
+    """(n, r, p, salt, key) o None si no es un hash reconocido."""
+    try:
+        scheme, n, r, p, salt, key = encoded.split("$")
+        if scheme != "scrypt":
+            return None
+        return int(n), int(r), int(p), _unb64(salt), _unb64(key)
+    except (AttributeError, ValueError):
+        return None
+
+
+def verify_password(password, encoded):
+    parsed = parse_hash(encoded)
+    if parsed is None:
+        return False
+    n, r, p, salt, key = parsed
+    return hmac.compare_digest(_scrypt(password, salt, n, r, p), key)
+
+
+def needs_rehash(encoded, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+    parsed = parse_hash(encoded)
+    return parsed is None or parsed[:3] != (n, r, p)
+
+
+class Busy(Exception):
+    """Demasiados cálculos de hash en espera."""
+
+
+class HashPool:
+    def __init__(self, workers=None, max_pending=64, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+        self.workers = workers or os.cpu_count() or 2
+        self.max_pending = max_pending
+        self.n, self.r, self.p = n, r, p
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="password-hash")
+        self._bulk = ThreadPoolExecutor(max_workers=max(1, self.workers // 2),
+                                        thread_name_prefix="password-hash-bulk")
+        self._slots = threading.BoundedSemaphore(self.workers + max_pending)
+        # hash de referencia para gastar lo mismo cuando la cuenta no existe
+        self._dummy = hash_password("x" * 16, n, r, p)
+
+    def _run(self, fn, *args, timeout=None):
+        if not self._slots.acquire(blocking=False):
+            raise Busy(f"{self.max_pending} cálculos de hash en espera")
+        try:
+            return self._executor.submit(fn, *args).result(timeout)
+        finally:
+            self._slots.release()
+
+    def hash(self, password, timeout=None):
+        return self._run(hash_password, password, self.n, self.r, self.p, timeout=timeout)
+
+    def hash_many(self, passwords):
+        """Hashea en paralelo en el pool de importaciones (no compite con la cola de logins)."""
+        return list(self._bulk.map(
+            lambda pw: hash_password(pw, self.n, self.r, self.p), passwords))
+
+    def verify(self, password, encoded, timeout=None):
+        """True/False; con encoded None hace un cálculo equivalente y devuelve False."""
+        if encoded is None:
+            self._run(verify_password, password, self._dummy, timeout=timeout)
+            return False
+        return self._run(verify_password, password, encoded, timeout=timeout)
+
+    def needs_rehash(self, encoded):
+        return needs_rehash(encoded, self.n, self.r, self.p)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        self._bulk.shutdown(wait=False)
@@ -0,0 +1,375 @@
+############# Esquema / migraciones SymptoTrack #############
+# Migraciones versionadas sobre la base existente (users, doctors, admins,
+# symptom_entries, doctor_patients). La versión aplicada se guarda en schema_migrations.
+#
+# Uso (desde la carpeta del proyecto):
+#   flask --app App db-migrate      # aplica las migraciones pendientes
+#   flask --app App db-check        # EXPLAIN de las consultas calientes: deben usar índice
+#
+# Nota: en MySQL el DDL hace commit implícito, así que una migración no es atómica.
+# Por eso cada paso comprueba information_schema antes de tocar nada y se puede
+# volver a ejecutar tras un fallo.
+
+# -----------------------------
+# Pasos reutilizables
+# -----------------------------
+def add_column(table, column, definition):
+    def step(cur):
+        cur.execute("""
+            SELECT 1 FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s
+        """, (table, column))
+        if not cur.fetchone():
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    step.__doc__ = f"{table}.{column}"
+    return step
+
+def add_index(table, name, definition):
+    def step(cur):
+        cur.execute("""
+            SELECT 1 FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s
+        """, (table, name))
+        if not cur.fetchone():
+            cur.execute(f"ALTER TABLE {table} ADD {definition}")
+    step.__doc__ = f"{table}.{name}"
+    return step
+
+def add_foreign_key(table, column, definition):
+    def step(cur):
+        # cualquier FK ya existente sobre la columna vale (aunque tenga otro nombre)
+        cur.execute("""
+            SELECT 1 FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s
+              AND REFERENCED_TABLE_NAME IS NOT NULL
+        """, (table, column))
+        if not cur.fetchone():
+            cur.execute(f"ALTER TABLE {table} ADD {definition}")
+    step.__doc__ = f"{table}.{column} (FK)"
+    return step
+
+def make_nullable(table, column):
+    def step(cur):
+        # mismo tipo, solo quita NOT NULL (si la columna existe)
+        cur.execute("""
+            SELECT COLUMN_TYPE, IS_NULLABLE FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s
+        """, (table, column))
+        row = cur.fetchone()
+        if row and row["IS_NULLABLE"] == "NO":
+            cur.execute(f"ALTER TABLE {table} MODIFY {column} {row['COLUMN_TYPE']} NULL")
+    step.__doc__ = f"{table}.{column} NULL"
+    return step
+
+def norm_column(source):
+    """Columna generada con el valor en minúsculas (las búsquedas no usan LOWER() en SQL)."""
+    return f"VARCHAR(255) GENERATED ALWAYS AS (LOWER({source})) STORED"
+
+# -----------------------------
+# Tablas derivadas (las mantiene App.py en la misma transacción que la escritura)
+# -----------------------------
+# Rollups por usuario/síntoma y periodo para GET /users/<id>/symptoms/trends;
+# create_symptom, el batch y la cola de ingesta suman, update/delete recalculan.
+SYMPTOM_ROLLUPS_DDL = """
+    CREATE TABLE IF NOT EXISTS symptom_rollups (
+        user_id        BIGINT UNSIGNED NOT NULL,
+        granularity    ENUM('day','week','month') NOT NULL,
+        period_start   DATE NOT NULL,
+        symptom_name   VARCHAR(100) NOT NULL,
+        entries_count  INT UNSIGNED NOT NULL,
+        intensity_sum  INT UNSIGNED NOT NULL,
+        intensity_min  TINYINT UNSIGNED NOT NULL,
+        intensity_max  TINYINT UNSIGNED NOT NULL,
+        PRIMARY KEY (user_id, granularity, period_start, symptom_name)
+    ) ENGINE=InnoDB
+"""
+
+# Una fila por (doctor, paciente) para la lista de pacientes del doctor; la mantiene
+# /patients/share.
+DOCTOR_PATIENT_SUMMARY_DDL = """
+    CREATE TABLE IF NOT EXISTS doctor_patient_summary (
+        doctor_id         INT NOT NULL,
+        patient_id        BIGINT UNSIGNED NOT NULL,
+        patient_fullname  VARCHAR(255) NULL,
+        last_shared_date  DATE NOT NULL,
+        shares_count      INT UNSIGNED NOT NULL,
+        PRIMARY KEY (doctor_id, patient_id),
+        KEY ix_summary_doctor_date_name (doctor_id, last_shared_date DESC, patient_fullname),
+        KEY ix_summary_doctor_date_pid (doctor_id, last_shared_date DESC, patient_id DESC)
+    ) ENGINE=InnoDB
+"""
+
+# -----------------------------
+# Backfills (también los usa bench.seed)
+# -----------------------------
+# Recalculan desde las tablas fuente: sobrescriben, no suman.
+ROLLUPS_BACKFILL_SQL = """
+    INSERT INTO symptom_rollups
+        (user_id, granularity, period_start, symptom_name,
+         entries_count, intensity_sum, intensity_min, intensity_max)
+    SELECT user_id, b.granularity,
+           CASE b.granularity
+             WHEN 'day'  THEN entry_date
+             WHEN 'week' THEN entry_date - INTERVAL WEEKDAY(entry_date) DAY
+             ELSE             entry_date - INTERVAL (DAYOFMONTH(entry_date) - 1) DAY
+           END AS period_start,
+           symptom_name, COUNT(*), SUM(intensity), MIN(intensity), MAX(intensity)
+    FROM symptom_entries
+    CROSS JOIN (SELECT 'day' AS granularity UNION ALL SELECT 'week' UNION ALL SELECT 'month') b
+    GROUP BY user_id, b.granularity, period_start, symptom_name
+    ON DUPLICATE KEY UPDATE
+        entries_count = VALUES(entries_count),
+        intensity_sum = VALUES(intensity_sum),
+        intensity_min = VALUES(intensity_min),
+        intensity_max = VALUES(intensity_max)
+"""
+
+SUMMARY_BACKFILL_SQL = """
+    INSERT INTO doctor_patient_summary
+        (doctor_id, patient_id, patient_fullname, last_shared_date, shares_count)
+    SELECT dp.doctor_id, dp.patient_id, CONCAT(u.first_name, ' ', u.last_name),
+           MAX(dp.fecha), COUNT(*)
+    FROM doctor_patients dp
+    JOIN users u ON u.id = dp.patient_id
+    GROUP BY dp.doctor_id, dp.patient_id, u.first_name, u.last_name
+    ON DUPLICATE KEY UPDATE
+        patient_fullname = VALUES(patient_fullname),
+        last_shared_date = VALUES(last_shared_date),
+        shares_count     = VALUES(shares_count)
+"""
+
+# Numera (change_seq) las filas que aún no tienen, por usuario y a continuación del
+# contador de symptom_change_seq; luego deja el contador en el máximo asignado.
+CHANGE_SEQ_BACKFILL_SQL = [
+    """
+    UPDATE symptom_entries e
+    JOIN (
+        SELECT s.id,
+               COALESCE(c.seq, 0) + ROW_NUMBER() OVER (PARTITION BY s.user_id ORDER BY s.id) AS seq
+        FROM symptom_entries s
+        LEFT JOIN symptom_change_seq c ON c.user_id = s.user_id
+        WHERE s.change_seq = 0
+    ) x ON x.id = e.id
+    SET e.change_seq = x.seq, e.created_seq = x.seq
+    """,
+    """
+    INSERT INTO symptom_change_seq (user_id, seq)
+    SELECT user_id, MAX(change_seq) FROM symptom_entries GROUP BY user_id
+    ON DUPLICATE KEY UPDATE seq = GREATEST(seq, VALUES(seq))
+    """,
+]
+
+# -----------------------------
+# Migraciones
+# -----------------------------
+MIGRATIONS = [
+    (1, "Tablas de rollups de síntomas y resumen doctor-paciente (con backfill)", [
+        SYMPTOM_ROLLUPS_DDL,
+        ROLLUPS_BACKFILL_SQL,
+        DOCTOR_PATIENT_SUMMARY_DDL,
+        SUMMARY_BACKFILL_SQL,
+    ]),
+    (2, "Columnas normalizadas (minúsculas) con índice único e índices compuestos", [
+        # Falla si ya hay duplicados que solo difieren en mayúsculas: hay que limpiarlos antes.
+        add_column("users", "email_norm", norm_column("email")),
+        add_column("users", "username_norm", norm_column("username")),
+        add_index("users", "uq_users_email_norm", "UNIQUE KEY uq_users_email_norm (email_norm)"),
+        add_index("users", "uq_users_username_norm", "UNIQUE KEY uq_users_username_norm (username_norm)"),
+
+        add_column("doctors", "email_norm", norm_column("email")),
+        add_column("doctors", "username_norm", norm_column("username")),
+        add_index("doctors", "uq_doctors_email_norm", "UNIQUE KEY uq_doctors_email_norm (email_norm)"),
+        add_index("doctors", "uq_doctors_username_norm", "UNIQUE KEY uq_doctors_username_norm (username_norm)"),
+
+        add_column("admins", "username_norm", norm_column("username")),
+        add_index("admins", "uq_admins_username_norm", "UNIQUE KEY uq_admins_username_norm (username_norm)"),
+
+        add_index("symptom_entries", "ix_entries_user_date_id",
+                  "INDEX ix_entries_user_date_id (user_id, entry_date, id)"),
+        add_index("doctor_patients", "ix_dp_doctor_patient_fecha",
+                  "INDEX ix_dp_doctor_patient_fecha (doctor_id, patient_id, fecha)"),
+    ]),
+    (3, "Secuencia de cambios por usuario en symptom_entries (sync incremental)", [
+        """
+        CREATE TABLE IF NOT EXISTS symptom_change_seq (
+            user_id  BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+            seq      BIGINT UNSIGNED NOT NULL
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS symptom_tombstones (
+            user_id      BIGINT UNSIGNED NOT NULL,
+            change_seq   BIGINT UNSIGNED NOT NULL,
+            entry_id     BIGINT UNSIGNED NOT NULL,
+            created_seq  BIGINT UNSIGNED NOT NULL,
+            deleted_at   DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, change_seq)
+        ) ENGINE=InnoDB
+        """,
+        add_column("symptom_entries", "change_seq", "BIGINT UNSIGNED NOT NULL DEFAULT 0"),
+        add_column("symptom_entries", "created_seq", "BIGINT UNSIGNED NOT NULL DEFAULT 0"),
+        *CHANGE_SEQ_BACKFILL_SQL,
+        add_index("symptom_entries", "ix_entries_user_seq",
+                  "INDEX ix_entries_user_seq (user_id, change_seq)"),
+    ]),
+    (4, "Índices de búsqueda y paginación para /admin/users y /admin/doctors", [
+        add_index("users", "ix_users_active_id", "INDEX ix_users_active_id (is_active, id)"),
+        add_index("users", "ix_users_first_name", "INDEX ix_users_first_name (first_name)"),
+        add_index("users", "ix_users_last_name", "INDEX ix_users_last_name (last_name)"),
+        add_index("users", "ix_users_phone", "INDEX ix_users_phone (phone)"),
+        add_index("doctors", "ix_doctors_active_id", "INDEX ix_doctors_active_id (is_active, doctor_id)"),
+        add_index("doctors", "ix_doctors_first_name", "INDEX ix_doctors_first_name (first_name)"),
+        add_index("doctors", "ix_doctors_last_name", "INDEX ix_doctors_last_name (last_name)"),
+        # El primer FULLTEXT de una tabla InnoDB la reconstruye (columna FTS_DOC_ID oculta):
+        # en tablas grandes conviene aplicarla fuera de horas.
+        add_index("users", "ft_users_search",
+                  "FULLTEXT INDEX ft_users_search (first_name, last_name, email, username, phone)"),
+        add_index("doctors", "ft_doctors_search",
+                  "FULLTEXT INDEX ft_doctors_search (first_name, last_name, email, username)"),
+    ]),
+    (5, "Claves foráneas de symptom_entries y doctor_patients (respaldo de la cache de IDs)", [
+        # Falla si hay filas huérfanas: hay que limpiarlas antes.
+        add_foreign_key("symptom_entries", "user_id",
+                        "CONSTRAINT fk_entries_user FOREIGN KEY (user_id) REFERENCES users (id)"),
+        add_foreign_key("doctor_patients", "doctor_id",
+                        "CONSTRAINT fk_dp_doctor FOREIGN KEY (doctor_id) REFERENCES doctors (doctor_id)"),
+        add_foreign_key("doctor_patients", "patient_id",
+                        "CONSTRAINT fk_dp_patient FOREIGN KEY (patient_id) REFERENCES users (id)"),
+    ]),
+    (6, "Hash de contraseñas (scrypt); las columnas en texto plano pasan a NULL-ables", [
+        # el login rellena password_hash y borra el texto plano la primera vez que entra
+        add_column("users", "password_hash", "VARCHAR(255) NULL"),
+        add_column("doctors", "password_hash", "VARCHAR(255) NULL"),
+        add_column("admins", "password_hash", "VARCHAR(255) NULL"),
+        make_nullable("users", "password_plain"),
+        make_nullable("users", "password"),
+        make_nullable("doctors", "password_plain"),
+        make_nullable("doctors", "password"),
+        make_nullable("admins", "password_plain"),
+    ]),
+]
+
+# -----------------------------
+# Ejecución
+# -----------------------------
+def current_version(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+    cur.execute("SELECT MAX(version) AS v FROM schema_migrations")
+    row = cur.fetchone()
+    return (row["v"] if isinstance(row, dict) else row[0]) or 0
+
+def migrate(conn, target=None, log=print):
+    """Aplica en orden las migraciones pendientes hasta target (o todas)."""
+    cur = conn.cursor()
+    try:
+        version = current_version(cur)
+        for number, description, steps in MIGRATIONS:
+            if number <= version or (target is not None and number > target):
+                continue
+            log(f"-> migración {number}: {description}")
+            for step in steps:
+                if callable(step):
+                    step(cur)
+                else:
+                    cur.execute(step)
+            cur.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (number, description))
+            conn.commit()
+            version = number
+        return version
+    finally:
+        cur.close()
+
+# -----------------------------
+# Auto-chequeo de índices
+# -----------------------------
+# (nombre, sql, args) de las consultas calientes de App.py, con valores de ejemplo.
+HOT_QUERIES = [
+    ("login: admins.username_norm",
+     "SELECT id FROM admins WHERE username_norm=%s AND is_active=1", ("demo",)),
+    ("login: doctors.username_norm",
+     "SELECT doctor_id FROM doctors WHERE username_norm=%s AND is_active=1", ("demo",)),
+    ("login: doctors.email_norm",
+     "SELECT doctor_id FROM doctors WHERE email_norm=%s AND is_active=1", ("demo@x.com",)),
+    ("login: users.username_norm",
+     "SELECT id FROM users WHERE username_norm=%s AND is_active=1", ("demo",)),
+    ("login: users.email_norm",
+     "SELECT id FROM users WHERE email_norm=%s AND is_active=1", ("demo@x.com",)),
+    ("register_doctor: duplicados",
+     "SELECT doctor_id FROM doctors WHERE email_norm=%s OR username_norm=%s", ("demo@x.com", "demo")),
+    ("list_symptoms: página keyset",
+     """SELECT id FROM symptom_entries
+        WHERE user_id=%s AND (entry_date < %s OR (entry_date = %s AND id < %s))
+        ORDER BY entry_date DESC, id DESC LIMIT 50""", (1, "2100-01-01", "2100-01-01", 1 << 40)),
+    ("symptom_trends",
+     "SELECT symptom_name FROM symptom_rollups WHERE user_id=%s AND granularity=%s ORDER BY period_start DESC",
+     (1, "day")),
+    ("list_patients_for_doctor",
+     """SELECT patient_id FROM doctor_patient_summary WHERE doctor_id=%s
+        ORDER BY last_shared_date DESC, patient_fullname ASC""", (1,)),
+    ("symptom_changes",
+     """SELECT id FROM symptom_entries WHERE user_id=%s AND change_seq > %s
+        ORDER BY change_seq LIMIT 500""", (1, 0)),
+    ("symptom_changes: borrados",
+     """SELECT entry_id FROM symptom_tombstones WHERE user_id=%s AND change_seq > %s
+        ORDER BY change_seq LIMIT 500""", (1, 0)),
+    ("export_patient_symptoms: relación",
+     "SELECT 1 FROM doctor_patients WHERE doctor_id=%s AND patient_id=%s LIMIT 1", (1, 1)),
+    ("export_patient_symptoms",
+     "SELECT id FROM symptom_entries WHERE user_id=%s AND entry_date >= %s ORDER BY entry_date, id",
+     (1, "2000-01-01")),
+    ("admin_list_users: página activos",
+     "SELECT id FROM users WHERE is_active=%s AND id < %s ORDER BY id DESC LIMIT 51", (1, 1 << 40)),
+    ("admin_list_users: prefijo",
+     """SELECT id FROM users
+        WHERE username_norm LIKE %s OR email_norm LIKE %s OR first_name LIKE %s
+           OR last_name LIKE %s OR phone LIKE %s
+        ORDER BY id DESC LIMIT 51""", ("ana%",) * 5),
+    ("admin_list_doctors: texto completo",
+     """SELECT doctor_id FROM doctors
+        WHERE MATCH(first_name, last_name, email, username) AGAINST (%s IN BOOLEAN MODE)
+        ORDER BY doctor_id DESC LIMIT 51""", ("+ana*",)),
+    ("patient_detail_for_doctor: notas",
+     """SELECT id FROM doctor_patients WHERE doctor_id=%s AND patient_id=%s
+        ORDER BY fecha DESC, id DESC""", (1, 1)),
+    ("doctor_analytics: huella de la cohorte",
+     """SELECT COUNT(*), SUM(s.seq) FROM doctor_patient_summary d
+        LEFT JOIN symptom_change_seq s ON s.user_id = d.patient_id
+        WHERE d.doctor_id=%s""", (1,)),
+    ("doctor_analytics: registros de la cohorte",
+     """SELECT e.user_id, e.intensity FROM doctor_patient_summary d
+        JOIN symptom_entries e ON e.user_id = d.patient_id AND e.entry_date >= %s
+        WHERE d.doctor_id=%s""", ("2000-01-01", 1)),
+]
+
+# Casos en los que MySQL no elige índice porque ya sabe que no hay filas
+_EMPTY_PLAN = ("no matching row", "impossible where", "no matching min/max row")
+
+def check_indexes(conn, queries=HOT_QUERIES):
+    """
+    Ejecuta EXPLAIN de cada consulta y devuelve [(nombre, ok, detalle)].
+    ok es False si alguna tabla real del plan se lee sin índice (key NULL).
+    """
+    results = []
+    cur = conn.cursor()
+    try:
+        for name, sql, args in queries:
+            cur.execute("EXPLAIN " + sql, args)
+            problems = []
+            for row in cur.fetchall():
+                table = row.get("table")
+                extra = (row.get("Extra") or "").lower()
+                if not table or table.startswith("<") or any(x in extra for x in _EMPTY_PLAN):
+                    continue
+                if not row.get("key"):
+                    problems.append(f"{table}: type={row.get('type')} sin índice")
+            results.append((name, not problems, "; ".join(problems) or "ok"))
+    finally:
+        cur.close()
+    return results
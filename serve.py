@@ -0,0 +1,120 @@
+############# Servidor de producción (SymptoTrack) #############
+# Requisitos adicionales:
+#   pip install gunicorn
+#
+# Ejecutar:
+#   python serve.py                                   # 0.0.0.0:8000, workers e hilos automáticos
+#   python serve.py --bind 0.0.0.0:8080 --workers 8 --threads 4 --pidfile /run/symptotrack.pid
+#   SYMPTOTRACK_MYSQL_HOST=db SYMPTOTRACK_ADMISSION_ENABLED=true python serve.py
+#
+# gunicorn pre-fork con workers gthread:
+#   - workers: núcleos disponibles para el proceso (afinidad y cuota de cgroup), o
+#     WEB_CONCURRENCY. Cada worker es un proceso, así que se usan todos los núcleos.
+#   - hilos por worker: 4 (o SYMPTOTRACK_THREADS). El pool MySQL de cada worker tiene
+#     tantas conexiones como hilos, el control de admisión recorta sus cupos a esos hilos
+#     (pacientes como mucho hilos - 1) y el pool de hash se reparte los núcleos entre workers.
+#   - preload: el master importa App y crea la app una sola vez; gc.freeze() antes del
+#     fork evita que el GC de los workers toque esos objetos, así que comparten las
+#     páginas copy-on-write y arrancan sin volver a importar nada.
+#   - post_fork: App.reset_after_fork(); cada worker crea su pool de conexiones, cola de
+#     ingesta, pool de hash y control de admisión en el primer uso.
+#
+# Recarga sin cortar requests:
+#   kill -HUP <master>          workers nuevos y cierre ordenado de los viejos (misma
+#                               versión del código: con preload no se reimporta)
+#   kill -USR2 <master>         desplegar código nuevo: arranca otro master sobre el mismo
+#   kill -TERM <master viejo>   socket; después el viejo termina lo que está atendiendo
+#                               (hasta --graceful-timeout) y sale
+#
+# Sondas: GET / (liveness, no toca la base) y GET /ready (readiness: MySQL responde).
+
+import argparse
+import gc
+import math
+import os
+
+from gunicorn.app.base import BaseApplication
+
+import App
+
+DEFAULT_THREADS = 4
+
+
+def available_cpus():
+    """Núcleos que puede usar el proceso: afinidad de CPU y cuota de cgroup v2 (contenedores)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:   # no Linux
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="ascii") as fh:
+            quota, period = fh.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def post_fork(server, worker):
+    App.reset_after_fork()
+
+
+class Server(BaseApplication):
+    def __init__(self, options, app_config):
+        self.options = options
+        self.app_config = app_config
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # con preload_app se ejecuta una vez, en el master, antes de crear los workers
+        app = App.create_app(self.app_config)
+        gc.freeze()
+        return app
+
+
+def main(argv=None):
+    cpus = available_cpus()
+    parser = argparse.ArgumentParser(description="Servidor de producción de la API SymptoTrack")
+    parser.add_argument("--bind", default=os.environ.get("SYMPTOTRACK_BIND", "0.0.0.0:8000"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", cpus)))
+    parser.add_argument("--threads", type=int,
+                        default=int(os.environ.get("SYMPTOTRACK_THREADS", DEFAULT_THREADS)))
+    parser.add_argument("--timeout", type=int, default=30, help="s sin latido antes de reiniciar un worker")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="s para terminar los requests en curso al parar o recargar")
+    parser.add_argument("--pidfile", default=None)
+    args = parser.parse_args(argv)
+
+    # las variables SYMPTOTRACK_* explícitas tienen prioridad sobre el ajuste automático
+    app_config = {}
+    if "SYMPTOTRACK_MYSQL_POOL_SIZE" not in os.environ:
+        app_config["MYSQL_POOL_SIZE"] = args.threads
+    if "SYMPTOTRACK_ADMISSION_THREADS" not in os.environ:
+        app_config["ADMISSION_THREADS"] = args.threads
+    if "SYMPTOTRACK_PASSWORD_WORKERS" not in os.environ:
+        app_config["PASSWORD_WORKERS"] = max(1, cpus // args.workers)
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": "gthread",
+        "threads": args.threads,
+        "preload_app": True,
+        "post_fork": post_fork,
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "keepalive": 5,
+        "pidfile": args.pidfile,
+    }
+    print(f"SymptoTrack en {args.bind}: {args.workers} workers x {args.threads} hilos "
+          f"({cpus} núcleos disponibles)")
+    Server(options, app_config).run()
+
+
+if __name__ == "__main__":
+    main()
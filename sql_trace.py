@@ -0,0 +1,113 @@
+############# Trazas SQL y log de consultas lentas (SymptoTrack) #############
+# Cada sentencia ejecutada por get_db() se agrupa por "huella" (fingerprint): el SQL sin
+# literales, placeholders ni espacios redundantes. Así las comprobaciones repetidas como
+#   SELECT doctor_id FROM doctors WHERE doctor_id=%s LIMIT 1
+# suman en una sola fila con llamadas, tiempo total/máximo y filas.
+# Las sentencias por encima del umbral se registran en el logger "symptotrack.sql"
+# con la ruta y la forma (tipos) de los parámetros, nunca con sus valores.
+
+import functools
+import logging
+import re
+import threading
+
+logger = logging.getLogger("symptotrack.sql")
+
+_COMMENTS = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBERS = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%s|%\([^)]+\)s")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LISTS = re.compile(r"(values\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+")
+_SPACES = re.compile(r"\s+")
+_PUNCT = re.compile(r"\s*([=<>!,()*/+])\s*")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Normaliza una sentencia: sin literales ni espacios extra, en minúsculas."""
+    text = _COMMENTS.sub(" ", sql)
+    text = _STRINGS.sub("?", text)
+    text = _PLACEHOLDERS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _SPACES.sub(" ", text).strip().lower()
+    text = _PUNCT.sub(r"\1", text)
+    text = _IN_LISTS.sub("(?+)", text)
+    text = _VALUES_LISTS.sub(r"\1, ...", text)
+    return text
+
+
+def param_shape(args, many=False):
+    """Tipos de los parámetros (sin valores), p.ej. '(int, str)' o '500 x (int, str)'."""
+    if args is None:
+        return "()"
+    if many:
+        rows = list(args) if not isinstance(args, (list, tuple)) else args
+        first = rows[0] if rows else ()
+        return f"{len(rows)} x {param_shape(first)}"
+    if isinstance(args, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in args.items()) + "}"
+    if isinstance(args, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in args) + ")"
+    return type(args).__name__
+
+
+class _Fingerprint:
+    __slots__ = ("sample", "calls", "total_time", "max_time", "rows", "slow")
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.slow = 0
+
+
+class SqlTracer:
+    def __init__(self, slow_threshold=0.2, max_fingerprints=2000):
+        self.slow_threshold = slow_threshold
+        self.max_fingerprints = max_fingerprints
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, args, elapsed, rows, route=None, many=False):
+        fp = fingerprint(sql)
+        slow = self.slow_threshold is not None and elapsed >= self.slow_threshold
+        with self._lock:
+            s = self._stats.get(fp)
+            if s is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    s = self._stats.setdefault("<otras>", _Fingerprint("<otras>"))
+                else:
+                    s = self._stats[fp] = _Fingerprint(_SPACES.sub(" ", sql).strip())
+            s.calls += 1
+            s.total_time += elapsed
+            s.max_time = max(s.max_time, elapsed)
+            s.rows += max(rows or 0, 0)
+            s.slow += slow
+        if slow:
+            logger.warning("SQL lenta %.1f ms [%s] params=%s: %s",
+                           elapsed * 1000, route or "-", param_shape(args, many), fp)
+
+    def top(self, n=20, order_by="total_time"):
+        """Las n huellas más costosas (order_by: total_time, max_time, calls, rows)."""
+        with self._lock:
+            items = [(fp, s.sample, s.calls, s.total_time, s.max_time, s.rows, s.slow)
+                     for fp, s in self._stats.items()]
+        key = {"total_time": 3, "max_time": 4, "calls": 2, "rows": 5}[order_by]
+        items.sort(key=lambda x: x[key], reverse=True)
+        return [{
+            "fingerprint": fp,
+            "sample": sample,
+            "calls": calls,
+            "total_ms": round(total * 1000, 2),
+            "mean_ms": round(total * 1000 / calls, 3) if calls else None,
+            "max_ms": round(mx * 1000, 2),
+            "rows": rows,
+            "slow": slow,
+        } for fp, sample, calls, total, mx, rows, slow in items[:n]]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
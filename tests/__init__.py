@@ -0,0 +1,4 @@
+############# Tests (SymptoTrack) #############
+# Pruebas unitarias de los módulos que no necesitan MySQL:
+#   python -m pytest -q
+# Los de App.py necesitan mysqlclient instalado (App importa MySQLdb); sin él se saltan.
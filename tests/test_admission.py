@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from admission import AdmissionController, ConcurrencyLimit, Rejected, TokenBuckets
+
+
+def test_token_bucket_burst_then_wait():
+    buckets = TokenBuckets(rate=1, burst=2)
+    assert buckets.take("a") == 0
+    assert buckets.take("a") == 0
+    wait = buckets.take("a")
+    assert 0 < wait <= 1
+    assert buckets.take("b") == 0   # cada cliente tiene su bucket
+
+
+def test_token_bucket_refills():
+    buckets = TokenBuckets(rate=100, burst=1)
+    assert buckets.take("a") == 0
+    assert buckets.take("a") > 0
+    time.sleep(0.05)
+    assert buckets.take("a") == 0
+
+
+def test_token_bucket_evicts_least_recent():
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        buckets.take(key)
+    assert len(buckets) == 2
+    assert buckets.take("b") == 0   # "b" se olvidó: vuelve con el bucket lleno
+    assert buckets.take("c") > 0
+
+
+def test_concurrency_limit():
+    limit = ConcurrencyLimit(2)
+    assert limit.acquire() and limit.acquire()
+    assert not limit.acquire(0.01)
+    limit.release()
+    assert limit.acquire()
+    assert (limit.in_use, limit.peak) == (2, 2)
+
+
+CLASSES = {
+    "patient":   {"rate": 1000, "burst": 1000, "concurrency": 24, "queue_timeout": 0, "headroom": 1},
+    "clinician": {"rate": 1000, "burst": 1000, "concurrency": 16, "queue_timeout": 0},
+}
+
+
+def test_caps_fit_worker_threads():
+    stats = AdmissionController(CLASSES, {"/a": 12, "/b": 1}, threads=4).stats()
+    assert stats["classes"]["patient"]["concurrency"] == 3
+    assert stats["classes"]["clinician"]["concurrency"] == 4
+    assert stats["routes"]["/a"]["concurrency"] == 4
+    assert stats["routes"]["/b"]["concurrency"] == 1
+
+
+def test_caps_unchanged_without_threads():
+    stats = AdmissionController(CLASSES, {"/a": 12}).stats()
+    assert stats["classes"]["patient"]["concurrency"] == 24
+    assert stats["routes"]["/a"]["concurrency"] == 12
+
+
+def test_patients_leave_a_thread_for_clinicians():
+    controller = AdmissionController(CLASSES, threads=4)
+    tickets = [controller.admit("patient", f"p{i}", "/x") for i in range(3)]
+    with pytest.raises(Rejected) as exc:
+        controller.admit("patient", "p9", "/x")
+    assert exc.value.status == 503
+    clinician = controller.admit("clinician", "d1", "/x")
+    for ticket in tickets + [clinician]:
+        controller.release(ticket)
+    assert controller.stats()["classes"]["patient"]["in_use"] == 0
+
+
+def test_rate_limited_client_gets_429():
+    controller = AdmissionController({"patient": {"rate": 1, "burst": 1, "concurrency": 5}})
+    controller.release(controller.admit("patient", "ip", "/x"))
+    with pytest.raises(Rejected) as exc:
+        controller.admit("patient", "ip", "/x")
+    assert exc.value.status == 429 and exc.value.retry_after >= 1
+    assert controller.stats()["classes"]["patient"]["rate_limited"] == 1
+
+
+def test_route_slot_released_when_class_is_full():
+    controller = AdmissionController({"patient": {"rate": 1000, "burst": 1000, "concurrency": 1}},
+                                     {"/r": 5})
+    ticket = controller.admit("patient", "a", "/other")
+    with pytest.raises(Rejected):
+        controller.admit("patient", "b", "/r")
+    assert controller.stats()["routes"]["/r"]["in_use"] == 0
+    controller.release(ticket)
@@ -0,0 +1,63 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import analytics
+
+
+def run(rows, **kwargs):
+    return analytics.cohort(*analytics.columns(rows), **kwargs)
+
+
+def test_empty_cohort():
+    result = run([])
+    assert result["entries"] == 0 and result["symptoms"] == [] and result["trending_up"] == []
+
+
+def test_symptom_distribution():
+    rows = [(1, 0, "tos", 2), (1, 1, "tos", 4), (2, 0, "tos", 6), (2, 0, "fiebre", 9)]
+    result = run(rows)
+    assert (result["entries"], result["patients"]) == (4, 2)
+    tos, fiebre = result["symptoms"]   # ordenados por número de registros
+    assert tos["symptom_name"] == "tos" and fiebre["symptom_name"] == "fiebre"
+    assert (tos["entries"], tos["patients"], tos["mean"]) == (3, 2, 4.0)
+    assert tos["std"] == round(float(np.std([2, 4, 6])), 2)
+    assert (tos["p50"], tos["p90"]) == (4, 6)
+    assert tos["histogram"][2] == tos["histogram"][4] == tos["histogram"][6] == 1
+    assert sum(tos["histogram"]) == 3 and len(tos["histogram"]) == analytics.INTENSITY_LEVELS
+
+
+def test_intensities_are_clipped():
+    result = run([(1, 0, "dolor", 15), (1, 0, "dolor", -3)])
+    hist = result["symptoms"][0]["histogram"]
+    assert hist[0] == 1 and hist[10] == 1
+
+
+def test_cooccurrence_counts_same_patient_same_day():
+    rows = [
+        (1, 0, "tos", 3), (1, 0, "fiebre", 5),    # juntos
+        (1, 1, "tos", 3),                         # tos sola
+        (2, 0, "tos", 1), (2, 1, "fiebre", 2),    # mismo paciente, días distintos
+    ]
+    co = run(rows)["cooccurrence"]
+    i, j = co["symptoms"].index("tos"), co["symptoms"].index("fiebre")
+    assert co["days_together"][i][j] == co["days_together"][j][i] == 1
+    assert co["days_together"][i][i] == 3 and co["days_together"][j][j] == 2
+    assert co["jaccard"][i][j] == round(1 / (3 + 2 - 1), 3)
+    assert co["top_pairs"] == [{"a": co["symptoms"][0], "b": co["symptoms"][1],
+                                "days_together": 1, "jaccard": 0.25}]
+
+
+def test_trending_patient_slope_per_week():
+    rising = [(7, day, "dolor", day) for day in range(6)]       # +1 por día
+    flat = [(8, day, "dolor", 5) for day in range(6)]
+    result = run(rising + flat, min_points=5, min_slope=0.1)
+    assert [p["patient_id"] for p in result["trending_up"]] == [7]
+    patient = result["trending_up"][0]
+    assert patient["slope_per_week"] == 7.0
+    assert patient["rising_symptom"] == {"symptom_name": "dolor", "slope_per_week": 7.0}
+
+
+def test_too_few_points_are_not_trending():
+    result = run([(7, day, "dolor", day) for day in range(3)], min_points=5)
+    assert result["trending_up"] == []
@@ -0,0 +1,141 @@
+import time
+
+import pytest
+
+pytest.importorskip("MySQLdb")
+
+import App
+
+
+class InsertCursor:
+    """Cursor mínimo para insert_rows: ids por sentencia como InnoDB (con su incremento)."""
+
+    def __init__(self, step=1, first_id=100):
+        self.step = step
+        self.next_id = first_id
+        self.statements = []
+
+    def execute(self, sql, args=None):
+        assert "auto_increment_increment" in sql
+
+    def fetchone(self):
+        return {"step": self.step}
+
+    def executemany(self, sql, rows):
+        self.statements.append(len(rows))
+        self.lastrowid = self.next_id
+        self.next_id += len(rows) * self.step
+
+
+SQL = "INSERT INTO t (a, b) VALUES (%s, %s)"
+
+
+def test_insert_rows_single_statement():
+    cur = InsertCursor()
+    assert App.insert_rows(cur, SQL, [("x", 1), ("y", 2), ("z", 3)]) == [100, 101, 102]
+    assert cur.statements == [3]
+
+
+def test_insert_rows_chunks_to_fit_statement_size():
+    rows = [("x" * 500, i) for i in range(1000)]
+    cur = InsertCursor()
+    ids = App.insert_rows(cur, SQL, rows)
+    assert len(cur.statements) > 1 and sum(cur.statements) == len(rows)
+    assert ids == list(range(100, 100 + len(rows)))
+
+
+def test_insert_rows_steps_by_auto_increment_increment():
+    cur = InsertCursor(step=3)
+    ids = App.insert_rows(cur, SQL, [("x" * 500, i) for i in range(400)])
+    assert len(cur.statements) > 1
+    assert ids == list(range(100, 100 + 400 * 3, 3))
+
+
+def test_insert_rows_oversized_row_goes_alone():
+    cur = InsertCursor()
+    ids = App.insert_rows(cur, SQL, [("a", 1), ("x" * App.INSERT_STMT_MAX, 2), ("b", 3)])
+    assert len(ids) == 3 and cur.statements[1] == 1
+
+
+def test_insert_rows_empty():
+    assert App.insert_rows(InsertCursor(), SQL, []) == []
+
+
+def test_ttl_cache_expires_entries():
+    cache = App.TTLCache(maxsize=10, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=10)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None and cache.get("a", "no") == "no"
+    assert cache.get("b") == 2
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = App.TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.pop("a") == 1 and cache.pop("a") is None
+    cache.clear()
+    assert cache.get("c") is None
+
+
+def test_cursor_roundtrip():
+    token = App.encode_cursor("2026-01-02", 42)
+    assert "=" not in token
+    assert App.decode_cursor(token) == ["2026-01-02", 42]
+
+
+@pytest.mark.parametrize("token", ["", "%%%", "bm90IGpzb24", App.encode_cursor("x")[:-2] + "!!"])
+def test_invalid_cursor(token):
+    assert App.decode_cursor(token) is None
+
+
+def test_decode_cursor_requires_a_list():
+    import base64
+    token = base64.urlsafe_b64encode(b'{"a": 1}').decode().rstrip("=")
+    assert App.decode_cursor(token) is None
+
+
+ENTRY = {"user_id": "7", "symptom_name": " tos ", "intensity": 4, "entry_date": "2026-01-02"}
+
+
+def test_parse_symptom_entry_ok():
+    row, error = App.parse_symptom_entry({**ENTRY, "entry_time": "08:30", "notes": "n"})
+    assert error is None
+    assert row == (7, "tos", 4, "2026-01-02", "08:30", "n")
+
+
+@pytest.mark.parametrize("changes", [
+    {"user_id": "x"},
+    {"intensity": 11},
+    {"symptom_name": "   "},
+    {"symptom_name": "x" * (App.SYMPTOM_NAME_MAX + 1)},
+    {"entry_date": "02/01/2026"},
+    {"entry_time": "25:00"},
+    {"entry_time": 830},
+    {"notes": {"a": 1}},
+])
+def test_parse_symptom_entry_rejects(changes):
+    row, error = App.parse_symptom_entry({**ENTRY, **changes})
+    assert row is None and error
+
+
+def test_parse_symptom_entry_missing_fields():
+    row, error = App.parse_symptom_entry({"user_id": 1})
+    assert row is None and "symptom_name" in error
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("=SUM(A1)", "'=SUM(A1)"),
+    ("+1", "'+1"),
+    ("@cmd", "'@cmd"),
+    ("tos", "tos"),
+    (-3, -3),
+    (None, None),
+])
+def test_csv_safe(value, expected):
+    assert App.csv_safe(value) == expected
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from ingest import IngestQueue, QueueFull
+
+
+class Writer:
+    """writer() de prueba: guarda los lotes y asigna ids consecutivos."""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+        self.next_id = 1
+
+    def __call__(self, rows):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(rows))
+        ids = range(self.next_id, self.next_id + len(rows))
+        self.next_id += len(rows)
+        return [(i, None) for i in ids]
+
+
+def test_rows_are_written_in_order():
+    writer = Writer()
+    q = IngestQueue(writer, batch_size=4, flush_interval=0.01)
+    pids = [q.submit(n) for n in range(10)]
+    q.close()
+    assert [row for batch in writer.batches for row in batch] == list(range(10))
+    assert all(len(batch) <= 4 for batch in writer.batches)
+    assert [q.status(pid) for pid in pids] == [{"status": "written", "id": n + 1} for n in range(10)]
+
+
+def test_status_is_queued_until_written():
+    gate = threading.Event()
+    q = IngestQueue(Writer(gate), flush_interval=0.01)
+    pid = q.submit("row")
+    assert q.status(pid) == {"status": "queued"}
+    gate.set()
+    q.close()
+    assert q.status(pid)["status"] == "written"
+
+
+def test_close_drains_pending_rows():
+    writer = Writer()
+    q = IngestQueue(writer, batch_size=3, flush_interval=5)   # solo close() fuerza la escritura
+    for n in range(8):
+        q.submit(n)
+    q.close()
+    assert sorted(row for batch in writer.batches for row in batch) == list(range(8))
+    assert q.stats()["written"] == 8
+    with pytest.raises(QueueFull):
+        q.submit("tarde")
+
+
+def test_full_queue_rejects_and_forgets_the_row():
+    gate = threading.Event()
+    q = IngestQueue(Writer(gate), maxsize=1, flush_interval=0)
+    q.submit("a")                       # el escritor la saca y se queda esperando en gate
+    deadline = time.monotonic() + 5
+    while q.stats()["queued"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    q.submit("b")                       # ocupa el único hueco
+    with pytest.raises(QueueFull):
+        q.submit("c")
+    assert q.stats()["rejected"] == 1
+    gate.set()
+    q.close()
+    assert q.stats()["written"] == 2
+
+
+def test_failed_batch_is_reported_per_row():
+    def writer(rows):
+        raise RuntimeError("sin base de datos")
+
+    q = IngestQueue(writer, flush_interval=0.01, retries=1)
+    pid = q.submit("row")
+    q.close()
+    assert q.status(pid) == {"status": "failed", "error": "Error escribiendo el registro"}
+    assert q.stats()["retries"] == 1
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+import passwords
+
+# coste mínimo: los tests comprueban el formato y el pool, no la resistencia del hash
+N = 2 ** 10
+
+
+def test_hash_format_and_verify():
+    encoded = passwords.hash_password("secreto", n=N)
+    scheme, n, r, p, salt, key = encoded.split("$")
+    assert (scheme, n, r, p) == ("scrypt", str(N), "8", "1")
+    assert passwords.parse_hash(encoded)[:3] == (N, 8, 1)
+    assert passwords.verify_password("secreto", encoded)
+    assert not passwords.verify_password("otro", encoded)
+
+
+def test_salt_is_random():
+    assert passwords.hash_password("x", n=N) != passwords.hash_password("x", n=N)
+
+
+@pytest.mark.parametrize("encoded", [None, "", "texto plano", "bcrypt$1$2$3$a$b", "scrypt$x$8$1$a$b"])
+def test_unrecognized_hashes(encoded):
+    assert passwords.parse_hash(encoded) is None
+    assert not passwords.verify_password("x", encoded)
+    assert passwords.needs_rehash(encoded)
+
+
+def test_needs_rehash_on_cost_change():
+    encoded = passwords.hash_password("x", n=N)
+    assert not passwords.needs_rehash(encoded, n=N)
+    assert passwords.needs_rehash(encoded, n=N * 2)
+    assert passwords.needs_rehash(encoded, n=N, r=16)
+
+
+@pytest.fixture
+def pool():
+    pool = passwords.HashPool(workers=1, max_pending=0, n=N)
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_hash_and_verify(pool):
+    encoded = pool.hash("pw")
+    assert pool.verify("pw", encoded)
+    assert not pool.verify("nope", encoded)
+    assert not pool.verify("pw", None)
+    assert not pool.needs_rehash(encoded)
+
+
+def _hold_slot(pool):
+    """Ocupa el único cupo del pool hasta que se suelte el evento devuelto."""
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=pool._run, args=(work,))
+    thread.start()
+    assert started.wait(5)
+    return release, thread
+
+
+def test_pool_rejects_when_full(pool):
+    release, thread = _hold_slot(pool)
+    try:
+        with pytest.raises(passwords.Busy):
+            pool.verify("pw", None)
+    finally:
+        release.set()
+        thread.join()
+    assert not pool.verify("pw", None)   # con el cupo libre vuelve a atender
+
+
+def test_hash_many_does_not_use_login_slots(pool):
+    release, thread = _hold_slot(pool)
+    try:
+        hashes = pool.hash_many(["a", "b", "c"])
+    finally:
+        release.set()
+        thread.join()
+    assert [passwords.verify_password(pw, h) for pw, h in zip("abc", hashes)] == [True] * 3
@@ -0,0 +1,38 @@
+from sql_trace import fingerprint, param_shape
+
+
+def test_literals_and_placeholders_collapse():
+    a = fingerprint("SELECT doctor_id FROM doctors WHERE doctor_id=%s LIMIT 1")
+    b = fingerprint("select  doctor_id\n  FROM doctors WHERE doctor_id = 42 LIMIT 1")
+    assert a == b == "select doctor_id from doctors where doctor_id=? limit ?"
+
+
+def test_strings_and_comments_are_removed():
+    assert (fingerprint("SELECT * FROM users /* admin */ WHERE email='a@b.c' -- fin")
+            == fingerprint("SELECT * FROM users WHERE email=%s"))
+
+
+def test_in_lists_of_any_length_match():
+    short = fingerprint("SELECT id FROM users WHERE id IN (%s)")
+    long_ = fingerprint("SELECT id FROM users WHERE id IN (%s,%s,%s)")
+    assert fingerprint("SELECT id FROM users WHERE id IN (%s, %s)") == long_
+    assert long_.endswith("in(?+)")
+    assert short != long_
+
+
+def test_multi_row_values_collapse():
+    one = fingerprint("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)")
+    many = fingerprint("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y'), (3, 'z')")
+    assert one == many
+    assert one.endswith("values(?+), ...")
+
+
+def test_identifiers_with_digits_are_kept():
+    assert "t2" in fingerprint("SELECT c1 FROM t2 WHERE c1 = 5")
+
+
+def test_param_shape_has_types_not_values():
+    assert param_shape((1, "secreto", None)) == "(int, str, NoneType)"
+    assert param_shape([(1, "a"), (2, "b")], many=True) == "2 x (int, str)"
+    assert param_shape({"id": 3}) == "{id: int}"
+    assert param_shape(None) == "()"
@@ -0,0 +1,41 @@
+import pytest
+
+import wire
+
+
+def test_columnar_converts_uniform_lists():
+    data = {"items": [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}], "next": None}
+    assert wire.columnar(data) == {
+        "items": {"columns": ["id", "name"], "rows": [[1, "a"], [2, "b"]]},
+        "next": None,
+    }
+
+
+def test_columnar_keeps_mixed_lists_and_recurses():
+    mixed = [{"id": 1}, {"id": 2, "extra": True}]
+    assert wire.columnar(mixed) == mixed
+    nested = [{"id": 1, "tags": [{"t": "x"}]}]
+    assert wire.columnar(nested) == {"columns": ["id", "tags"],
+                                     "rows": [[1, {"columns": ["t"], "rows": [["x"]]}]]}
+    assert wire.columnar([]) == []
+    assert wire.columnar([1, 2]) == [1, 2]
+
+
+@pytest.mark.parametrize("param, accept, expected", [
+    (None, None, "json"),
+    (None, "application/json", "json"),
+    (None, "*/*", "json"),
+    (None, wire.COLUMNAR_MIMETYPE, "columnar"),
+    (None, f"application/json;q=0.5, {wire.COLUMNAR_MIMETYPE}", "columnar"),
+    ("columnar", "application/json", "columnar"),
+    ("json", wire.COLUMNAR_MIMETYPE, "json"),
+    ("xml", None, "json"),
+])
+def test_negotiate(param, accept, expected):
+    assert wire.negotiate(param, accept) == expected
+
+
+def test_negotiate_msgpack_only_when_installed():
+    expected = "msgpack" if wire.msgpack is not None else "json"
+    assert wire.negotiate("msgpack", None) == expected
+    assert wire.negotiate(None, wire.MSGPACK_MIMETYPE) == expected
@@ -0,0 +1,183 @@
+############# Formatos de respuesta (SymptoTrack) #############
+# - OrjsonProvider: proveedor JSON de Flask con orjson (mismos valores que el de Flask:
+#   fechas RFC-1123, Decimal como texto, claves ordenadas). Escribe UTF-8 sin escapar
+#   (orjson no puede escapar a ASCII), también cuando delega en el json estándar, así que
+#   jsonify y app.json.dumps dan los mismos bytes.
+# - Formatos compactos opcionales, negociados por Accept o ?format=:
+#     application/vnd.symptotrack.columnar+json   (format=columnar)
+#     application/msgpack                          (format=msgpack, requiere msgpack)
+#   Las listas de objetos se envían como {"columns": [...], "rows": [[...], ...]} y las
+#   fechas en ISO-8601.
+# - Compresión gzip / brotli (brotli si está instalado) según Accept-Encoding.
+#
+# orjson, msgpack y brotli son opcionales: sin ellos se usa el JSON estándar de Flask,
+# no se ofrece msgpack y solo se comprime con gzip.
+
+import decimal
+import gzip
+import uuid
+from datetime import date, datetime, time as dtime, timedelta
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import http_date, parse_accept_header
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+COLUMNAR_MIMETYPE = "application/vnd.symptotrack.columnar+json"
+MSGPACK_MIMETYPE = "application/msgpack"
+
+
+# -----------------------------
+# JSON rápido
+# -----------------------------
+def _flask_default(o):
+    # Igual que DefaultJSONProvider.default
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if isinstance(o, timedelta):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Proveedor JSON con orjson; mantiene el formato de salida del proveedor por defecto."""
+
+    ensure_ascii = False   # igual que orjson, para que el camino de respaldo dé lo mismo
+
+    _OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        # jsonify (response()) siempre pasa separators=(",", ":") o indent=2: se traducen
+        # a opciones de orjson; solo lo que orjson no sabe hacer va al json estándar
+        options = dict(kwargs)
+        option = self._OPTIONS
+        if options.pop("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        indent = options.pop("indent", None)
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        separators = options.pop("separators", None)
+        default = options.pop("default", _flask_default)
+        if indent is None:
+            compatible = separators in (None, (",", ":"))
+        else:
+            compatible = indent == 2 and separators in (None, (",", ": "))
+        if options.pop("ensure_ascii", False) or options or not compatible:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def install_json_provider(app):
+    """Usa orjson como proveedor JSON de la app si está instalado."""
+    if orjson is not None:
+        app.json_provider_class = OrjsonProvider
+        app.json = OrjsonProvider(app)
+
+
+# -----------------------------
+# Formatos compactos
+# -----------------------------
+def _iso(o):
+    if isinstance(o, (datetime, date, dtime)):
+        return o.isoformat()
+    if isinstance(o, (decimal.Decimal, uuid.UUID, timedelta)):
+        return str(o)
+    raise TypeError(f"Tipo no serializable: {type(o).__name__}")
+
+
+def columnar(obj):
+    """Convierte recursivamente las listas de dicts con las mismas claves en columnas + filas."""
+    if isinstance(obj, dict):
+        return {k: columnar(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        if obj and all(isinstance(r, dict) for r in obj):
+            columns = list(obj[0].keys())
+            if all(r.keys() == obj[0].keys() for r in obj):
+                return {"columns": columns,
+                        "rows": [[columnar(r[c]) for c in columns] for r in obj]}
+        return [columnar(v) for v in obj]
+    return obj
+
+
+def negotiate(format_param, accept_header):
+    """Formato pedido por el cliente: 'json' (por defecto), 'columnar' o 'msgpack'."""
+    if format_param in ("json", "columnar") or (format_param == "msgpack" and msgpack):
+        return format_param
+    offers = ["application/json", COLUMNAR_MIMETYPE]
+    if msgpack is not None:
+        offers += [MSGPACK_MIMETYPE, "application/x-msgpack"]
+    best = parse_accept_header(accept_header, MIMEAccept).best_match(
+        offers, default="application/json")
+    if best == COLUMNAR_MIMETYPE:
+        return "columnar"
+    if best in (MSGPACK_MIMETYPE, "application/x-msgpack"):
+        return "msgpack"
+    return "json"
+
+
+def encode_compact(fmt, payload):
+    """(cuerpo, mimetype) del sobre {"ok", "data"} en formato columnar o msgpack."""
+    payload = columnar(payload)
+    if fmt == "msgpack":
+        return msgpack.packb(payload, default=_iso, use_bin_type=True), MSGPACK_MIMETYPE
+    if orjson is not None:
+        return orjson.dumps(payload, default=_iso, option=orjson.OPT_PASSTHROUGH_DATETIME), COLUMNAR_MIMETYPE
+    import json
+    return json.dumps(payload, default=_iso, separators=(",", ":")), COLUMNAR_MIMETYPE
+
+
+# -----------------------------
+# Compresión
+# -----------------------------
+def choose_encoding(accept_encoding_header):
+    accept = parse_accept_header(accept_encoding_header)
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level)
+
+
+def compress_response(resp, request, min_bytes=1024, gzip_level=6, brotli_quality=5):
+    """Comprime en sitio una respuesta Flask ya generada (no streaming) si el cliente lo acepta."""
+    if (resp.direct_passthrough or resp.is_streamed or resp.status_code < 200
+            or resp.status_code in (204, 304) or "Content-Encoding" in resp.headers):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is None or resp.content_length is None or resp.content_length < min_bytes:
+        return resp
+    resp.set_data(compress(resp.get_data(), encoding, gzip_level, brotli_quality))
+    resp.headers["Content-Encoding"] = encoding
+    etag, weak = resp.get_etag()
+    if etag and not weak:
+        # otra representación de los mismos datos: el ETag pasa a ser débil
+        resp.set_etag(etag, weak=True)
+    return resp